@@ -0,0 +1 @@
+"""Pipeline benchmarks on synthetic sections; see benchmarks/run.py."""
\ No newline at end of file
@@ -0,0 +1,258 @@
+"""
+A recording, in-memory stand-in for the parts of xlwings the pipeline uses.
+
+Workbooks are loaded from disk (cell values only) when opened and never
+written back; every call that would cross the COM boundary on Windows is
+counted so stages can be compared by how chatty they are with Excel.
+"""
+import os
+import types
+import hashlib
+import zipfile
+import threading
+from collections import Counter
+from xlsxpatch import column_index, split_cell
+from xlsxread import sheet_names, sheet_part, read_shared_strings, read_date_styles, iter_sheet_cells
+
+# Parsed workbook contents keyed by file digest
+_parsed = {}
+
+
+class Recorder:
+    """Thread-safe counter of simulated COM calls"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.cells = Counter()
+        self._lock = threading.Lock()
+
+    def hit(self, call, cells=0):
+        with self._lock:
+            self.calls[call] += 1
+            if cells:
+                self.cells[call] += cells
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.cells.clear()
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+def _parse_address(address):
+    """'AT31:AT39' -> zero-based (first_row, first_col, last_row, last_col)"""
+    start, _, end = address.replace('$', '').upper().partition(':')
+    start_col, start_row = split_cell(start)
+    end_col, end_row = split_cell(end or start)
+    return start_row - 1, column_index(start_col), end_row - 1, column_index(end_col)
+
+
+def _load_cells(path):
+    """Read every sheet of an .xlsx into {sheet name: {(row, col): value}}"""
+    # Per-student copies of one template share a parse; the fake's own cost should not dominate
+    with open(path, 'rb') as f:
+        key = hashlib.sha1(f.read()).digest()
+    if key not in _parsed:
+        _parsed[key] = _parse_cells(path)
+    return {name: dict(cells) for name, cells in _parsed[key].items()}
+
+
+def _parse_cells(path):
+    sheets = {}
+    with zipfile.ZipFile(path) as zf:
+        shared_strings = read_shared_strings(zf)
+        date_styles = read_date_styles(zf)
+        for name in sheet_names(zf):
+            cells = {}
+            for row, col, value in iter_sheet_cells(zf, sheet_part(zf, name), shared_strings,
+                                                    date_styles=date_styles):
+                if value is not None:
+                    cells[(row, col)] = value
+            sheets[name] = cells
+    return sheets
+
+
+def _binary_sheet_names(path):
+    from xlsbpatch import XlsbTemplate
+    key = ('xlsb', os.path.getsize(path))
+    if key not in _parsed:
+        _parsed[key] = list(XlsbTemplate(path).sheet_parts)
+    return _parsed[key]
+
+
+class FakeRange:
+    def __init__(self, sheet, address, transpose=False):
+        self.sheet = sheet
+        self.address = address
+        self.bounds = _parse_address(address)
+        self.transpose = transpose
+
+    def options(self, transpose=False, **kwargs):
+        return FakeRange(self.sheet, self.address, transpose)
+
+    def _shape(self):
+        first_row, first_col, last_row, last_col = self.bounds
+        return last_row - first_row + 1, last_col - first_col + 1
+
+    @property
+    def value(self):
+        first_row, first_col, last_row, last_col = self.bounds
+        rows, cols = self._shape()
+        self.sheet.recorder.hit('read', rows * cols)
+        cells = self.sheet.cells
+        grid = [[cells.get((r, c)) for c in range(first_col, last_col + 1)]
+                for r in range(first_row, last_row + 1)]
+        if rows == 1 and cols == 1:
+            return grid[0][0]
+        if rows == 1:
+            return grid[0]
+        if cols == 1:
+            return [row[0] for row in grid]
+        if self.transpose:
+            return [list(col) for col in zip(*grid)]
+        return grid
+
+    @value.setter
+    def value(self, value):
+        first_row, first_col, _, _ = self.bounds
+        rows, cols = self._shape()
+        if not isinstance(value, (list, tuple)):
+            grid = [[value] * cols for _ in range(rows)]
+        elif value and isinstance(value[0], (list, tuple)):
+            grid = [list(col) for col in zip(*value)] if self.transpose else value
+        elif self.transpose:
+            grid = [[item] for item in value]
+        else:
+            grid = [list(value)]
+
+        cells = self.sheet.cells
+        written = 0
+        for r, row in enumerate(grid):
+            for c, item in enumerate(row):
+                key = (first_row + r, first_col + c)
+                if item is None:
+                    cells.pop(key, None)
+                else:
+                    cells[key] = item
+                written += 1
+        self.sheet.recorder.hit('write', written)
+
+
+class FakeSheet:
+    def __init__(self, book, name, cells):
+        self.book = book
+        self.name = name
+        self.cells = cells
+        self.recorder = book.recorder
+
+    def range(self, address):
+        return FakeRange(self, address)
+
+
+class FakeSheets:
+    def __init__(self, book, sheets):
+        self.book = book
+        self._sheets = sheets
+
+    def __getitem__(self, key):
+        self.book.recorder.hit('sheet')
+        if isinstance(key, int):
+            return self._sheets[key]
+        for sheet in self._sheets:
+            if sheet.name == key:
+                return sheet
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._sheets)
+
+    def __len__(self):
+        return len(self._sheets)
+
+    @property
+    def active(self):
+        self.book.recorder.hit('sheet')
+        return self._sheets[0]
+
+
+class FakeBook:
+    def __init__(self, app, path):
+        self.app = app
+        self.recorder = app.recorder
+        self.fullname = os.path.abspath(path)
+        self.name = os.path.basename(path)
+        if path.lower().endswith('.xlsb'):
+            contents = {name: {} for name in _binary_sheet_names(path)}
+        else:
+            contents = _load_cells(path)
+        self.sheets = FakeSheets(self, [FakeSheet(self, name, cells) for name, cells in contents.items()])
+
+    def save(self, path=None):
+        self.recorder.hit('save')
+
+    def close(self):
+        self.recorder.hit('close')
+        self.app.books._open.remove(self)
+
+
+class FakeBooks:
+    def __init__(self, app):
+        self.app = app
+        self._open = []
+
+    def open(self, path, **kwargs):
+        self.app.recorder.hit('open')
+        book = FakeBook(self.app, path)
+        self._open.append(book)
+        return book
+
+    def __iter__(self):
+        return iter(list(self._open))
+
+    def __len__(self):
+        return len(self._open)
+
+
+class FakeApp:
+    def __init__(self, recorder, visible=None, add_book=True):
+        object.__setattr__(self, 'recorder', recorder)
+        object.__setattr__(self, 'books', FakeBooks(self))
+        object.__setattr__(self, 'alive', True)
+        recorder.hit('app')
+
+    def __setattr__(self, name, value):
+        # display_alerts, screen_updating, calculation, ... are property puts in COM
+        self.recorder.hit('property')
+        object.__setattr__(self, name, value)
+
+    def quit(self):
+        self.recorder.hit('quit')
+        object.__setattr__(self, 'alive', False)
+
+    def kill(self):
+        object.__setattr__(self, 'alive', False)
+
+
+def make_module(recorder):
+    """Build a module object that can be installed as sys.modules['xlwings']"""
+    module = types.ModuleType('xlwings')
+    module.__file__ = __file__
+    default_app = []
+
+    def App(visible=None, add_book=True, **kwargs):
+        return FakeApp(recorder, visible, add_book)
+
+    def Book(path=None):
+        # xw.Book(path) attaches to (or starts) the active instance
+        if not default_app or not default_app[0].alive:
+            default_app[:] = [App()]
+        return default_app[0].books.open(path)
+
+    module.App = App
+    module.Book = Book
+    module.Recorder = Recorder
+    module.recorder = recorder
+    return module
\ No newline at end of file
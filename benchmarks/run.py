@@ -0,0 +1,166 @@
+"""
+Benchmark runner: python -m benchmarks --students 80 --sections 2
+
+Generates synthetic sections, runs each pipeline stage against the recording
+fake xlwings, and reports wall time, simulated COM calls and peak traced
+memory per stage. --json saves the results; --compare fails (exit code 1)
+when a stage makes more COM calls or runs slower than a saved baseline.
+"""
+import io
+import os
+import sys
+import json
+import shutil
+import importlib
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from time import perf_counter
+from contextlib import redirect_stdout
+
+from benchmarks import fakexl
+from benchmarks.synth import write_section, MAX_STUDENTS
+from benchmarks.stages import STAGES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install_fake_xlwings():
+    """Put the recording stand-in where `import xlwings` will find it"""
+    recorder = fakexl.Recorder()
+    sys.modules['xlwings'] = fakexl.make_module(recorder)
+    return recorder
+
+
+def measure(stage, folder, recorder, trace_memory=True):
+    """Set up and time one stage inside folder"""
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        with redirect_stdout(io.StringIO()):
+            # Every stage starts cold: no Excel instances left over from the previous one
+            importlib.import_module('excelpool').get_pool().close()
+            timed = STAGES[stage]()
+            recorder.reset()
+            if trace_memory:
+                tracemalloc.start()
+            start = perf_counter()
+            timed()
+            wall = perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        os.chdir(cwd)
+
+    return {
+        'wall': wall,
+        'com_calls': recorder.total,
+        'calls': dict(recorder.calls),
+        'cells': dict(recorder.cells),
+        'peak_bytes': peak,
+    }
+
+
+def run(stages, students, sections, workdir, trace_memory=True):
+    """Run every stage over `sections` synthetic sections; returns {stage: totals}"""
+    recorder = install_fake_xlwings()
+    results = {}
+    for stage in stages:
+        totals = {'wall': 0.0, 'com_calls': 0, 'calls': {}, 'cells': {}, 'peak_bytes': 0}
+        try:
+            for section in range(sections):
+                folder = os.path.join(workdir, f'{stage}-{section}')
+                write_section(folder, students, REPO_ROOT, seed=section)
+                result = measure(stage, folder, recorder, trace_memory)
+                totals['wall'] += result['wall']
+                totals['com_calls'] += result['com_calls']
+                totals['peak_bytes'] = max(totals['peak_bytes'], result['peak_bytes'])
+                for key in ('calls', 'cells'):
+                    for call, count in result[key].items():
+                        totals[key][call] = totals[key].get(call, 0) + count
+        except ImportError as e:
+            totals = {'skipped': f'missing dependency: {e.name}'}
+        results[stage] = totals
+    return results
+
+
+def print_report(results, students, sections):
+    print(f"{students} students x {sections} section(s)")
+    print(f"{'stage':<14}{'wall s':>10}{'COM calls':>12}{'cells':>10}{'peak MiB':>10}  breakdown")
+    for stage, result in results.items():
+        if 'skipped' in result:
+            print(f"{stage:<14}{'skipped (' + result['skipped'] + ')':>42}")
+            continue
+        cells = sum(result['cells'].values())
+        breakdown = ', '.join(f'{call}={count}' for call, count in sorted(result['calls'].items()))
+        peak = f"{result['peak_bytes'] / 2**20:.1f}" if result['peak_bytes'] else '-'
+        print(f"{stage:<14}{result['wall']:>10.3f}{result['com_calls']:>12}{cells:>10}{peak:>10}  {breakdown}")
+
+
+def compare(results, baseline, tolerance):
+    """List regressions against a saved baseline"""
+    regressions = []
+    for stage, result in results.items():
+        before = baseline.get(stage)
+        if not before or 'skipped' in result or 'skipped' in before:
+            continue
+        if result['com_calls'] > before['com_calls']:
+            regressions.append(f"{stage}: COM calls {before['com_calls']} -> {result['com_calls']}")
+        if result['wall'] > before['wall'] * (1 + tolerance):
+            regressions.append(f"{stage}: wall {before['wall']:.3f}s -> {result['wall']:.3f}s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic sections")
+    parser.add_argument('--students', type=int, default=MAX_STUDENTS,
+                        help=f"students per section (1-{MAX_STUDENTS}, default: {MAX_STUDENTS})")
+    parser.add_argument('--sections', type=int, default=1, help="sections to run (default: 1)")
+    parser.add_argument('--stage', action='append', choices=list(STAGES),
+                        help="stage to run (repeatable, default: all)")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip tracemalloc (it slows pure-Python stages down)")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed wall-time slowdown against the baseline (default: 0.25)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated sections")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep stage logging (and nig's truncation warnings) out of the report
+    logging.basicConfig(level=logging.ERROR)
+    sys.path.insert(0, REPO_ROOT)
+
+    workdir = tempfile.mkdtemp(prefix='moguera-bench-')
+    try:
+        results = run(args.stage or list(STAGES), args.students, args.sections, workdir,
+                      trace_memory=not args.no_memory)
+    finally:
+        if args.keep:
+            print(f"Sections kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results, args.students, args.sections)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'students': args.students, 'sections': args.sections, 'stages': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline['students'], baseline['sections']) != (args.students, args.sections):
+            print(f"Baseline was run with {baseline['students']} students x {baseline['sections']} section(s)")
+            return 2
+        regressions = compare(results, baseline['stages'], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
\ No newline at end of file
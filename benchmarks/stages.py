@@ -0,0 +1,87 @@
+"""
+Pipeline stages as the benchmark runs them.
+
+Each stage function is called inside a freshly generated section folder,
+does any untimed setup, and returns the callable that is actually measured.
+Pipeline modules are imported lazily so the fake xlwings is already in place.
+"""
+import os
+import importlib
+from xlsxpatch import XlsxTemplate
+
+
+def trans_stage():
+    """sf1 -> MFQ1, then MFQ1 roster -> MFQ2-4 (trans.py)"""
+    trans = importlib.import_module('trans')
+    return trans.main
+
+
+def nig_stage():
+    """sf1 -> SF5A/SF5B (nig.py)"""
+    nig = importlib.import_module('nig')
+    return nig.main
+
+
+def grade_stage():
+    """MFQ1-4 -> database -> every SF9/SF10, native engine (grade.py)"""
+    grade = importlib.import_module('grade')
+    return lambda: grade.main(['--force'])
+
+
+def grade_excel_stage():
+    """MFQ1-4 -> database -> every SF9/SF10 through Excel (grade.py --engine excel)"""
+    grade = importlib.import_module('grade')
+    return lambda: grade.main(['--engine', 'excel', '--force'])
+
+
+def pipeline_stage():
+    """Transfer plus Finish & Encode in one process, native engine (pipeline.py)"""
+    pipeline = importlib.import_module('pipeline')
+    return lambda: pipeline.main(['all', '--force'])
+
+
+def pipeline_excel_stage():
+    """Transfer plus Finish & Encode in one process through Excel (pipeline.py)"""
+    pipeline = importlib.import_module('pipeline')
+    return lambda: pipeline.main(['all', '--engine', 'excel', '--force'])
+
+
+def _macro_stage(engine):
+    macro = importlib.import_module('macro')
+    system = macro.AutoTransferSystem()
+
+    # Bring the database and SF files up to date before timing a single edit
+    system.engine = 'native'
+    delta = system.update_database_from_excel()
+    system.patch_sf_files(delta)
+    system.engine = engine
+
+    # One teacher changes one grade in MFQ2
+    template = XlsxTemplate('MFQ2.xlsx', full_calc_on_load=False)
+    sheet = next(iter(template.sheet_parts))
+    template.render('MFQ2.xlsx.tmp', {sheet: {'E7': 74.0}})
+    os.replace('MFQ2.xlsx.tmp', 'MFQ2.xlsx')
+
+    return lambda: system.process_data_change('MFQ2.xlsx')
+
+
+def macro_stage():
+    """One grade edit reconciled by the monitoring path (macro.py)"""
+    return _macro_stage('native')
+
+
+def macro_excel_stage():
+    """One grade edit reconciled by the monitoring path through Excel (macro.py)"""
+    return _macro_stage('excel')
+
+
+STAGES = {
+    'trans': trans_stage,
+    'nig': nig_stage,
+    'grade': grade_stage,
+    'grade-excel': grade_excel_stage,
+    'pipeline': pipeline_stage,
+    'pipeline-excel': pipeline_excel_stage,
+    'macro': macro_stage,
+    'macro-excel': macro_excel_stage,
+}
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Synthetic section generator: realistic sf1.xlsx and MFQ1-4 inputs for N students,
+written by patching the real templates so the layout matches what schools use.
+"""
+import os
+import random
+import shutil
+from datetime import date, timedelta
+from xlsxpatch import XlsxTemplate
+
+# Row capacity of the sf1 register (male 11-50, female 52-91)
+MAX_MALES = 40
+MAX_FEMALES = 40
+MAX_STUDENTS = MAX_MALES + MAX_FEMALES
+
+SF1_ROWS = {'M': 11, 'F': 52}
+MFQ_ROWS = {'M': 6, 'F': 52}
+GRADE_COLUMNS = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L']
+
+# Copied unchanged into every section folder
+STATIC_FILES = ['SF9.xlsb', 'sf10.xlsx', 'sf5a.xlsx', 'sf5b.xlsx']
+
+LAST_NAMES = [
+    'DELA CRUZ', 'SANTOS', 'REYES', 'GARCIA', 'MENDOZA', 'BAUTISTA', 'VILLANUEVA', 'RAMOS',
+    'CASTILLO', 'AQUINO', 'NAVARRO', 'TORRES', 'FERNANDEZ', 'GONZALES', 'LOPEZ', 'DEL ROSARIO',
+    'PASCUAL', 'SORIANO', 'MAGBANUA', 'DIMAGIBA', 'MACARAEG', 'LUMANLAN', 'SALAZAR', 'CRUZ',
+]
+MALE_NAMES = [
+    'JUAN', 'JOSE', 'MARK ANTHONY', 'JOHN PAUL', 'CARLO', 'RAFAEL', 'MIGUEL', 'JERICHO',
+    'KENNETH', 'ANGELO', 'JOSHUA', 'CHRISTIAN', 'RENZ', 'PAOLO', 'EMMANUEL', 'NATHANIEL',
+]
+FEMALE_NAMES = [
+    'MARIA', 'ANGELICA', 'KRISTINE JOY', 'PRINCESS', 'JASMINE', 'MARIA CLARA', 'NICOLE',
+    'ABIGAIL', 'CAMILLE', 'ANDREA', 'BEA', 'JANELLE', 'RICA MAE', 'SOPHIA', 'TRISHA', 'LEA',
+]
+
+
+def make_roster(students, seed=0):
+    """
+    Build a roster of dicts (lrn, name, last, first, middle, sex, birth_date, age)
+    for up to MAX_STUDENTS learners, split evenly between male and female rows.
+    """
+    if not 0 < students <= MAX_STUDENTS:
+        raise ValueError(f"A section holds 1-{MAX_STUDENTS} students, got {students}")
+
+    rng = random.Random(seed)
+    males = min(MAX_MALES, (students + 1) // 2)
+    females = students - males
+    if females > MAX_FEMALES:
+        females, males = MAX_FEMALES, students - MAX_FEMALES
+
+    roster = []
+    for sex, count, first_names in (('M', males, MALE_NAMES), ('F', females, FEMALE_NAMES)):
+        for _ in range(count):
+            last = rng.choice(LAST_NAMES)
+            first = rng.choice(first_names)
+            middle = chr(ord('A') + rng.randrange(26)) + '.'
+            birth_date = date(2007, 1, 1) + timedelta(days=rng.randrange(730))
+            roster.append({
+                'lrn': str(rng.randrange(100000000000, 999999999999)),
+                'name': f'{last}, {first} {middle}',
+                'last': last,
+                'first': first,
+                'middle': middle,
+                'sex': sex,
+                'birth_date': birth_date,
+                'age': 2025 - birth_date.year,
+            })
+    return roster
+
+
+def make_grades(roster, seed=0):
+    """Grades per quarter: {quarter: [[grade per subject] per student]}"""
+    rng = random.Random(seed + 1)
+    return {
+        quarter: [[float(rng.randint(75, 99)) for _ in range(9 if quarter > 2 else 8)] for _ in roster]
+        for quarter in range(1, 5)
+    }
+
+
+def _by_sex(roster):
+    for sex in ('M', 'F'):
+        yield sex, [(i, student) for i, student in enumerate(roster) if student['sex'] == sex]
+
+
+def sf1_cells(roster):
+    """Cell values for the sf1 register; J (age) is a formula and is left alone"""
+    cells = {}
+    for sex, students in _by_sex(roster):
+        capacity = MAX_MALES if sex == 'M' else MAX_FEMALES
+        for slot in range(capacity):
+            row = SF1_ROWS[sex] + slot
+            student = students[slot][1] if slot < len(students) else None
+            cells[f'B{row}'] = student and student['lrn']
+            cells[f'C{row}'] = student and student['name']
+            cells[f'G{row}'] = student and student['sex']
+            cells[f'H{row}'] = student and student['birth_date']
+    return cells
+
+
+def mfq_cells(roster, grades, quarter):
+    """Cell values for one MFQ workbook, with MFQ1 also carrying the personal details"""
+    cells = {}
+    subjects = GRADE_COLUMNS if quarter > 2 else GRADE_COLUMNS[:8]
+    for sex, students in _by_sex(roster):
+        for slot, (index, student) in enumerate(students):
+            row = MFQ_ROWS[sex] + slot
+            cells[f'A{row}'] = student['lrn']
+            cells[f'B{row}'] = student['name']
+            for col, grade in zip(subjects, grades[quarter][index]):
+                cells[f'{col}{row}'] = grade
+            if quarter == 1:
+                cells[f'AW{row}'] = student['last']
+                cells[f'AX{row}'] = student['first']
+                cells[f'AY{row}'] = student['middle']
+                cells[f'BA{row}'] = student['sex']
+                cells[f'BB{row}'] = student['birth_date']
+                cells[f'BC{row}'] = student['age']
+    return cells
+
+
+def write_section(folder, students, source_dir='.', seed=0):
+    """
+    Write sf1.xlsx, MFQ1-4.xlsx and the output templates for a synthetic
+    section into folder. Returns the roster.
+    """
+    os.makedirs(folder, exist_ok=True)
+    roster = make_roster(students, seed)
+    grades = make_grades(roster, seed)
+
+    _render_first_sheet(source_dir, folder, 'sf1.xlsx', sf1_cells(roster))
+    for quarter in range(1, 5):
+        _render_first_sheet(source_dir, folder, f'MFQ{quarter}.xlsx', mfq_cells(roster, grades, quarter))
+
+    for name in STATIC_FILES:
+        shutil.copy(os.path.join(source_dir, name), os.path.join(folder, name))
+    return roster
+
+
+def _render_first_sheet(source_dir, folder, name, cells):
+    template = XlsxTemplate(os.path.join(source_dir, name), full_calc_on_load=False)
+    sheet = next(iter(template.sheet_parts))
+    template.render(os.path.join(folder, name), {sheet: cells})
\ No newline at end of file
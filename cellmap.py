@@ -0,0 +1,159 @@
+from xlsxpatch import split_cell
+
+# Columns of the students table, in order
+STUDENT_FIELDS = (
+    'lrn', 'name', 'section', 'grade_level', 'school_id', 'school_name', 'school_year',
+    'adviser', 'gender', 'birth_date', 'age', 'mother_tongue', 'ip_community',
+    'father_name', 'mother_name', 'guardian_name', 'contact_number'
+)
+
+# SF9 BACK rows per subject_idx; the subject groups are separated by header rows
+SF9_FIRST_SEMESTER_ROWS = [7, 8, 9, 11, 12, 13, 15, 16, 17]
+SF9_SECOND_SEMESTER_ROWS = [23, 24, 25, 26, 27, 28, 30, 31, 32]
+
+# MFQ1 school header cell -> SF9 FRONT cell, SF10 FRONT cells (schooldata.py)
+SCHOOL_HEADER_TRANSFERS = [
+    ('B1', 'Q26', ['AS23', 'AS66']),
+    ('B2', 'T26', ['AS25', 'AS68']),
+    ('B3', 'R29', ['G25', 'G68']),
+    ('F1', 'P40', []),
+    ('F2', 'S40', ['A49', 'A92']),
+    ('F3', 'R28', ['BA23', 'BA66'])
+]
+
+
+class CellPlan:
+    """
+    A form layout compiled once: keys map to cells, and cells in the same
+    column on consecutive rows are coalesced into vertical runs such as
+    AT31:AT39. Reused for every student.
+    """
+
+    def __init__(self, layout):
+        # layout: sheet -> {key: cell}
+        self.layout = {sheet: {key: cell.upper() for key, cell in cells.items()}
+                       for sheet, cells in layout.items()}
+        self.runs = []  # (sheet, address, keys)
+        for sheet, cells in self.layout.items():
+            self.runs.extend(self._coalesce(sheet, cells))
+
+    @staticmethod
+    def _coalesce(sheet, cells):
+        by_column = {}
+        for key, cell in cells.items():
+            col, row = split_cell(cell)
+            by_column.setdefault(col, []).append((row, key))
+
+        runs = []
+        for col, entries in by_column.items():
+            entries.sort(key=lambda entry: entry[0])
+            start = 0
+            for i in range(1, len(entries) + 1):
+                if i == len(entries) or entries[i][0] != entries[i - 1][0] + 1:
+                    first, last = entries[start][0], entries[i - 1][0]
+                    address = f'{col}{first}' if first == last else f'{col}{first}:{col}{last}'
+                    runs.append((sheet, address, [key for _, key in entries[start:i]]))
+                    start = i
+        return runs
+
+    def targets(self):
+        """Every cell the plan can write, per sheet (for pre-compiling templates)."""
+        return {sheet: list(cells.values()) for sheet, cells in self.layout.items()}
+
+    def cell_values(self, values, out=None):
+        """Map keyed values to {sheet: {cell: value}}, skipping keys not in values."""
+        out = {} if out is None else out
+        for sheet, cells in self.layout.items():
+            sheet_values = out.setdefault(sheet, {})
+            for key, cell in cells.items():
+                if key in values:
+                    sheet_values[cell] = values[key]
+        return out
+
+    def write(self, book, values, clear_missing=True):
+        """
+        Write keyed values into an open xlwings workbook, one range write per run.
+        Runs with no key in values are skipped; missing keys inside a written run
+        are cleared so stale values never survive a rerun. With clear_missing=False
+        (patching a few cells) partially covered runs are written cell by cell.
+        """
+        sheets = {}
+        for sheet, address, keys in self.runs:
+            present = [key for key in keys if key in values]
+            if not present:
+                continue
+            if sheet not in sheets:
+                sheets[sheet] = book.sheets[sheet]
+            if len(keys) == 1:
+                sheets[sheet].range(address).value = values[keys[0]]
+            elif clear_missing or len(present) == len(keys):
+                vector = [values.get(key) for key in keys]
+                sheets[sheet].range(address).options(transpose=True).value = vector
+            else:
+                cells = self.layout[sheet]
+                for key in present:
+                    sheets[sheet].range(cells[key]).value = values[key]
+
+
+def student_values(student):
+    """Key a students table row by field name."""
+    return dict(zip(STUDENT_FIELDS, student))
+
+
+def grade_values(student_grades):
+    """Key (lrn, subject_idx, quarter, grade) rows by (subject_idx, quarter), dropping blanks."""
+    return {(subject_idx, quarter): grade
+            for _, subject_idx, quarter, grade in student_grades
+            if grade is not None}
+
+
+def school_header_values(header):
+    """Spread MFQ1 header values ({cell: value}) over ({SF9 cell: value}, {SF10 cell: value})."""
+    sf9, sf10 = {}, {}
+    for source, sf9_dest, sf10_dests in SCHOOL_HEADER_TRANSFERS:
+        sf9[sf9_dest] = header[source]
+        for sf10_dest in sf10_dests:
+            sf10[sf10_dest] = header[source]
+    return sf9, sf10
+
+
+def _grade_layout(columns, first_semester_rows, second_semester_rows):
+    layout = {}
+    for quarter, col in enumerate(columns, 1):
+        rows = first_semester_rows if quarter <= 2 else second_semester_rows
+        for subject_idx, row in enumerate(rows):
+            layout[(subject_idx, quarter)] = f'{col}{row}'
+    return layout
+
+
+SF9_FRONT_PAGE = CellPlan({'FRONT': {
+    'name': 'Q22',
+    'lrn': 'T3',
+    'section': 'Q26',
+    'school_name': 'R29',
+    'grade_level': 'P40',
+    'school_id': 'S40',
+    'adviser': 'R28',
+    'contact_number': 'Q24',
+}})
+
+SF10_FRONT_PAGE = CellPlan({'FRONT': {
+    'section': 'AS66',
+    'school_name': 'G68',
+    'school_id': 'A92',
+    'adviser': 'BA66',
+    'mother_tongue': 'F8',
+    'ip_community': 'Y8',
+    'father_name': 'AZ8',
+    'lrn': 'C9',
+    'guardian_name': 'AA9',
+    'mother_name': 'AN9',
+}})
+
+# Quarters 1-4 -> C, D, C, D on SF9 BACK
+SF9_GRADES = CellPlan({'BACK': _grade_layout(
+    ['C', 'D', 'C', 'D'], SF9_FIRST_SEMESTER_ROWS, SF9_SECOND_SEMESTER_ROWS)})
+
+# Quarters 1-4 -> AT, AY, AT, AY on SF10 FRONT, one row per subject from 31 and 74
+SF10_GRADES = CellPlan({'FRONT': _grade_layout(
+    ['AT', 'AY', 'AT', 'AY'], list(range(31, 40)), list(range(74, 83)))})
\ No newline at end of file
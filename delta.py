@@ -0,0 +1,135 @@
+from collections import namedtuple
+from cellmap import STUDENT_FIELDS
+from studentdb import has_grade_vectors, store_grade_vectors
+
+# students: {lrn: {field: new value}}; grades: {lrn: {(subject_idx, quarter): new grade or None}}
+Delta = namedtuple('Delta', ['students', 'grades'])
+
+# Changed rows are updated in place instead of deleted and reinserted
+_STUDENT_UPSERT = (
+    f'INSERT INTO students VALUES ({", ".join("?" for _ in STUDENT_FIELDS)}) '
+    'ON CONFLICT(lrn) DO UPDATE SET '
+    + ', '.join(f'{field} = excluded.{field}' for field in STUDENT_FIELDS[1:])
+)
+
+_GRADE_UPSERT = '''
+    INSERT INTO grades VALUES (?, ?, ?, ?)
+    ON CONFLICT(lrn, subject_idx, quarter) DO UPDATE SET grade = excluded.grade
+'''
+
+_LOG_CHANGE = '''
+    INSERT INTO grade_changes (lrn, field, subject_idx, quarter, old_value, new_value)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+def _load_fresh(conn, student_data, grades_data):
+    """Stage freshly read rows in temp tables that share the real tables' column affinities"""
+    conn.execute('DROP TABLE IF EXISTS temp.fresh_students')
+    conn.execute('DROP TABLE IF EXISTS temp.fresh_grades')
+    conn.execute('CREATE TEMP TABLE fresh_students AS SELECT * FROM students WHERE 0')
+    conn.execute('CREATE TEMP TABLE fresh_grades AS SELECT * FROM grades WHERE 0')
+    conn.execute('CREATE UNIQUE INDEX temp.fresh_students_lrn ON fresh_students(lrn)')
+    conn.execute('CREATE UNIQUE INDEX temp.fresh_grades_key ON fresh_grades(lrn, subject_idx, quarter)')
+    conn.executemany(
+        'INSERT OR REPLACE INTO fresh_students VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        student_data
+    )
+    conn.executemany('INSERT OR REPLACE INTO fresh_grades VALUES (?, ?, ?, ?)', grades_data)
+
+
+def sync_records(conn, student_data, grades_data):
+    """
+    Bring the students and grades tables in line with freshly read MFQ data,
+    writing only what differs, and return the Delta of changed fields and cells.
+
+    Every changed field and grade is appended to grade_changes, old and new
+    value, in the same transaction as the upserts.
+
+    Values are compared after SQLite's own type conversion, so a float LRN
+    read from Excel matches the text stored for it.
+    """
+    _load_fresh(conn, student_data, grades_data)
+    try:
+        old_students = {}
+        changed_students = conn.execute(
+            'SELECT * FROM fresh_students EXCEPT SELECT * FROM students').fetchall()
+        if changed_students:
+            placeholders = ','.join('?' for _ in changed_students)
+            old_students = {row[0]: row for row in conn.execute(
+                f'SELECT * FROM students WHERE lrn IN ({placeholders})',
+                [row[0] for row in changed_students])}
+
+        students = {}
+        changes = []
+        for row in changed_students:
+            old = old_students.get(row[0])
+            fields = students[row[0]] = {}
+            for i, (field, value) in enumerate(zip(STUDENT_FIELDS, row)):
+                if old is None or old[i] != value:
+                    fields[field] = value
+                    changes.append((row[0], field, None, None, old[i] if old else None, value))
+
+        grades = {}
+        # New or different grades, with the grade they replace
+        changed_grades = conn.execute('''
+            SELECT f.lrn, f.subject_idx, f.quarter, f.grade, g.grade FROM fresh_grades f
+            LEFT JOIN grades g ON g.lrn = f.lrn AND g.subject_idx = f.subject_idx AND g.quarter = f.quarter
+            WHERE g.lrn IS NULL OR g.grade IS NOT f.grade
+        ''').fetchall()
+        # Grades cleared in the MFQ for students that are still listed
+        removed_grades = conn.execute('''
+            SELECT g.lrn, g.subject_idx, g.quarter, g.grade FROM grades g
+            WHERE g.lrn IN (SELECT lrn FROM fresh_students)
+              AND NOT EXISTS (
+                  SELECT 1 FROM fresh_grades f
+                  WHERE f.lrn = g.lrn AND f.subject_idx = g.subject_idx AND f.quarter = g.quarter)
+        ''').fetchall()
+
+        for lrn, subject_idx, quarter, grade, old_grade in changed_grades:
+            grades.setdefault(lrn, {})[(subject_idx, quarter)] = grade
+            changes.append((lrn, 'grade', subject_idx, quarter, old_grade, grade))
+        for lrn, subject_idx, quarter, old_grade in removed_grades:
+            grades.setdefault(lrn, {})[(subject_idx, quarter)] = None
+            changes.append((lrn, 'grade', subject_idx, quarter, old_grade, None))
+
+        with conn:
+            conn.executemany(_STUDENT_UPSERT, changed_students)
+            conn.executemany(_GRADE_UPSERT, [row[:4] for row in changed_grades])
+            conn.executemany(
+                'DELETE FROM grades WHERE lrn = ? AND subject_idx = ? AND quarter = ?',
+                [row[:3] for row in removed_grades]
+            )
+            conn.executemany(_LOG_CHANGE, changes)
+            if grades and has_grade_vectors(conn):
+                store_grade_vectors(conn, grades)
+    finally:
+        conn.execute('DROP TABLE IF EXISTS temp.fresh_students')
+        conn.execute('DROP TABLE IF EXISTS temp.fresh_grades')
+
+    return Delta(students, grades)
+
+
+def last_change_seq(conn):
+    """Sequence number of the newest grade_changes entry, or 0"""
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM grade_changes').fetchone()[0]
+
+
+def changes_since(conn, seq=0):
+    """
+    grade_changes rows after seq, oldest first, as
+    (seq, changed_at, lrn, field, subject_idx, quarter, old_value, new_value).
+    Pass back the last seq seen to pull only what changed since.
+    """
+    return conn.execute('SELECT * FROM grade_changes WHERE seq > ? ORDER BY seq', (seq,)).fetchall()
+
+
+def affected_lrns(delta):
+    """LRNs with at least one changed field or grade"""
+    return sorted(set(delta.students) | set(delta.grades))
+
+
+def changed_cells(delta):
+    """Total number of changed fields and grade cells"""
+    return (sum(len(fields) for fields in delta.students.values()) +
+            sum(len(cells) for cells in delta.grades.values()))
\ No newline at end of file
@@ -0,0 +1,182 @@
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class PooledApp:
+    """
+    An xlwings App on loan from an ExcelPool.
+
+    Behaves like the App it wraps, but counts the workbooks opened through it
+    so the pool can recycle long-lived instances, and quit() hands it back to
+    the pool instead of shutting Excel down.
+    """
+
+    def __init__(self, pool, app):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_app', app)
+        object.__setattr__(self, 'workbooks', 0)
+        object.__setattr__(self, 'thread', threading.current_thread())
+
+    @property
+    def books(self):
+        return _CountingBooks(self)
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._app, name, value)
+
+    def quit(self):
+        self._pool.release(self)
+
+
+class _CountingBooks:
+    def __init__(self, pooled):
+        self._pooled = pooled
+        self._books = pooled._app.books
+
+    def open(self, *args, **kwargs):
+        book = self._books.open(*args, **kwargs)
+        object.__setattr__(self._pooled, 'workbooks', self._pooled.workbooks + 1)
+        return book
+
+    def __getattr__(self, name):
+        return getattr(self._books, name)
+
+    def __iter__(self):
+        return iter(self._books)
+
+    def __len__(self):
+        return len(self._books)
+
+    def __getitem__(self, key):
+        return self._books[key]
+
+
+def _start_excel():
+    import xlwings as xw
+    app = xw.App(visible=False, add_book=False)
+    app.display_alerts = False
+    app.screen_updating = False
+    return app
+
+
+class ExcelPool:
+    """
+    Keeps headless Excel instances alive between jobs.
+
+    acquire() returns an idle instance (after a health check) or starts one;
+    release() puts it back, or retires it once it has opened max_workbooks
+    workbooks or stopped responding. COM objects belong to the thread that
+    created them, so idle instances are only handed back to that thread, and
+    ones whose thread has ended are killed. Threads are kept by their Thread
+    object rather than their ident, which a new thread can reuse.
+    """
+
+    def __init__(self, max_idle=2, max_workbooks=200, factory=_start_excel):
+        self.max_idle = max_idle
+        self.max_workbooks = max_workbooks
+        self.factory = factory
+        self._idle = {}  # Thread -> [PooledApp]
+        self._all = set()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        self._reap()
+        thread = threading.current_thread()
+        while True:
+            with self._lock:
+                idle = self._idle.get(thread)
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                break
+            if self._healthy(pooled):
+                return pooled
+            self._retire(pooled)
+
+        pooled = PooledApp(self, self.factory())
+        with self._lock:
+            self._all.add(pooled)
+        logging.info("Started a pooled Excel instance")
+        return pooled
+
+    def release(self, pooled):
+        self._reap()
+        if pooled.workbooks >= self.max_workbooks or not self._healthy(pooled):
+            self._retire(pooled)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(pooled.thread, [])
+            if pooled.thread is threading.current_thread() and len(idle) < self.max_idle:
+                idle.append(pooled)
+                return
+        self._retire(pooled)
+
+    @contextmanager
+    def session(self):
+        """with pool.session() as app: ... -- acquire and always release"""
+        pooled = self.acquire()
+        try:
+            yield pooled
+        finally:
+            self.release(pooled)
+
+    def close(self):
+        """Quit every instance; ones owned by other threads are killed"""
+        with self._lock:
+            apps = list(self._all)
+            self._idle.clear()
+        for pooled in apps:
+            self._retire(pooled)
+
+    def _reap(self):
+        """Retire the idle instances of threads that have ended"""
+        with self._lock:
+            ended = [thread for thread in self._idle if not thread.is_alive()]
+            orphans = [pooled for thread in ended for pooled in self._idle.pop(thread)]
+        for pooled in orphans:
+            self._retire(pooled)
+
+    def _healthy(self, pooled):
+        try:
+            len(pooled._app.books)
+            return True
+        except Exception:
+            return False
+
+    def _retire(self, pooled):
+        with self._lock:
+            self._all.discard(pooled)
+        try:
+            if pooled.thread is threading.current_thread():
+                pooled._app.quit()
+            else:
+                pooled._app.kill()
+        except Exception as e:
+            logging.warning(f"Could not shut down pooled Excel instance: {str(e)}")
+            try:
+                pooled._app.kill()
+            except Exception:
+                pass
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool, closed automatically at exit"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ExcelPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def excel_session():
+    """Borrow an Excel instance from the process-wide pool for a with-block"""
+    return get_pool().session()
\ No newline at end of file
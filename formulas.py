@@ -0,0 +1,942 @@
+"""
+Native evaluation of the SF9/SF10 template formulas.
+
+Excel only works out a formula's result when it opens a workbook, so forms
+rendered without Excel carried the template's cached results: blank final
+ratings, remarks and averages in viewers and print previews that do not
+recalculate. A FormulaGraph parses every formula of a template once (.xlsx
+formula text and .xlsb formula tokens alike) and keeps the ones that read
+the cells we fill, directly or through other formulas, in calculation
+order. Per student, evaluate() recomputes just those from the filled-in
+values; the renderers write the results as the cells' cached values and
+leave the formulas in place.
+
+Supported: numbers, strings, booleans and errors, cell and range references
+(also across sheets), arithmetic, comparison and & operators, and the
+functions in FUNCTIONS. Other formulas (array formulas, defined names,
+other functions) keep their template values, and formulas reading them see
+those values. Excel still recalculates the whole workbook on open.
+"""
+import io
+import math
+import re
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from xlsxpatch import KEEP, Cached, column_index, column_letters, split_cell, excel_serial
+from xlsxread import NS_MAIN, read_shared_strings, cell_text, convert_value
+from xlsbpatch import (XlsbTemplate, iter_records, read_wide_string, ERROR_CODES, BRT_ROW_HDR,
+                       BRT_BEGIN_SHEET_DATA, BRT_END_SHEET_DATA, BRT_AC_BEGIN, BRT_AC_END,
+                       BRT_ARR_FMLA, BRT_SHR_FMLA, BRT_FMLA_TYPES, CELL_TYPES)
+
+
+class ExcelError:
+    """An error value such as #DIV/0!"""
+    __slots__ = ('code',)
+
+    def __init__(self, code):
+        self.code = code
+
+    def __repr__(self):
+        return self.code
+
+
+ERRORS = {code: ExcelError(code) for code in ERROR_CODES.values()}
+DIV0 = ERRORS['#DIV/0!']
+VALUE = ERRORS['#VALUE!']
+NUM = ERRORS['#NUM!']
+NA = ERRORS['#N/A']
+
+
+class Unsupported(Exception):
+    """A formula outside what the evaluator handles"""
+
+
+class _Raised(Exception):
+    # Carries an error value out of a nested evaluation
+    def __init__(self, error):
+        self.error = error
+
+
+# Parsed formulas are tuples:
+#   ('value', v)                 constant; None is a missing argument
+#   ('ref', sheet, corner)       corner = (row, col, row_absolute, col_absolute), zero-based
+#   ('area', sheet, corner, corner)
+#   ('unary', op, node)          op in + - %
+#   ('binary', op, left, right)
+#   ('call', name, [nodes])
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<error>\#(?:NULL!|DIV/0!|VALUE!|REF!|NAME\?|NUM!|N/A))
+  | (?P<ref>(?:(?P<sheet>'(?:[^']|'')+'|[A-Za-z_][A-Za-z0-9_.]*)!)?
+        (?P<first>\$?[A-Za-z]{1,3}\$?\d+)(?::(?P<last>\$?[A-Za-z]{1,3}\$?\d+))?)(?![A-Za-z0-9_.(!])
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[Ee][+-]?\d+)?)
+  | (?P<function>[A-Za-z_][A-Za-z0-9_.]*)\(
+  | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+  | (?P<operator><>|<=|>=|[-+*/^&=<>%(),])
+''', re.X)
+
+_CORNER_RE = re.compile(r'(\$?)([A-Za-z]{1,3})(\$?)(\d+)')
+
+_COMPARISONS = ('=', '<>', '<', '>', '<=', '>=')
+
+
+def _corner(text):
+    col_absolute, letters, row_absolute, row = _CORNER_RE.fullmatch(text).groups()
+    return int(row) - 1, column_index(letters.upper()), bool(row_absolute), bool(col_absolute)
+
+
+def _tokenize(text):
+    pos = 0
+    tokens = []
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise Unsupported(f"Cannot read formula at {text[pos:pos + 10]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        if kind in ('ref', 'sheet', 'first', 'last'):
+            tokens.append(('ref', (match.group('sheet'), match.group('first'), match.group('last'))))
+        else:
+            tokens.append((kind, match.group(kind)))
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over formula tokens, lowest precedence first"""
+
+    def __init__(self, text, sheet, sheets):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.sheet = sheet
+        self.sheets = sheets
+
+    def parse(self):
+        node = self.comparison()
+        if self.peek() != ('end', None):
+            raise Unsupported(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def accept(self, *operators):
+        kind, value = self.peek()
+        if kind == 'operator' and value in operators:
+            self.pos += 1
+            return value
+        return None
+
+    def expect(self, operator):
+        if not self.accept(operator):
+            raise Unsupported(f"Expected {operator!r}")
+
+    def binary(self, operand, operators):
+        node = operand()
+        while True:
+            op = self.accept(*operators)
+            if op is None:
+                return node
+            node = ('binary', op, node, operand())
+
+    def comparison(self):
+        return self.binary(self.concatenation, _COMPARISONS)
+
+    def concatenation(self):
+        return self.binary(self.additive, ('&',))
+
+    def additive(self):
+        return self.binary(self.multiplicative, ('+', '-'))
+
+    def multiplicative(self):
+        return self.binary(self.power, ('*', '/'))
+
+    def power(self):
+        return self.binary(self.unary, ('^',))
+
+    def unary(self):
+        # Excel binds negation tighter than ^: -2^2 is 4
+        op = self.accept('-', '+')
+        if op:
+            return ('unary', op, self.unary())
+        node = self.primary()
+        while self.accept('%'):
+            node = ('unary', '%', node)
+        return node
+
+    def primary(self):
+        kind, value = self.next()
+        if kind == 'number':
+            return ('value', float(value))
+        if kind == 'string':
+            return ('value', value[1:-1].replace('""', '"'))
+        if kind == 'error':
+            return ('value', ERRORS.get(value, NA))
+        if kind == 'name' and value.upper() in ('TRUE', 'FALSE'):
+            return ('value', value.upper() == 'TRUE')
+        if kind == 'ref':
+            return self.reference(*value)
+        if kind == 'function':
+            return self.call(value)
+        if kind == 'operator' and value == '(':
+            node = self.comparison()
+            self.expect(')')
+            return node
+        raise Unsupported(f"Unsupported token {value!r}")
+
+    def reference(self, sheet, first, last):
+        if sheet is None:
+            sheet = self.sheet
+        else:
+            if sheet.startswith("'"):
+                sheet = sheet[1:-1].replace("''", "'")
+            if sheet.upper() not in self.sheets:
+                raise Unsupported(f"Unknown sheet {sheet!r}")
+            sheet = self.sheets[sheet.upper()]
+        if last is None:
+            return ('ref', sheet, _corner(first))
+        return ('area', sheet, _corner(first), _corner(last))
+
+    def call(self, name):
+        name = name.upper()
+        if name.startswith('_XLFN.'):
+            name = name[6:]
+        args = []
+        if not self.accept(')'):
+            while True:
+                kind, value = self.peek()
+                if kind == 'operator' and value in (',', ')'):
+                    args.append(('value', None))
+                else:
+                    args.append(self.comparison())
+                if self.accept(')'):
+                    break
+                self.expect(',')
+        return _call(name, args)
+
+
+def _call(name, args):
+    if name not in FUNCTIONS:
+        raise Unsupported(f"Unsupported function {name}")
+    minimum, maximum, _ = FUNCTIONS[name]
+    if not minimum <= len(args) <= maximum:
+        raise Unsupported(f"{name} takes {minimum} to {maximum} arguments")
+    return ('call', name, args)
+
+
+def parse_formula(text, sheet, sheets=()):
+    """Parse formula text (without the leading =) on sheet; sheets are the workbook's sheet names"""
+    return _Parser(text, sheet, {name.upper(): name for name in sheets}).parse()
+
+
+def shift(node, rows, cols):
+    """Move the relative references of a parsed formula, as copying it rows down and cols right does"""
+    kind = node[0]
+    if kind == 'ref':
+        return ('ref', node[1], _shift_corner(node[2], rows, cols))
+    if kind == 'area':
+        return ('area', node[1], _shift_corner(node[2], rows, cols), _shift_corner(node[3], rows, cols))
+    if kind == 'unary':
+        return ('unary', node[1], shift(node[2], rows, cols))
+    if kind == 'binary':
+        return ('binary', node[1], shift(node[2], rows, cols), shift(node[3], rows, cols))
+    if kind == 'call':
+        return ('call', node[1], [shift(arg, rows, cols) for arg in node[2]])
+    return node
+
+
+def _shift_corner(corner, rows, cols):
+    row, col, row_absolute, col_absolute = corner
+    return (row if row_absolute else row + rows, col if col_absolute else col + cols,
+            row_absolute, col_absolute)
+
+
+def references(node):
+    """(sheet, first_row, first_col, last_row, last_col) of every reference in a parsed formula"""
+    kind = node[0]
+    if kind == 'ref':
+        row, col = node[2][:2]
+        yield node[1], row, col, row, col
+    elif kind == 'area':
+        (row1, col1), (row2, col2) = node[2][:2], node[3][:2]
+        yield node[1], min(row1, row2), min(col1, col2), max(row1, row2), max(col1, col2)
+    elif kind == 'unary':
+        yield from references(node[2])
+    elif kind == 'binary':
+        yield from references(node[2])
+        yield from references(node[3])
+    elif kind == 'call':
+        for arg in node[2]:
+            yield from references(arg)
+
+
+# BIFF12 parsed formulas (rgce): operator and function tokens
+_PTG_BINARY = {0x03: '+', 0x04: '-', 0x05: '*', 0x06: '/', 0x07: '^', 0x08: '&',
+               0x09: '<', 0x0A: '<=', 0x0B: '=', 0x0C: '>=', 0x0D: '>', 0x0E: '<>'}
+_PTG_UNARY = {0x12: '+', 0x13: '-', 0x14: '%'}
+# Built-in function numbers (iftab) of the functions in FUNCTIONS
+_IFTAB = {0: 'COUNT', 1: 'IF', 3: 'ISERROR', 4: 'SUM', 5: 'AVERAGE', 6: 'MIN', 7: 'MAX', 24: 'ABS',
+          25: 'INT', 27: 'ROUND', 36: 'AND', 37: 'OR', 38: 'NOT', 127: 'ISTEXT', 128: 'ISNUMBER',
+          129: 'ISBLANK', 169: 'COUNTA', 347: 'COUNTBLANK', 480: 'IFERROR'}
+
+
+def _ptg_corner(row, colword, base):
+    """Cell of a BIFF12 row/column pair; base (row, col) makes relative RefN/AreaN offsets absolute"""
+    col = colword & 0x3FFF
+    col_relative = bool(colword & 0x4000)
+    row_relative = bool(colword & 0x8000)
+    if base is not None:
+        if row_relative:
+            row = base[0] + (row - (1 << 32) if row & 0x80000000 else row)
+        if col_relative:
+            col = base[1] + (col - 0x4000 if col & 0x2000 else col)
+    return row, col, not row_relative, not col_relative
+
+
+def decode_rgce(rgce, sheet, base):
+    """Parse a BIFF12 formula token stream on sheet into the same tuples parse_formula returns"""
+    stack = []
+    pos = 0
+    while pos < len(rgce):
+        ptg = rgce[pos]
+        pos += 1
+        if ptg in _PTG_BINARY:
+            right = stack.pop()
+            stack.append(('binary', _PTG_BINARY[ptg], stack.pop(), right))
+        elif ptg in _PTG_UNARY:
+            stack.append(('unary', _PTG_UNARY[ptg], stack.pop()))
+        elif ptg == 0x15:  # PtgParen: display only
+            pass
+        elif ptg == 0x16:  # PtgMissArg
+            stack.append(('value', None))
+        elif ptg == 0x17:  # PtgStr
+            count = struct.unpack_from('<H', rgce, pos)[0]
+            stack.append(('value', rgce[pos + 2:pos + 2 + count * 2].decode('utf-16-le')))
+            pos += 2 + count * 2
+        elif ptg == 0x19:  # PtgAttr: jumps, spacing and single-argument SUM
+            flags = rgce[pos]
+            if flags & 0x04:
+                pos += 3 + 2 * (struct.unpack_from('<H', rgce, pos + 1)[0] + 1)
+            else:
+                pos += 3
+            if flags & 0x10:
+                stack.append(('call', 'SUM', [stack.pop()]))
+            elif flags & 0x04:
+                raise Unsupported("Unsupported function CHOOSE")
+        elif ptg == 0x1C:
+            stack.append(('value', ERRORS.get(ERROR_CODES.get(rgce[pos]), NA)))
+            pos += 1
+        elif ptg == 0x1D:
+            stack.append(('value', bool(rgce[pos])))
+            pos += 1
+        elif ptg == 0x1E:
+            stack.append(('value', float(struct.unpack_from('<H', rgce, pos)[0])))
+            pos += 2
+        elif ptg == 0x1F:
+            stack.append(('value', struct.unpack_from('<d', rgce, pos)[0]))
+            pos += 8
+        elif ptg >= 0x20:
+            kind = (ptg & 0x1F) | 0x20
+            if kind in (0x24, 0x2C):  # PtgRef, PtgRefN
+                row, colword = struct.unpack_from('<IH', rgce, pos)
+                stack.append(('ref', sheet, _ptg_corner(row, colword, base if kind == 0x2C else None)))
+                pos += 6
+            elif kind in (0x25, 0x2D):  # PtgArea, PtgAreaN
+                row1, row2, col1, col2 = struct.unpack_from('<IIHH', rgce, pos)
+                relative_base = base if kind == 0x2D else None
+                stack.append(('area', sheet, _ptg_corner(row1, col1, relative_base),
+                              _ptg_corner(row2, col2, relative_base)))
+                pos += 12
+            elif kind in (0x21, 0x22):  # PtgFunc, PtgFuncVar
+                if kind == 0x21:
+                    iftab = struct.unpack_from('<H', rgce, pos)[0]
+                    pos += 2
+                    name = _IFTAB.get(iftab)
+                    count = FUNCTIONS[name][0] if name else 0
+                else:
+                    count = rgce[pos]
+                    iftab = struct.unpack_from('<H', rgce, pos + 1)[0] & 0x7FFF
+                    pos += 3
+                    name = _IFTAB.get(iftab)
+                if name is None:
+                    raise Unsupported(f"Unsupported function number {iftab}")
+                args = stack[len(stack) - count:] if count else []
+                del stack[len(stack) - count:]
+                stack.append(_call(name, args))
+            else:
+                raise Unsupported(f"Unsupported formula token 0x{ptg:02X}")
+        else:
+            raise Unsupported(f"Unsupported formula token 0x{ptg:02X}")
+    if len(stack) != 1:
+        raise Unsupported("Malformed formula")
+    return stack[0]
+
+
+# Evaluation. Blank cells read as None; errors travel as _Raised until a
+# function that handles them (IFERROR, ISERROR) or the top of the formula.
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _number(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise _Raised(VALUE)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        if float(value).is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return '%.15g' % value
+    return value
+
+
+def _logical(value):
+    if value is None:
+        return False
+    if isinstance(value, str):
+        if value.upper() in ('TRUE', 'FALSE'):
+            return value.upper() == 'TRUE'
+        raise _Raised(VALUE)
+    return bool(value)
+
+
+def _type_rank(value):
+    # Excel orders numbers < text < logicals
+    if isinstance(value, bool):
+        return 2
+    if isinstance(value, str):
+        return 1
+    return 0
+
+
+def _blank_like(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, str):
+        return ''
+    return 0
+
+
+def _compare(left, right):
+    if left is None:
+        left = _blank_like(right)
+    if right is None:
+        right = _blank_like(left)
+    left_rank, right_rank = _type_rank(left), _type_rank(right)
+    if left_rank != right_rank:
+        return -1 if left_rank < right_rank else 1
+    if left_rank == 1:
+        left, right = left.lower(), right.lower()
+    return (left > right) - (left < right)
+
+
+_COMPARE = {
+    '=': lambda c: c == 0, '<>': lambda c: c != 0, '<': lambda c: c < 0,
+    '>': lambda c: c > 0, '<=': lambda c: c <= 0, '>=': lambda c: c >= 0,
+}
+
+
+def _arithmetic(op, left, right):
+    left, right = _number(left), _number(right)
+    try:
+        if op == '+':
+            return left + right
+        if op == '-':
+            return left - right
+        if op == '*':
+            return left * right
+        if op == '/':
+            return left / right
+        return math.pow(left, right)
+    except ZeroDivisionError:
+        raise _Raised(DIV0)
+    except (ValueError, OverflowError):
+        raise _Raised(NUM)
+
+
+def _cells(node, get):
+    """Values of the cells a reference covers"""
+    for sheet, row1, col1, row2, col2 in references(node):
+        for row in range(row1, row2 + 1):
+            for col in range(col1, col2 + 1):
+                yield get((sheet, row, col))
+
+
+def _scalar(node, get):
+    kind = node[0]
+    if kind == 'value':
+        value = node[1]
+    elif kind == 'ref':
+        value = get((node[1],) + node[2][:2])
+    elif kind == 'area':
+        raise _Raised(VALUE)
+    elif kind == 'unary':
+        operand = _number(_scalar(node[2], get))
+        value = -operand if node[1] == '-' else operand / 100 if node[1] == '%' else operand
+    elif kind == 'binary':
+        op = node[1]
+        left, right = _scalar(node[2], get), _scalar(node[3], get)
+        if op in _COMPARE:
+            value = _COMPARE[op](_compare(left, right))
+        elif op == '&':
+            value = _text(left) + _text(right)
+        else:
+            value = _arithmetic(op, left, right)
+    else:
+        value = FUNCTIONS[node[1]][2](node[2], get)
+    if isinstance(value, ExcelError):
+        raise _Raised(value)
+    return value
+
+
+def _is_reference(node):
+    return node[0] in ('ref', 'area')
+
+
+def _numbers(args, get):
+    # SUM/AVERAGE/MIN/MAX: text, logicals and blanks inside references are skipped
+    for arg in args:
+        if _is_reference(arg):
+            for value in _cells(arg, get):
+                if isinstance(value, ExcelError):
+                    raise _Raised(value)
+                if _is_number(value):
+                    yield value
+        else:
+            yield _number(_scalar(arg, get))
+
+
+def _logicals(args, get):
+    # AND/OR: text and blanks inside references are skipped
+    values = []
+    for arg in args:
+        if _is_reference(arg):
+            for value in _cells(arg, get):
+                if isinstance(value, ExcelError):
+                    raise _Raised(value)
+                if isinstance(value, (int, float)):
+                    values.append(bool(value))
+        else:
+            values.append(_logical(_scalar(arg, get)))
+    if not values:
+        raise _Raised(VALUE)
+    return values
+
+
+def excel_round(value, digits=0):
+    """ROUND as Excel does it: halves away from zero, on the decimal digits Excel shows"""
+    exponent = Decimal(1).scaleb(-int(digits))
+    try:
+        return float(Decimal(repr(float(value))).quantize(exponent, rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        return float(value)
+
+
+def _average(args, get):
+    values = list(_numbers(args, get))
+    if not values:
+        raise _Raised(DIV0)
+    return sum(values) / len(values)
+
+
+def _if(args, get):
+    if _logical(_scalar(args[0], get)):
+        return _scalar(args[1], get)
+    return _scalar(args[2], get) if len(args) > 2 else False
+
+
+def _iferror(args, get):
+    try:
+        return _scalar(args[0], get)
+    except _Raised:
+        return _scalar(args[1], get)
+
+
+def _iserror(args, get):
+    try:
+        _scalar(args[0], get)
+    except _Raised:
+        return True
+    return False
+
+
+def _count(args, get):
+    count = 0
+    for arg in args:
+        if _is_reference(arg):
+            count += sum(1 for value in _cells(arg, get) if _is_number(value))
+        else:
+            try:
+                _number(_scalar(arg, get))
+                count += 1
+            except _Raised:
+                pass
+    return count
+
+
+def _counta(args, get):
+    count = 0
+    for arg in args:
+        if _is_reference(arg):
+            count += sum(1 for value in _cells(arg, get) if value is not None)
+        elif arg != ('value', None):
+            count += 1
+    return count
+
+
+def _countblank(args, get):
+    if not _is_reference(args[0]):
+        raise _Raised(VALUE)
+    return sum(1 for value in _cells(args[0], get) if value is None or value == '')
+
+
+def _isblank(args, get):
+    return args[0][0] == 'ref' and get((args[0][1],) + args[0][2][:2]) is None
+
+
+def _scalar_or_error(node, get):
+    try:
+        return _scalar(node, get)
+    except _Raised as e:
+        return e.error
+
+
+# name -> (minimum arguments, maximum arguments, implementation(args, get))
+FUNCTIONS = {
+    'ABS': (1, 1, lambda args, get: abs(_number(_scalar(args[0], get)))),
+    'AND': (1, 255, lambda args, get: all(_logicals(args, get))),
+    'AVERAGE': (1, 255, _average),
+    'COUNT': (1, 255, _count),
+    'COUNTA': (1, 255, _counta),
+    'COUNTBLANK': (1, 1, _countblank),
+    'IF': (2, 3, _if),
+    'IFERROR': (2, 2, _iferror),
+    'INT': (1, 1, lambda args, get: float(math.floor(_number(_scalar(args[0], get))))),
+    'ISBLANK': (1, 1, _isblank),
+    'ISERROR': (1, 1, _iserror),
+    'ISNUMBER': (1, 1, lambda args, get: _is_number(_scalar_or_error(args[0], get))),
+    'ISTEXT': (1, 1, lambda args, get: isinstance(_scalar_or_error(args[0], get), str)),
+    'MAX': (1, 255, lambda args, get: max(_numbers(args, get), default=0)),
+    'MIN': (1, 255, lambda args, get: min(_numbers(args, get), default=0)),
+    'NOT': (1, 1, lambda args, get: not _logical(_scalar(args[0], get))),
+    'OR': (1, 255, lambda args, get: any(_logicals(args, get))),
+    'ROUND': (2, 2, lambda args, get: excel_round(_number(_scalar(args[0], get)),
+                                                  _number(_scalar(args[1], get)))),
+    'SUM': (1, 255, lambda args, get: sum(_numbers(args, get))),
+}
+
+
+def evaluate(node, get):
+    """
+    Result of a parsed formula, reading cells through get((sheet, row, col)).
+    Errors come back as ExcelError values; a formula that ends on a blank cell gives 0.
+    """
+    try:
+        value = _scalar(node, get)
+    except _Raised as e:
+        return e.error
+    return 0 if value is None else value
+
+
+# Reading the template's cells and formulas
+
+def _xlsx_cells(template, sheets):
+    """(values, formulas) of an .xlsx template; formulas map a cell to its parsed formula or None"""
+    with zipfile.ZipFile(template.path) as zf:
+        strings = read_shared_strings(zf)
+    values = {}
+    formulas = {}
+    for sheet, part in template.sheet_parts.items():
+        shared = {}  # si -> (row, col, parsed master formula or None)
+        for _, elem in ET.iterparse(io.BytesIO(template.package.read(part))):
+            if elem.tag != NS_MAIN + 'c':
+                continue
+            if elem.get('r') is None:
+                elem.clear()
+                continue
+            letters, number = split_cell(elem.get('r'))
+            row, col = number - 1, column_index(letters)
+            key = (sheet, row, col)
+            cell_type = elem.get('t')
+            text = cell_text(elem)
+            formula = elem.find(NS_MAIN + 'f')
+
+            if cell_type == 'e':
+                values[key] = ERRORS.get(text, NA)
+            elif formula is not None and cell_type == 'str':
+                values[key] = text or ''
+            else:
+                values[key] = convert_value(cell_type, text, strings)
+
+            if formula is not None:
+                kind = formula.get('t')
+                if kind == 'shared' and formula.get('si') is not None:
+                    si = formula.get('si')
+                    if formula.text:
+                        shared[si] = (row, col, _parse_or_none(formula.text, sheet, sheets))
+                    master = shared.get(si)
+                    if master is None or master[2] is None:
+                        formulas[key] = None
+                    else:
+                        formulas[key] = shift(master[2], row - master[0], col - master[1])
+                elif kind in ('array', 'dataTable') or not formula.text:
+                    # Array results spill over their whole range
+                    first_row, first_col, last_row, last_col = _range_bounds(formula.get('ref') or elem.get('r'))
+                    for array_row in range(first_row, last_row + 1):
+                        for array_col in range(first_col, last_col + 1):
+                            formulas[(sheet, array_row, array_col)] = None
+                else:
+                    formulas[key] = _parse_or_none(formula.text, sheet, sheets)
+            elem.clear()
+    return values, formulas
+
+
+def _range_bounds(ref):
+    first, _, last = ref.partition(':')
+    first_row, first_col = _corner(first)[:2]
+    last_row, last_col = _corner(last or first)[:2]
+    return first_row, first_col, last_row, last_col
+
+
+def _parse_or_none(text, sheet, sheets):
+    try:
+        return parse_formula(text, sheet, sheets)
+    except Unsupported:
+        return None
+
+
+def _xlsb_strings(package):
+    if 'xl/sharedStrings.bin' not in package.names:
+        return []
+    data = package.read('xl/sharedStrings.bin')
+    # BrtSSTItem: rich-text flags, then the string
+    return [read_wide_string(data, payload + 1)[0]
+            for record_type, _, payload, _ in iter_records(data) if record_type == 19]
+
+
+def _xlsb_value(record_type, data, pos, strings):
+    """Value of a BIFF12 cell record starting at pos (after col and style), and where it ends"""
+    if record_type == 1:
+        return None, pos
+    if record_type == 2:
+        rk = struct.unpack_from('<I', data, pos)[0]
+        if rk & 0x02:
+            value = float(struct.unpack_from('<i', data, pos)[0] >> 2)
+        else:
+            value = struct.unpack('<d', struct.pack('<Q', (rk & 0xFFFFFFFC) << 32))[0]
+        return (value / 100 if rk & 0x01 else value), pos + 4
+    if record_type in (3, 11):
+        return ERRORS.get(ERROR_CODES.get(data[pos]), NA), pos + 1
+    if record_type in (4, 10):
+        return bool(data[pos]), pos + 1
+    if record_type in (5, 9):
+        return struct.unpack_from('<d', data, pos)[0], pos + 8
+    if record_type in (6, 8):
+        return read_wide_string(data, pos)
+    if record_type == 7:
+        index = struct.unpack_from('<I', data, pos)[0]
+        return (strings[index] if index < len(strings) else None), pos + 4
+    if record_type == 62:
+        return read_wide_string(data, pos + 1)
+    return None, pos
+
+
+def _xlsb_cells(template, sheets):
+    """(values, formulas) of an .xlsb template; formulas map a cell to its parsed formula or None"""
+    strings = _xlsb_strings(template.package)
+    values = {}
+    formulas = {}
+    for sheet, part in template.sheet_parts.items():
+        data = template.package.read(part)
+        tokens = {}  # (row, col) -> rgce
+        shared = []  # (first_row, last_row, first_col, last_col, rgce)
+        arrays = set()
+        row = None
+        last_formula = None
+        in_data = False
+        depth = 0
+        for record_type, start, payload, end in iter_records(data):
+            if record_type == BRT_BEGIN_SHEET_DATA:
+                in_data = True
+            elif record_type == BRT_END_SHEET_DATA:
+                break
+            elif not in_data:
+                continue
+            elif record_type == BRT_AC_BEGIN:
+                depth += 1
+            elif record_type == BRT_AC_END:
+                depth -= 1
+            elif depth:
+                continue
+            elif record_type == BRT_ROW_HDR:
+                row = struct.unpack_from('<I', data, payload)[0]
+            elif record_type in CELL_TYPES and row is not None:
+                col = struct.unpack_from('<I', data, payload)[0]
+                values[(sheet, row, col)], pos = _xlsb_value(record_type, data, payload + 8, strings)
+                if record_type in BRT_FMLA_TYPES:
+                    # grbitFlags, then the token stream
+                    size = struct.unpack_from('<I', data, pos + 2)[0]
+                    tokens[(row, col)] = data[pos + 6:pos + 6 + size]
+                    last_formula = (row, col)
+            elif record_type == BRT_SHR_FMLA:
+                first_row, last_row, first_col, last_col, size = struct.unpack_from('<5I', data, payload)
+                shared.append((first_row, last_row, first_col, last_col, data[payload + 20:payload + 20 + size]))
+            elif record_type == BRT_ARR_FMLA and last_formula is not None:
+                arrays.add(last_formula)
+
+        for (row, col), rgce in tokens.items():
+            key = (sheet, row, col)
+            if (row, col) in arrays:
+                formulas[key] = None
+                continue
+            if rgce[:1] == b'\x01' and len(rgce) == 5:
+                # PtgExp: the cell shares the formula of the range it lies in
+                rgce = next((shared_rgce for first_row, last_row, first_col, last_col, shared_rgce in shared
+                             if first_row <= row <= last_row and first_col <= col <= last_col), None)
+                if rgce is None:
+                    formulas[key] = None
+                    continue
+            try:
+                formulas[key] = decode_rgce(rgce, sheet, (row, col))
+            except (Unsupported, struct.error, IndexError):
+                formulas[key] = None
+    return values, formulas
+
+
+class FormulaGraph:
+    """
+    The formulas of a template that read a set of input cells, directly or
+    through other formulas, parsed once and kept in calculation order.
+    """
+
+    def __init__(self, template, inputs):
+        # inputs: {sheet: [cells]} filled per student
+        sheets = list(template.sheet_parts)
+        if isinstance(template, XlsbTemplate):
+            self.values, formulas = _xlsb_cells(template, sheets)
+        else:
+            self.values, formulas = _xlsx_cells(template, sheets)
+
+        changed = {}  # sheet -> {(row, col)} of inputs and the formulas reading them
+        for sheet, cells in inputs.items():
+            for cell in cells:
+                letters, row = split_cell(cell)
+                changed.setdefault(sheet, set()).add((row - 1, column_index(letters)))
+
+        # Spread from the inputs until no further formula reads a changed cell
+        ranges = {key: list(references(node)) for key, node in formulas.items() if node is not None}
+        affected = set()
+        growing = True
+        while growing:
+            growing = False
+            for key, key_ranges in ranges.items():
+                if key not in affected and any(_touches(bounds, changed) for bounds in key_ranges):
+                    affected.add(key)
+                    changed.setdefault(key[0], set()).add(key[1:])
+                    growing = True
+
+        self.order = []  # (key, cell, parsed formula)
+        state = {}
+        cycles = set()
+
+        def visit(key):
+            if state.get(key) == 'done':
+                return
+            if state.get(key) == 'visiting':
+                cycles.add(key)
+                return
+            state[key] = 'visiting'
+            for bounds in ranges[key]:
+                for precedent in _affected_in(bounds, affected):
+                    visit(precedent)
+            state[key] = 'done'
+            self.order.append((key, f'{column_letters(key[2])}{key[1] + 1}', formulas[key]))
+
+        for key in sorted(affected):
+            visit(key)
+        # Circular references are left to Excel
+        self.order = [entry for entry in self.order if entry[0] not in cycles]
+
+    def targets(self):
+        """Every formula cell evaluate() fills, per sheet (for pre-compiling templates)"""
+        targets = {}
+        for (sheet, _, _), cell, _ in self.order:
+            targets.setdefault(sheet, []).append(cell)
+        return targets
+
+    def evaluate(self, values):
+        """
+        {sheet: {cell: Cached}} of every formula reading the inputs, given the
+        values about to be rendered ({sheet: {cell: value}}) over the template's own.
+        """
+        current = {}
+        for sheet, cells in values.items():
+            for cell, value in cells.items():
+                if value is KEEP or isinstance(value, Cached):
+                    continue
+                if isinstance(value, float) and not math.isfinite(value):
+                    value = None
+                elif isinstance(value, (date, datetime)):
+                    value = excel_serial(value)
+                letters, row = split_cell(cell)
+                current[(sheet, row - 1, column_index(letters))] = value
+
+        def get(key):
+            return current[key] if key in current else self.values.get(key)
+
+        results = {}
+        for key, cell, node in self.order:
+            value = current[key] = evaluate(node, get)
+            if isinstance(value, ExcelError):
+                results.setdefault(key[0], {})[cell] = Cached(value.code, error=True)
+            else:
+                results.setdefault(key[0], {})[cell] = Cached(value)
+        return results
+
+    def apply(self, values):
+        """Add the recomputed formula results to values, ready for the template's render"""
+        for sheet, cells in self.evaluate(values).items():
+            values.setdefault(sheet, {}).update(cells)
+        return values
+
+
+def _touches(bounds, changed):
+    sheet, first_row, first_col, last_row, last_col = bounds
+    cells = changed.get(sheet)
+    if not cells:
+        return False
+    if first_row == last_row and first_col == last_col:
+        return (first_row, first_col) in cells
+    return any(first_row <= row <= last_row and first_col <= col <= last_col for row, col in cells)
+
+
+def _affected_in(bounds, affected):
+    sheet, first_row, first_col, last_row, last_col = bounds
+    return [key for key in affected
+            if key[0] == sheet and first_row <= key[1] <= last_row and first_col <= key[2] <= last_col]
\ No newline at end of file
@@ -1,11 +1,26 @@
-import xlwings as xw
 import os
 import shutil
-import sqlite3
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import pandas as pd
 import time
 import mmap
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+from xlsxpatch import XlsxTemplate
+from xlsbpatch import XlsbTemplate
+from formulas import FormulaGraph
+from mfq import read_mfq_blocks, extract_records
+from excelpool import excel_session, get_pool
+from studentdb import connect, has_grade_vectors, vector_grades, enable_packed_grades, archive_database
+from delta import sync_records
+from gradecalc import refresh_results
+from cellmap import SF9_FRONT_PAGE, SF10_FRONT_PAGE, SF9_GRADES, SF10_GRADES, student_values, grade_values
+from renderstate import create_render_state_table, render_salt, find_stale_students, iter_stale_records, record_render_state
+
+SF9_TEMPLATE = 'SF9.xlsb'
+SF10_TEMPLATE = 'sf10.xlsx'
 
 def create_folders():
     base_folder = 'SF9SF10'
@@ -18,201 +33,235 @@ def create_folders():
 
 def create_database():
     """Create SQLite database for storing student data"""
-    conn = sqlite3.connect('student_records.db')
-    conn.execute("PRAGMA journal_mode=WAL")  # Use WAL mode for better concurrency
-    conn.execute("PRAGMA synchronous=NORMAL")  # Reduce synchronous writes for speed
-    cursor = conn.cursor()
+    return connect('student_records.db')
+
+def load_data_from_excel_to_db(conn, mfq_paths, engine='native'):
+    """
+    Extract data from the MFQ files and store in SQLite database.
+    Each workbook is read as one A6:BC100 block (sheet XML natively, or one range read in Excel).
+    """
+    if engine == 'native':
+        blocks = read_mfq_blocks(mfq_paths)
+    else:
+        with excel_session() as app:
+            blocks = read_mfq_blocks(mfq_paths, app)
     
-    # Create tables for student info and grades
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS students (
-        lrn TEXT PRIMARY KEY,
-        name TEXT,
-        section TEXT,
-        grade_level TEXT,
-        school_id TEXT,
-        school_name TEXT,
-        school_year TEXT,
-        adviser TEXT,
-        gender TEXT,
-        birth_date TEXT,
-        age TEXT,
-        mother_tongue TEXT,
-        ip_community TEXT,
-        father_name TEXT,
-        mother_name TEXT,
-        guardian_name TEXT,
-        contact_number TEXT
-    )
-    ''')
+    store_blocks(conn, blocks)
+
+def store_blocks(conn, blocks):
+    """
+    Slice student information and grades out of MFQ1-4 blocks and store them.
+    Only rows that differ are written (and logged to grade_changes); returns the Delta.
+    Final ratings, averages and ranks (gradecalc.py) are refreshed along with them.
+    """
+    student_data, grades_data = extract_records(blocks)
+    delta = sync_records(conn, student_data, grades_data)
+    refresh_results(conn)
+    return delta
+
+def output_paths(lrn, sf9_folder, sf10_folder):
+    """Where a student's SF9 and SF10 live"""
+    return os.path.join(sf9_folder, f'{lrn}.xlsb'), os.path.join(sf10_folder, f'{lrn}.xlsx')
+
+def group_grades(grades_data):
+    """Group grade rows by LRN"""
+    grades_dict = {}
+    for grade in grades_data:
+        lrn = grade[0]
+        if lrn not in grades_dict:
+            grades_dict[lrn] = []
+        grades_dict[lrn].append(grade)
+    return grades_dict
+
+def iter_student_records(conn):
+    """
+    Yield (student, grades) one LRN at a time from a single joined cursor.
+    Rows arrive in LRN order, so only the current student is ever held in memory.
+    """
+    if has_grade_vectors(conn):
+        yield from iter_packed_student_records(conn)
+        return
     
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS grades (
-        lrn TEXT,
-        subject_idx INTEGER,
-        quarter INTEGER,
-        grade REAL,
-        PRIMARY KEY (lrn, subject_idx, quarter),
-        FOREIGN KEY (lrn) REFERENCES students(lrn)
-    )
+    cursor = conn.execute('''
+        SELECT s.*, g.subject_idx, g.quarter, g.grade
+        FROM students s
+        LEFT JOIN grades g ON g.lrn = s.lrn
+        ORDER BY s.lrn, g.subject_idx, g.quarter
     ''')
-    
-    # Add indexes for faster lookups
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_grades_lrn ON grades(lrn)')
-    
-    conn.commit()
-    return conn
+    for lrn, rows in groupby(cursor, key=itemgetter(0)):
+        rows = list(rows)
+        student = rows[0][:17]
+        student_grades = [(lrn,) + row[17:] for row in rows if row[17] is not None]
+        yield student, student_grades
 
-def load_data_from_excel_to_db(conn, mfq_paths):
-    """Extract data from Excel files and store in SQLite database"""
-    cursor = conn.cursor()
-    
-    # Load all MFQ workbooks once to extract data
-    app = xw.App(visible=False)
-    app.display_alerts = False
-    app.screen_updating = False
-    
-    try:
-        mfq_workbooks = [app.books.open(path) for path in mfq_paths]
-        
-        # Process student information from MFQ1
-        wb_mfq1 = mfq_workbooks[0]
-        sheet = wb_mfq1.sheets[0]
-        
-        student_ranges = list(range(6, 50)) + list(range(52, 101))
-        
-        # Prepare batch data for students and grades
-        student_data = []
-        grades_data = []
-        
-        adviser_value = sheet.range('R28').value  # Get adviser once
-        
-        # Batch process student information
-        for student_row in student_ranges:
-            lrn = sheet.range(f'A{student_row}').value
-            if not lrn:
-                continue
-                
-            # Extract all student information at once
-            student_info = (
-                lrn,
-                sheet.range(f'B{student_row}').value,
-                sheet.range(f'Q{student_row}').value,
-                sheet.range(f'P{student_row}').value,
-                sheet.range(f'S{student_row}').value,
-                sheet.range(f'R{student_row}').value,
-                sheet.range(f'T{student_row}').value,
-                adviser_value,
-                'Male' if student_row < 51 else 'Female',
-                sheet.range(f'Q{student_row}').value,
-                sheet.range(f'F{student_row}').value,
-                sheet.range(f'AW{student_row}').value,
-                sheet.range(f'AX{student_row}').value,
-                sheet.range(f'AY{student_row}').value,
-                sheet.range(f'BA{student_row}').value,
-                sheet.range(f'BC{student_row}').value,
-                sheet.range(f'BB{student_row}').value
-            )
-            
-            student_data.append(student_info)
-            
-            # Extract and insert grades for all quarters
-            rows = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L']
-            
-            for quarter, wb in enumerate(mfq_workbooks, 1):
-                for subject_idx, row in enumerate(rows):
-                    if subject_idx == 8 and quarter < 3:
-                        continue  # Skip 'L' for quarters 1 and 2
-                    
-                    grade = wb.sheets[0].range(f'{row}{student_row}').value
-                    if grade is not None:
-                        grades_data.append((lrn, subject_idx, quarter, grade))
-        
-        # Insert all student data in a single transaction
-        with conn:
-            conn.executemany(
-                'INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                student_data
-            )
-            
-            # Insert all grades data in the same transaction
-            conn.executemany(
-                'INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?)',
-                grades_data
-            )
-    
-    finally:
-        # Close workbooks and Excel application
-        for wb in mfq_workbooks:
-            wb.close()
-        app.quit()
+def iter_packed_student_records(conn):
+    """iter_student_records for a database that keeps packed grades: one row per student"""
+    cursor = conn.execute('''
+        SELECT s.*, v.grades
+        FROM students s
+        LEFT JOIN grade_vectors v ON v.lrn = s.lrn
+        ORDER BY s.lrn
+    ''')
+    for row in cursor:
+        yield row[:17], vector_grades(conn, row[0], row[17])
+
+def load_grades(conn):
+    """Every grade row in the database, unpacked from grade_vectors when it keeps them"""
+    if not has_grade_vectors(conn):
+        grades_df = pd.read_sql_query("SELECT * FROM grades", conn)
+        return list(grades_df.itertuples(index=False, name=None))
+    return [grade for _, student_grades in iter_packed_student_records(conn) for grade in student_grades]
 
 def copy_template_for_student(lrn, sf9_folder, sf10_folder):
-    sf9_path = os.path.join(sf9_folder, f'{lrn}.xlsb')
-    sf10_path = os.path.join(sf10_folder, f'{lrn}.xlsx')
+    sf9_path, sf10_path = output_paths(lrn, sf9_folder, sf10_folder)
     
     if not os.path.exists(sf9_path):
-        shutil.copy('SF9.xlsb', sf9_path)
+        shutil.copy(SF9_TEMPLATE, sf9_path)
     if not os.path.exists(sf10_path):
-        shutil.copy('sf10.xlsx', sf10_path)
+        shutil.copy(SF10_TEMPLATE, sf10_path)
     
     return sf9_path, sf10_path
 
-def process_student_batch(batch_lrns, student_dict, grades_dict, sf9_folder, sf10_folder):
-    """Process a batch of students in a single Excel instance"""
-    app = xw.App(visible=False)
-    app.display_alerts = False
-    app.screen_updating = False
+def load_templates():
+    """
+    Parse SF9.xlsb and sf10.xlsx once with the cells we fill pre-compiled,
+    along with the formulas that read them (formulas.py)
+    """
+    sf9_targets = {**SF9_FRONT_PAGE.targets(), **SF9_GRADES.targets()}
+    sf10_targets = {'FRONT': SF10_FRONT_PAGE.targets()['FRONT'] + SF10_GRADES.targets()['FRONT']}
+    sf9_template = XlsbTemplate(SF9_TEMPLATE, targets=sf9_targets)
+    sf10_template = XlsxTemplate(SF10_TEMPLATE, targets=sf10_targets)
+    sf9_formulas = FormulaGraph(sf9_template, sf9_targets)
+    sf10_formulas = FormulaGraph(sf10_template, sf10_targets)
+    for template, formulas in ((sf9_template, sf9_formulas), (sf10_template, sf10_formulas)):
+        for sheet, cells in formulas.targets().items():
+            template.plan(sheet, cells)
+    return sf9_template, sf10_template, sf9_formulas, sf10_formulas
+
+def render_student(student, student_grades, templates, sf9_folder, sf10_folder):
+    """Write a student's SF9 and SF10 straight from the templates without Excel"""
+    sf9_template, sf10_template, sf9_formulas, sf10_formulas = templates
+    sf9_path, sf10_path = output_paths(student[0], sf9_folder, sf10_folder)
     
-    try:
+    fields = student_values(student)
+    grades = grade_values(student_grades)
+    sf9_cells = SF9_GRADES.cell_values(grades, SF9_FRONT_PAGE.cell_values(fields))
+    sf10_cells = SF10_GRADES.cell_values(grades, SF10_FRONT_PAGE.cell_values(fields))
+    
+    # Averages and remarks carry their computed values, so the files read right without a recalculation
+    sf9_template.render(sf9_path, sf9_formulas.apply(sf9_cells))
+    sf10_template.render(sf10_path, sf10_formulas.apply(sf10_cells))
+
+def process_student_batch(batch_lrns, student_dict, grades_dict, sf9_folder, sf10_folder, templates=None):
+    """
+    Process a batch of students in a single Excel instance.
+    When templates are given, both forms are rendered natively and Excel is never started.
+    """
+    if templates is not None:
+        for lrn in batch_lrns:
+            student = student_dict.get(lrn)
+            if student:
+                render_student(student, grades_dict.get(lrn, []), templates, sf9_folder, sf10_folder)
+        return len(batch_lrns)
+    
+    # Each worker thread keeps its pooled Excel instance across batches
+    with excel_session() as app:
         for lrn in batch_lrns:
-            sf9_path, sf10_path = copy_template_for_student(lrn, sf9_folder, sf10_folder)
-            
             # Get student data
             student = student_dict.get(lrn)
             if not student:
                 continue
-                
-            # Open workbooks
-            wb_sf9 = app.books.open(sf9_path)
-            wb_sf10 = app.books.open(sf10_path)
             
-            try:
-                # Process front page data
-                process_front_page(student, wb_sf9, wb_sf10)
-                
-                # Process grades
-                student_grades = grades_dict.get(lrn, [])
-                process_grades(student_grades, wb_sf9, wb_sf10)
-                
-                # Save and close workbooks
-                wb_sf9.save()
-                wb_sf10.save()
-            finally:
-                wb_sf9.close()
-                wb_sf10.close()
-    finally:
-        app.quit()
+            write_student_with_excel(app, student, grades_dict.get(lrn, []), sf9_folder, sf10_folder)
     
     return len(batch_lrns)
 
-def process_student_files(student_data, grades_data, sf9_folder, sf10_folder, max_workers=4, batch_size=5):
-    """Process SF9 and SF10 files in parallel batches using ThreadPoolExecutor"""
+def write_student_with_excel(app, student, student_grades, sf9_folder, sf10_folder):
+    """Fill a student's SF9 and SF10 copies through an open Excel instance"""
+    sf9_path, sf10_path = copy_template_for_student(student[0], sf9_folder, sf10_folder)
+    
+    # Open workbooks
+    wb_sf9 = app.books.open(sf9_path)
+    wb_sf10 = app.books.open(sf10_path)
+    
+    try:
+        # Process front page data
+        process_front_page(student, wb_sf9, wb_sf10)
+        
+        # Process grades
+        process_grades(student_grades, wb_sf9, wb_sf10)
+        
+        # Save and close workbooks
+        wb_sf9.save()
+        wb_sf10.save()
+    finally:
+        wb_sf9.close()
+        wb_sf10.close()
+
+# Templates parsed once per render worker process
+_worker_templates = None
+
+def _init_render_worker():
+    """Parse the SF9/SF10 templates once when a worker process starts"""
+    global _worker_templates
+    _worker_templates = load_templates()
+
+def _render_payloads(payloads, sf9_folder, sf10_folder):
+    """
+    Render a chunk of compact (student, grades) payloads in a worker process.
+    Grades arrive as (subject_idx, quarter, grade) to keep pickling small.
+    """
+    for student, compact_grades in payloads:
+        lrn = student[0]
+        student_grades = [(lrn, subject_idx, quarter, grade) for subject_idx, quarter, grade in compact_grades]
+        render_student(student, student_grades, _worker_templates, sf9_folder, sf10_folder)
+    return len(payloads)
+
+def render_student_files_parallel(student_dict, grades_dict, sf9_folder, sf10_folder, jobs, chunk_size=None):
+    """
+    Render SF9/SF10 files natively across a pool of worker processes.
+    Yields the running total as each chunk completes.
+    """
+    payloads = [
+        (student, [grade[1:] for grade in grades_dict.get(lrn, [])])
+        for lrn, student in student_dict.items()
+    ]
+    if chunk_size is None:
+        # A few chunks per worker keeps the pool balanced without flooding the pipe
+        chunk_size = max(1, min(50, len(payloads) // (jobs * 4) or 1))
+    chunks = [payloads[i:i+chunk_size] for i in range(0, len(payloads), chunk_size)]
+    
+    total_processed = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_render_worker) as executor:
+        futures = [executor.submit(_render_payloads, chunk, sf9_folder, sf10_folder) for chunk in chunks]
+        for future in as_completed(futures):
+            total_processed += future.result()
+            yield total_processed
+
+def process_student_files(student_data, grades_data, sf9_folder, sf10_folder, max_workers=4, batch_size=5, engine='native', jobs=1):
+    """
+    Process SF9 and SF10 files in parallel batches using ThreadPoolExecutor.
+    engine='native' renders both forms from the templates without Excel; 'excel' uses COM.
+    With the native engine and jobs > 1, rendering is spread over worker processes instead.
+    """
     # Convert student data to dictionary for faster lookup
     student_dict = {student[0]: student for student in student_data}
     
     # Group grades by LRN for faster lookup
-    grades_dict = {}
-    for grade in grades_data:
-        lrn = grade[0]
-        if lrn not in grades_dict:
-            grades_dict[lrn] = []
-        grades_dict[lrn].append(grade)
+    grades_dict = group_grades(grades_data)
+    
+    if engine == 'native' and jobs > 1:
+        for total_processed in render_student_files_parallel(student_dict, grades_dict, sf9_folder, sf10_folder, jobs):
+            print(f"Processed {total_processed}/{len(student_dict)} students")
+        return
     
     # Split students into batches
     student_lrns = list(student_dict.keys())
     batches = [student_lrns[i:i+batch_size] for i in range(0, len(student_lrns), batch_size)]
     
+    # Parse the templates once and share them across all batches
+    templates = load_templates() if engine == 'native' else None
+    
     # Process batches in parallel
     total_processed = 0
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -223,7 +272,8 @@ def process_student_files(student_data, grades_data, sf9_folder, sf10_folder, ma
                 student_dict, 
                 grades_dict, 
                 sf9_folder, 
-                sf10_folder
+                sf10_folder,
+                templates
             ): batch for batch in batches
         }
         
@@ -232,143 +282,147 @@ def process_student_files(student_data, grades_data, sf9_folder, sf10_folder, ma
             total_processed += batch_processed
             print(f"Processed {total_processed}/{len(student_lrns)} students")
 
-def process_front_page(student, wb_sf9, wb_sf10):
-    """Process front page data using batch operations"""
-    front_sf9 = wb_sf9.sheets['FRONT']
-    front_sf10 = wb_sf10.sheets['FRONT']
-    
-    # Unpack student data
-    (lrn, name, section, grade_level, school_id, school_name, school_year, 
-     adviser, gender, birth_date, age, mother_tongue, ip_community, 
-     father_name, mother_name, guardian_name, contact_number) = student
+def stream_student_files(conn, sf9_folder, sf10_folder, engine='native', force=False, flush_every=100):
+    """
+    Render students as they come off the joined cursor, skipping unchanged ones.
+    Memory stays flat however large the school is, and the first file is written
+    as soon as the first stale student is read. Returns (rendered, total).
+    """
+    paths = partial(output_paths, sf9_folder=sf9_folder, sf10_folder=sf10_folder)
+    salt = render_salt([SF9_TEMPLATE, SF10_TEMPLATE])
     
-    # SF9 Front page - batch update
-    sf9_data = {
-        'Q22': name,
-        'T3': lrn,
-        'Q26': section,
-        'R29': school_name,
-        'P40': grade_level,
-        'S40': school_id,
-        'R28': adviser,
-        'Q24': contact_number
-    }
+    total = 0
+    def counted(records):
+        nonlocal total
+        for record in records:
+            total += 1
+            yield record
     
-    # SF10 Front page - batch update
-    sf10_data = {
-        'AS66': section,
-        'G68': school_name,
-        'A92': school_id,
-        'BA66': adviser,
-        'F8': mother_tongue,
-        'Y8': ip_community,
-        'AZ8': father_name,
-        'C9': lrn,
-        'AA9': guardian_name,
-        'AN9': mother_name
-    }
+    app = None
+    templates = None
+    if engine == 'native':
+        templates = load_templates()
+    else:
+        app = get_pool().acquire()
     
-    # Apply all front page updates in one go
-    for cell, value in sf9_data.items():
-        front_sf9.range(cell).value = value
+    rendered = {}
+    count = 0
+    try:
+        for student, student_grades, digest in iter_stale_records(
+                conn, counted(iter_student_records(conn)), paths, salt, force):
+            if templates is not None:
+                render_student(student, student_grades, templates, sf9_folder, sf10_folder)
+            else:
+                write_student_with_excel(app, student, student_grades, sf9_folder, sf10_folder)
+            rendered[student[0]] = digest
+            count += 1
+            
+            # Record progress in small batches so an interrupted run can resume
+            if len(rendered) >= flush_every:
+                record_render_state(conn, rendered, paths)
+                rendered = {}
+                print(f"Processed {count} students")
+    finally:
+        if rendered:
+            record_render_state(conn, rendered, paths)
+        if app is not None:
+            get_pool().release(app)
     
-    for cell, value in sf10_data.items():
-        front_sf10.range(cell).value = value
+    return count, total
 
-def process_grades(student_grades, wb_sf9, wb_sf10):
-    """Process grades for all quarters at once using batch operations"""
-    back_sf9 = wb_sf9.sheets['BACK']
-    front_sf10 = wb_sf10.sheets['FRONT']
+def render_section(conn, sf9_folder, sf10_folder, engine='native', jobs=1, force=False, stream=False):
+    """
+    Render SF9/SF10 for every student in the database whose inputs or output
+    files changed since the last run. Returns (rendered, total).
+    """
+    if stream:
+        print("Streaming students from the database...")
+        rendered, total = stream_student_files(conn, sf9_folder, sf10_folder, engine=engine, force=force)
+        print(f"Rendered {rendered} of {total} students.")
+        return rendered, total
     
-    # Prepare quarter mappings with fixed destination cells for 3rd and 4th quarters
-    quarter_mappings = {
-        1: {'sf9_col': 'C', 'sf9_start_row': 7, 'sf10_col': 'AT', 'sf10_start_row': 31},
-        2: {'sf9_col': 'D', 'sf9_start_row': 7, 'sf10_col': 'AY', 'sf10_start_row': 31},
-        3: {'sf9_col': 'C', 'sf9_start_row': 23, 'sf10_col': 'AT', 'sf10_start_row': 74},
-        4: {'sf9_col': 'D', 'sf9_start_row': 23, 'sf10_col': 'AY', 'sf10_start_row': 74}
-    }
+    # Retrieve all student data from database - use pandas for efficiency
+    print("Retrieving data from database...")
+    students_df = pd.read_sql_query("SELECT * FROM students", conn)
+    student_data = list(students_df.itertuples(index=False, name=None))
+    grades_data = load_grades(conn)
     
-    # Create direct mappings for MFQ3 and MFQ4 fields to correct cells
-    # Format: (subject_idx, quarter): sf9_cell
-    direct_mappings = {
-        (0, 3): 'C23',  # MFQ3 D
-        (1, 3): 'C24',  # MFQ3 E
-        (2, 3): 'C25',  # MFQ3 F
-        (3, 3): 'C26',  # MFQ3 G
-        (4, 3): 'C27',  # MFQ3 H
-        (5, 3): 'C28',  # MFQ3 I
-        (6, 3): 'C30',  # MFQ3 J
-        (7, 3): 'C31',  # MFQ3 K
-        (8, 3): 'C32',  # MFQ3 L
-        (0, 4): 'D23',  # MFQ4 D
-        (1, 4): 'D24',  # MFQ4 E
-        (2, 4): 'D25',  # MFQ4 F
-        (3, 4): 'D26',  # MFQ4 G
-        (4, 4): 'D27',  # MFQ4 H
-        (5, 4): 'D28',  # MFQ4 I
-        (6, 4): 'D30',  # MFQ4 J
-        (7, 4): 'D31',  # MFQ4 K
-        (8, 4): 'D32',  # MFQ4 L
-    }
+    # Only students whose rows, grades or output files changed since the last run are rendered
+    student_dict = {student[0]: student for student in student_data}
+    grades_dict = group_grades(grades_data)
+    paths = partial(output_paths, sf9_folder=sf9_folder, sf10_folder=sf10_folder)
+    salt = render_salt([SF9_TEMPLATE, SF10_TEMPLATE])
+    stale = find_stale_students(conn, student_dict, grades_dict, paths, salt, force=force)
     
-    # Process grades for all quarters
-    sf9_updates = {}
-    sf10_updates = {}
-    for grade_info in student_grades:
-        lrn, subject_idx, quarter, grade = grade_info
-        if grade is None:
-            continue
-        if quarter <= 2:
-            mapping = quarter_mappings[quarter]
-            sf9_row = mapping['sf9_start_row'] + subject_idx
-            if subject_idx in [3, 4, 5]:
-                sf9_row += 1
-            elif subject_idx in [6, 7]:
-                sf9_row += 2
-            elif subject_idx == 8:
-                sf9_row += 2
-            sf9_cell = f"{mapping['sf9_col']}{sf9_row}"
-            sf10_cell = f"{mapping['sf10_col']}{mapping['sf10_start_row'] + subject_idx}"
-            
-            sf9_updates[sf9_cell] = grade
-            sf10_updates[sf10_cell] = grade
-        else:
-            sf9_cell = direct_mappings.get((subject_idx, quarter))
-            if sf9_cell:
-                sf9_updates[sf9_cell] = grade
-            mapping = quarter_mappings[quarter]
-            sf10_cell = f"{mapping['sf10_col']}{mapping['sf10_start_row'] + subject_idx}"
-            sf10_updates[sf10_cell] = grade
-    for cell, value in sf9_updates.items():
-        back_sf9.range(cell).value = value
-    for cell, value in sf10_updates.items():
-        front_sf10.range(cell).value = value
-def main():
+    if stale:
+        stale_students = [student_dict[lrn] for lrn in stale]
+        stale_grades = [grade for lrn in stale for grade in grades_dict.get(lrn, [])]
+        
+        # Process student files in parallel batches
+        print(f"Processing {len(stale_students)} of {len(student_data)} students...")
+        process_student_files(stale_students, stale_grades, sf9_folder, sf10_folder, 
+                             max_workers=min(4, os.cpu_count()), batch_size=5,
+                             engine=engine, jobs=max(1, jobs))
+        record_render_state(conn, stale, paths)
+    else:
+        print(f"All {len(student_data)} students are up to date.")
+    return len(stale), len(student_data)
+
+def process_front_page(student, wb_sf9, wb_sf10):
+    """Write the front page fields using the compiled SF9/SF10 plans"""
+    fields = student_values(student)
+    SF9_FRONT_PAGE.write(wb_sf9, fields)
+    SF10_FRONT_PAGE.write(wb_sf10, fields)
+
+def process_grades(student_grades, wb_sf9, wb_sf10):
+    """Write all quarters at once, one range write per contiguous column run"""
+    grades = grade_values(student_grades)
+    SF9_GRADES.write(wb_sf9, grades)
+    SF10_GRADES.write(wb_sf10, grades)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate SF9/SF10 files for every student in the section")
+    parser.add_argument('--engine', choices=['native', 'excel'], default='native',
+                        help="render templates natively or through Excel (default: native)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for native rendering, native engine only (default: 1)")
+    parser.add_argument('--force', action='store_true',
+                        help="re-render every student even if nothing changed")
+    parser.add_argument('--stream', action='store_true',
+                        help="render students one at a time straight from the database (constant memory, ignores --jobs)")
+    parser.add_argument('--packed-grades', action='store_true',
+                        help="also keep each student's grades as one packed row (stays on for this database)")
+    parser.add_argument('--archive', metavar='PATH',
+                        help="afterwards, write the students and their packed grades to a compact database at PATH")
+    args = parser.parse_args(argv)
+    if args.engine == 'excel' and args.jobs > 1:
+        parser.error("--jobs only applies to --engine native; Excel renders one student at a time")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
     start_time = time.time()
     sf9_folder, sf10_folder = create_folders()
     
     # Create and setup database
     conn = create_database()
+    create_render_state_table(conn)
+    if args.packed_grades and not has_grade_vectors(conn):
+        enable_packed_grades(conn)
     
     # Load MFQ file paths
     mfq_paths = ['MFQ1.xlsx', 'MFQ2.xlsx', 'MFQ3.xlsx', 'MFQ4.xlsx']
     
     # Extract data from Excel to SQLite
     print("Loading data from Excel to database...")
-    load_data_from_excel_to_db(conn, mfq_paths)
+    load_data_from_excel_to_db(conn, mfq_paths, engine=args.engine)
     
-    # Retrieve all student data from database - use pandas for efficiency
-    print("Retrieving data from database...")
-    students_df = pd.read_sql_query("SELECT * FROM students", conn)
-    grades_df = pd.read_sql_query("SELECT * FROM grades", conn)
-    
-    student_data = list(students_df.itertuples(index=False, name=None))
-    grades_data = list(grades_df.itertuples(index=False, name=None))
+    render_section(conn, sf9_folder, sf10_folder, engine=args.engine, jobs=args.jobs,
+                   force=args.force, stream=args.stream)
     
-    # Process student files in parallel batches
-    print(f"Processing {len(student_data)} students...")
-    process_student_files(student_data, grades_data, sf9_folder, sf10_folder, 
-                         max_workers=min(4, os.cpu_count()), batch_size=5)
+    if args.archive:
+        archive_database(conn, args.archive)
+        print(f"Section archived to {args.archive}")
     
     # Close database connection
     conn.close()
@@ -0,0 +1,205 @@
+"""
+Derived grades for a whole section in one vectorized pass.
+
+The section's grades are loaded as a students x 9 subjects x 4 quarters
+array (NaN where there is no numeric grade); quarters 1-2 make the first
+semester and quarters 3-4 the second, as on the SF9 and SF10. The two forms
+round differently, so both sets of values are kept, each as its form
+computes it:
+
+    final rating     ROUND(AVERAGE(both quarters)), blank unless both are there (SF10 FRONT BD31)
+    remarks          PASSED at 75 and up, FAILED below (SF10 FRONT BI31)
+    semester average ROUND(AVERAGE(final ratings of the semester)) (SF10 FRONT BD43/BD86)
+    final mean       AVERAGE(quarters of the semester), unrounded (SF9 BACK E7)
+    semester mean    AVERAGE(final means of the semester), unrounded (SF9 BACK E18/E33)
+    general average  ROUND(AVERAGE(semester averages)), ranked within the section
+
+Neither form has a general average formula; it applies the SF10 semester
+rule one level up. Rounding is formulas.excel_round, the ROUND the rendered
+forms are evaluated with.
+
+Results are kept in the final_ratings and general_averages tables next to
+the grades they come from; only rows whose values changed are written.
+"""
+import json
+from collections import namedtuple
+import numpy as np
+from studentdb import SUBJECTS, QUARTERS, has_grade_vectors
+from formulas import excel_round
+
+SEMESTERS = 2
+PASSING_GRADE = 75
+PASSED = 'PASSED'
+FAILED = 'FAILED'
+
+# finals, final_means: (n, SUBJECTS, SEMESTERS); semester_averages, semester_means: (n, SEMESTERS);
+# general_average, ranks: (n,). Missing values are NaN, ranks of students without a general average are 0
+GradeResults = namedtuple('GradeResults', ['finals', 'final_means', 'semester_averages', 'semester_means',
+                                           'general_average', 'ranks'])
+
+
+def _drop_older_layout(conn, table, column):
+    """Drop table if it predates column; the results tables only hold derived values"""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if columns and column not in columns:
+        conn.execute(f'DROP TABLE {table}')
+
+
+def create_results_tables(conn):
+    """Final ratings per subject and semester, and one averages row per student"""
+    _drop_older_layout(conn, 'final_ratings', 'mean')
+    _drop_older_layout(conn, 'general_averages', 'first_semester_mean')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS final_ratings (
+        lrn TEXT,
+        semester INTEGER,
+        subject_idx INTEGER,
+        mean REAL,
+        rating REAL,
+        remarks TEXT,
+        PRIMARY KEY (lrn, semester, subject_idx)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS general_averages (
+        lrn TEXT PRIMARY KEY,
+        first_semester REAL,
+        second_semester REAL,
+        first_semester_mean REAL,
+        second_semester_mean REAL,
+        general_average REAL,
+        remarks TEXT,
+        rank INTEGER
+    )
+    ''')
+    conn.commit()
+
+
+def load_grade_array(conn):
+    """(lrns, grades) with grades[student, subject_idx, quarter - 1]; non-numeric grades are NaN"""
+    lrns = [row[0] for row in conn.execute('SELECT lrn FROM students ORDER BY lrn')]
+    index = {lrn: i for i, lrn in enumerate(lrns)}
+    grades = np.full((len(lrns), SUBJECTS, QUARTERS), np.nan)
+
+    if has_grade_vectors(conn):
+        # A packed vector already has the array's memory layout
+        unpacked = []
+        for lrn, blob in conn.execute('SELECT lrn, grades FROM grade_vectors'):
+            if lrn not in index:
+                continue
+            if blob is None:
+                unpacked.append(lrn)
+            else:
+                grades[index[lrn]] = np.frombuffer(blob, dtype='<f8').reshape(SUBJECTS, QUARTERS)
+        # Students that could not be packed keep their rows
+        rows = conn.execute(
+            'SELECT lrn, subject_idx, quarter, grade FROM grades WHERE lrn IN (SELECT value FROM json_each(?))',
+            (json.dumps(unpacked),))
+    else:
+        rows = conn.execute('SELECT lrn, subject_idx, quarter, grade FROM grades')
+
+    for lrn, subject_idx, quarter, grade in rows:
+        if lrn in index and isinstance(grade, (int, float)):
+            grades[index[lrn], subject_idx, quarter - 1] = grade
+    return lrns, grades
+
+
+def _round(values):
+    """formulas.excel_round over an array, once per distinct value"""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    rounded = np.array([excel_round(value) for value in distinct], dtype=float)
+    return rounded[inverse].reshape(values.shape)
+
+
+def _average(values, axis):
+    """Mean over axis ignoring NaN; NaN where nothing is there"""
+    present = ~np.isnan(values)
+    count = present.sum(axis=axis)
+    total = np.where(present, values, 0).sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def compute(grades):
+    """GradeResults for a (students, SUBJECTS, QUARTERS) grade array"""
+    by_semester = grades.reshape(len(grades), SUBJECTS, SEMESTERS, QUARTERS // SEMESTERS)
+
+    # NaN in either quarter leaves the final rating blank, like the SF10 formula
+    finals = _round(by_semester.mean(axis=3))
+    semester_averages = _round(_average(finals, axis=1))
+    # AVERAGE skips blank cells, like the SF9 formulas
+    final_means = _average(by_semester, axis=3)
+    semester_means = _average(final_means, axis=1)
+    general_average = _round(_average(semester_averages, axis=1))
+    return GradeResults(finals, final_means, semester_averages, semester_means, general_average,
+                        rank(general_average))
+
+
+def rank(values):
+    """1 for the highest value, ties share a rank (1, 1, 3); NaN ranks 0"""
+    ranked = ~np.isnan(values)
+    ordered = np.sort(values[ranked])
+    ranks = np.zeros(len(values), dtype=np.int64)
+    ranks[ranked] = len(ordered) - np.searchsorted(ordered, values[ranked], side='right') + 1
+    return ranks
+
+
+def remarks(values):
+    """PASSED/FAILED per value, None where there is no value"""
+    return np.where(np.isnan(values), None, np.where(values >= PASSING_GRADE, PASSED, FAILED))
+
+
+def _number(value):
+    return None if np.isnan(value) else float(value)
+
+
+def store_results(conn, lrns, results):
+    """Upsert final ratings and averages, writing only rows whose values changed"""
+    final_remarks = remarks(results.finals)
+    average_remarks = remarks(results.general_average)
+
+    final_rows = [
+        (lrn, semester + 1, subject_idx, _number(results.final_means[i, subject_idx, semester]),
+         _number(results.finals[i, subject_idx, semester]), final_remarks[i, subject_idx, semester])
+        for i, lrn in enumerate(lrns)
+        for semester in range(SEMESTERS)
+        for subject_idx in range(SUBJECTS)
+    ]
+    average_rows = [
+        (lrn, _number(results.semester_averages[i, 0]), _number(results.semester_averages[i, 1]),
+         _number(results.semester_means[i, 0]), _number(results.semester_means[i, 1]),
+         _number(results.general_average[i]), average_remarks[i], int(results.ranks[i]) or None)
+        for i, lrn in enumerate(lrns)
+    ]
+
+    with conn:
+        conn.executemany('''
+            INSERT INTO final_ratings VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(lrn, semester, subject_idx) DO UPDATE SET
+                mean = excluded.mean, rating = excluded.rating, remarks = excluded.remarks
+            WHERE mean IS NOT excluded.mean OR rating IS NOT excluded.rating
+               OR remarks IS NOT excluded.remarks
+        ''', final_rows)
+        conn.executemany('''
+            INSERT INTO general_averages VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(lrn) DO UPDATE SET
+                first_semester = excluded.first_semester, second_semester = excluded.second_semester,
+                first_semester_mean = excluded.first_semester_mean,
+                second_semester_mean = excluded.second_semester_mean,
+                general_average = excluded.general_average, remarks = excluded.remarks, rank = excluded.rank
+            WHERE first_semester IS NOT excluded.first_semester
+               OR second_semester IS NOT excluded.second_semester
+               OR first_semester_mean IS NOT excluded.first_semester_mean
+               OR second_semester_mean IS NOT excluded.second_semester_mean
+               OR general_average IS NOT excluded.general_average
+               OR rank IS NOT excluded.rank
+        ''', average_rows)
+
+
+def refresh_results(conn):
+    """Recompute the whole section from the database and store what changed; returns (lrns, results)"""
+    create_results_tables(conn)
+    lrns, grades = load_grade_array(conn)
+    results = compute(grades)
+    store_results(conn, lrns, results)
+    return lrns, results
\ No newline at end of file
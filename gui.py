@@ -3,13 +3,11 @@ import customtkinter as ctk
 import threading
 import queue
 import sys
-import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 import logging
 from datetime import datetime
 import os
 import nig  # importing your existing script
+from watcher import CoalescingWatcher
 
 class OutputRedirector:
     def __init__(self, queue):
@@ -21,18 +19,10 @@ class OutputRedirector:
     def flush(self):
         pass
 
-class ExcelFileHandler(FileSystemEventHandler):
-    def __init__(self, callback):
-        self.callback = callback
-        self.last_modified = time.time()
-        self.cooldown = 1  # 1 second cooldown between processing
-
-    def on_modified(self, event):
-        if event.src_path.endswith('.xlsx'):
-            current_time = time.time()
-            if current_time - self.last_modified > self.cooldown:
-                self.last_modified = current_time
-                self.callback()
+def is_workbook(path):
+    """.xlsx workbooks, but not the ~$ lock files Excel creates when one is opened"""
+    name = os.path.basename(path)
+    return name.endswith('.xlsx') and not name.startswith('~$')
 
 class MonitoringApp:
     def __init__(self):
@@ -75,7 +65,7 @@ class MonitoringApp:
         self.output_text.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
         
         # Initialize variables
-        self.observer = None
+        self.watcher = None
         self.running = False
         self.output_queue = queue.Queue()
         
@@ -97,23 +87,22 @@ class MonitoringApp:
             self.running = True
             self.log_message("Starting Excel file monitoring...")
             
-            # Create observer for file system events
-            self.observer = Observer()
-            handler = ExcelFileHandler(self.process_excel_files)
-            self.observer.schedule(handler, path=".", recursive=False)
-            self.observer.start()
+            # A burst of saves becomes one run; nig's own SF5A/SF5B saves are ignored
+            self.watcher = CoalescingWatcher(".", self.process_excel_files, match=is_workbook, window=1.0)
+            self.watcher.start()
 
     def stop_monitoring(self):
         if self.running:
             self.running = False
-            if self.observer:
-                self.observer.stop()
-                self.observer.join()
+            if self.watcher:
+                self.watcher.stop()
+                self.watcher = None
             self.log_message("Stopped Excel file monitoring.")
 
-    def process_excel_files(self):
+    def process_excel_files(self, paths):
         try:
-            self.log_message("Changes detected, processing Excel files...")
+            names = ', '.join(os.path.basename(path) for path in paths)
+            self.log_message(f"Changes detected in {names}, processing Excel files...")
             nig.main()  # Run your existing script
             self.log_message("Processing completed successfully.")
         except Exception as e:
@@ -84,7 +84,7 @@ class StudentManagementGUI:
         
         # Transfer to SF5AB Button
         transfer_to_sf5ab_btn = ctk.CTkButton(left_frame, text="Transfer to SF5AB", 
-                                  command=lambda: self.run_script_async('nig.py'),
+                                  command=lambda: self.run_script_async('stagegraph.py', 'sf5'),
                                   fg_color="#7289da", hover_color="#5b6eae")
         transfer_to_sf5ab_btn.pack(pady=10)
         
@@ -96,7 +96,7 @@ class StudentManagementGUI:
         
         # Transfer Data Button
         transfer_btn = ctk.CTkButton(left_frame, text="Transfer Grades to Master Forms",
-                                   command=lambda: self.run_script_async('trans.py'),
+                                   command=lambda: self.run_script_async('stagegraph.py', 'roster'),
                                    fg_color="#7289da", hover_color="#5b6eae")
         transfer_btn.pack(pady=10)
         
@@ -112,7 +112,7 @@ class StudentManagementGUI:
         
         # Finish & Encode Button
         finish_btn = ctk.CTkButton(right_frame, text="Finish & Encode",
-                                 command=lambda: self.run_script_async('grade.py'),
+                                 command=lambda: self.run_script_async('stagegraph.py', 'forms'),
                                  fg_color="#7289da", hover_color="#5b6eae")
         finish_btn.pack(pady=10)
         
@@ -385,23 +385,24 @@ class StudentManagementGUI:
         cancel_btn.pack(pady=10)
     
     # New method for running scripts asynchronously
-    def run_script_async(self, script_name):
+    # Buttons build stage graph targets; stages whose inputs are unchanged are skipped
+    def run_script_async(self, script_name, *args):
         if not self.executing:
             self.executing = True
-            self.set_status(f"Running {script_name}...", is_running=True)
-            thread = threading.Thread(target=self.run_script, args=(script_name,), daemon=True)
+            self.set_status(f"Running {' '.join((script_name,) + args)}...", is_running=True)
+            thread = threading.Thread(target=self.run_script, args=(script_name,) + args, daemon=True)
             thread.start()
         else:
             messagebox.showwarning("Warning", "A script is already running. Please wait until it finishes.")
     
-    def run_script(self, script_name):
+    def run_script(self, script_name, *args):
         # Disable all buttons during execution
         for widget in self.root.winfo_children():
             if isinstance(widget, ctk.CTkButton):
                 widget.configure(state="disabled")
         
         try:
-            result = subprocess.run([sys.executable, script_name], 
+            result = subprocess.run([sys.executable, script_name, *args], 
                                   capture_output=True, text=True)
             success = result.returncode == 0
             
@@ -1,11 +1,22 @@
-import xlwings as xw
 import os
 import shutil
-import sqlite3
 import time
 import pandas as pd
 import logging
 from datetime import datetime
+from mfq import read_mfq_blocks, extract_records
+from delta import sync_records, affected_lrns, changed_cells
+from gradecalc import refresh_results
+from cellmap import SF9_FRONT_PAGE, SF10_FRONT_PAGE, SF9_GRADES, SF10_GRADES, student_values, grade_values
+from xlsxpatch import XlsxTemplate
+from xlsbpatch import XlsbTemplate
+from formulas import FormulaGraph
+from grade import load_templates, render_student
+from watcher import CoalescingWatcher
+from excelpool import get_pool
+from studentdb import get_db
+
+ARCHIVE_PATH = 'student_records_archive.db'
 
 # Setup logging
 logging.basicConfig(
@@ -15,20 +26,31 @@ logging.basicConfig(
 )
 
 class AutoTransferSystem:
-    def __init__(self):
+    def __init__(self, packed_grades=False):
         self.db_path = 'student_records.db'
         self.base_folder = 'SF9SF10'
         self.sf9_folder = os.path.join(self.base_folder, 'SF9')
         self.sf10_folder = os.path.join(self.base_folder, 'SF10')
         self.mfq_paths = ['MFQ1.xlsx', 'MFQ2.xlsx', 'MFQ3.xlsx', 'MFQ4.xlsx']
         
+        # 'native' reads the MFQ sheet XML directly; 'excel' reads through xlwings
+        self.engine = 'native'
+        
+        # Changes arriving within this many seconds of each other are processed together
+        self.debounce_window = 0.5
+        
+        # Also keep each student's grades as one packed row (see studentdb.py);
+        # must be known before setup_database opens the database
+        self.packed_grades = packed_grades
+        
         # Create necessary folders
         self.create_folders()
         
         # Create or connect to database
         self.setup_database()
         
-        # Setup Excel application
+        # Setup Excel application; pooled instances survive between monitoring events
+        self.pool = get_pool()
         self.app = None
 
     def create_folders(self):
@@ -37,57 +59,15 @@ class AutoTransferSystem:
         os.makedirs(self.sf10_folder, exist_ok=True)
 
     def setup_database(self):
-        """Create or connect to SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA synchronous=NORMAL")
-        cursor = conn.cursor()
-        
-        # Create tables for student info and grades
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            lrn TEXT PRIMARY KEY,
-            name TEXT,
-            section TEXT,
-            grade_level TEXT,
-            school_id TEXT,
-            school_name TEXT,
-            school_year TEXT,
-            adviser TEXT,
-            gender TEXT,
-            birth_date TEXT,
-            age TEXT,
-            mother_tongue TEXT,
-            ip_community TEXT,
-            father_name TEXT,
-            mother_name TEXT,
-            guardian_name TEXT,
-            contact_number TEXT
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS grades (
-            lrn TEXT,
-            subject_idx INTEGER,
-            quarter INTEGER,
-            grade REAL,
-            PRIMARY KEY (lrn, subject_idx, quarter),
-            FOREIGN KEY (lrn) REFERENCES students(lrn)
-        )
-        ''')
-        
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_grades_lrn ON grades(lrn)')
-        
-        conn.commit()
-        conn.close()
+        """Open the shared connection to the SQLite database, creating the tables if needed"""
+        self.db = get_db(self.db_path)
+        if self.packed_grades and not self.db.packed:
+            self.db.enable_packed_grades()
         logging.info("Database setup completed")
 
     def install_excel_macros(self):
         """Install macros in MFQ files to trigger data transfer on change"""
-        self.app = xw.App(visible=False)
-        self.app.display_alerts = False
-        self.app.screen_updating = False
+        self.app = self.pool.acquire()
         
         try:
             for path in self.mfq_paths:
@@ -95,7 +75,7 @@ class AutoTransferSystem:
             
             logging.info("Macros installed in all MFQ files")
         finally:
-            self.app.quit()
+            self.pool.release(self.app)
             self.app = None
 
     def install_macro_in_file(self, file_path):
@@ -154,194 +134,195 @@ class AutoTransferSystem:
 
     def start_monitoring(self):
         """Start monitoring for data changes and process transfers"""
-        trigger_path = os.path.join(os.path.dirname(self.mfq_paths[0]), "data_changed.trigger")
+        mfq_folder = os.path.dirname(os.path.abspath(self.mfq_paths[0]))
+        trigger_path = os.path.join(mfq_folder, "data_changed.trigger")
+        watched = {os.path.basename(path) for path in self.mfq_paths} | {"data_changed.trigger"}
         logging.info("Starting monitoring for data changes...")
         
+        watcher = CoalescingWatcher(
+            mfq_folder,
+            self.process_changes,
+            match=lambda path: os.path.basename(path) in watched,
+            window=self.debounce_window
+        )
+        watcher.start()
+        
+        # Pick up a trigger left behind while we were not running
+        if os.path.exists(trigger_path):
+            watcher.notify(trigger_path)
+        
         try:
-            while True:
-                if os.path.exists(trigger_path):
-                    try:
-                        # Read the trigger file
-                        with open(trigger_path, 'r') as f:
-                            workbook_name = f.readline().strip()
-                            sheet_name = f.readline().strip()
-                            cell_address = f.readline().strip()
-                            timestamp = f.readline().strip()
-                        
-                        # Remove the trigger file
-                        os.remove(trigger_path)
-                        
-                        # Process the data change
-                        logging.info(f"Data change detected in {workbook_name}, {sheet_name}, {cell_address}")
-                        self.process_data_change(workbook_name)
-                        
-                    except Exception as e:
-                        logging.error(f"Error processing trigger: {str(e)}")
-                        if os.path.exists(trigger_path):
-                            os.remove(trigger_path)
-                
-                # Sleep to avoid high CPU usage
-                time.sleep(2)
-                
+            while watcher.is_alive():
+                time.sleep(1)
         except KeyboardInterrupt:
             logging.info("Monitoring stopped by user")
             print("Monitoring stopped.")
+        finally:
+            watcher.stop()
+
+    def process_changes(self, paths):
+        """Handle one coalesced batch of MFQ saves and trigger files with a single update"""
+        names = sorted({os.path.basename(path) for path in paths})
+        
+        for path in paths:
+            if os.path.basename(path) != "data_changed.trigger" or not os.path.exists(path):
+                continue
+            try:
+                # Read the trigger file
+                with open(path, 'r') as f:
+                    workbook_name = f.readline().strip()
+                    sheet_name = f.readline().strip()
+                    cell_address = f.readline().strip()
+                    timestamp = f.readline().strip()
+                logging.info(f"Data change detected in {workbook_name}, {sheet_name}, {cell_address}")
+                names.append(workbook_name)
+            except Exception as e:
+                logging.error(f"Error processing trigger: {str(e)}")
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        # Process the data change once for the whole batch
+        self.process_data_change(', '.join(name for name in dict.fromkeys(names) if name != "data_changed.trigger"))
 
     def process_data_change(self, workbook_name):
         """Process the data change in the specified workbook"""
         try:
-            # Extract the quarter from the workbook name
-            if workbook_name.startswith("MFQ"):
-                quarter = int(workbook_name[3:4])
-            else:
-                quarter = 1  # Default to first quarter if not recognized
-            
-            # Update database from all MFQ files for consistency
-            self.update_database_from_excel()
+            # Diff all MFQ files against the database; only changed cells come back
+            delta = self.update_database_from_excel()
+            if delta is None:
+                return
             
-            # Get affected students and process their SF files
-            affected_students = self.get_affected_students(quarter)
-            if affected_students:
-                self.update_sf_files(affected_students)
+            # Patch just those cells in the affected students' SF files
+            affected = affected_lrns(delta)
+            if affected:
+                self.patch_sf_files(delta)
                 
-            logging.info(f"Processed changes for {len(affected_students)} students")
+            logging.info(f"Processed {changed_cells(delta)} changed cells in {workbook_name} for {len(affected)} students")
             
         except Exception as e:
             logging.error(f"Error processing data change: {str(e)}")
 
     def update_database_from_excel(self):
-        """Update the database with current data from Excel files"""
-        conn = sqlite3.connect(self.db_path)
-        app = xw.App(visible=False)
-        app.display_alerts = False
-        app.screen_updating = False
-        
+        """
+        Update the database with current data from Excel files.
+        Returns the Delta of fields and grades that actually changed, or None on error.
+        """
         try:
-            # Open all MFQ workbooks
-            mfq_workbooks = [app.books.open(path) for path in self.mfq_paths]
-            
-            # Process student information from MFQ1
-            wb_mfq1 = mfq_workbooks[0]
-            sheet = wb_mfq1.sheets[0]
+            # Read each MFQ workbook as a single block and slice it in memory
+            if self.engine == 'native':
+                blocks = read_mfq_blocks(self.mfq_paths)
+            else:
+                with self.pool.session() as app:
+                    blocks = read_mfq_blocks(self.mfq_paths, app)
             
-            student_ranges = list(range(6, 50)) + list(range(52, 101))
+            student_data, grades_data = extract_records(blocks)
             
-            # Get all student LRNs to check which have data
-            student_lrns = []
-            for student_row in student_ranges:
-                lrn = sheet.range(f'A{student_row}').value
-                if lrn:
-                    student_lrns.append(lrn)
+            # Write only the rows that differ from the stored snapshot
+            with self.db.lock:
+                delta = sync_records(self.db.conn, student_data, grades_data)
+                if affected_lrns(delta):
+                    # A changed grade can move anyone's rank, so the whole section is recomputed
+                    refresh_results(self.db.conn)
             
-            # Clear existing data for these students to avoid duplicates
-            cursor = conn.cursor()
-            placeholders = ','.join(['?' for _ in student_lrns])
-            cursor.execute(f"DELETE FROM students WHERE lrn IN ({placeholders})", student_lrns)
-            cursor.execute(f"DELETE FROM grades WHERE lrn IN ({placeholders})", student_lrns)
+            logging.info(f"Read {len(student_data)} students and {len(grades_data)} grade records; "
+                         f"{changed_cells(delta)} cells changed")
+            return delta
             
-            # Prepare batch data for students and grades
-            student_data = []
-            grades_data = []
+        except Exception as e:
+            logging.error(f"Error updating database: {str(e)}")
+            return None
+
+    def patch_sf_files(self, delta):
+        """Write only the changed fields and grades into each affected student's SF9/SF10"""
+        app = None
+        
+        try:
+            lrns = affected_lrns(delta)
             
-            adviser_value = sheet.range('R28').value
+            # Students without files yet get them generated in full, fetched in one query
+            missing = [lrn for lrn in lrns
+                       if not (os.path.exists(os.path.join(self.sf9_folder, f"{lrn}.xlsb")) and
+                               os.path.exists(os.path.join(self.sf10_folder, f"{lrn}.xlsx")))]
+            if missing:
+                new_students = self.db.students(missing)
+                if self.engine == 'native':
+                    templates = load_templates()
+                    new_grades = self.db.grades_by_lrn(missing)
+                    for student in new_students:
+                        render_student(student, new_grades[student[0]], templates, self.sf9_folder, self.sf10_folder)
+                else:
+                    app = self.pool.acquire()
+                    self.update_sf_files(new_students, app)
+                for student in new_students:
+                    logging.info(f"Created SF files for student {student[0]}")
             
-            # Batch process student information
-            for student_row in student_ranges:
-                lrn = sheet.range(f'A{student_row}').value
-                if not lrn:
+            for lrn in lrns:
+                if lrn in missing:
                     continue
                 
-                # Extract student info
-                student_info = (
-                    lrn,
-                    sheet.range(f'B{student_row}').value,
-                    sheet.range(f'Q{student_row}').value,
-                    sheet.range(f'P{student_row}').value,
-                    sheet.range(f'S{student_row}').value,
-                    sheet.range(f'R{student_row}').value,
-                    sheet.range(f'T{student_row}').value,
-                    adviser_value,
-                    'Male' if student_row < 51 else 'Female',
-                    sheet.range(f'Q{student_row}').value,
-                    sheet.range(f'F{student_row}').value,
-                    sheet.range(f'AW{student_row}').value,
-                    sheet.range(f'AX{student_row}').value,
-                    sheet.range(f'AY{student_row}').value,
-                    sheet.range(f'BA{student_row}').value,
-                    sheet.range(f'BC{student_row}').value,
-                    sheet.range(f'BB{student_row}').value
-                )
+                sf9_path = os.path.join(self.sf9_folder, f"{lrn}.xlsb")
+                sf10_path = os.path.join(self.sf10_folder, f"{lrn}.xlsx")
                 
-                student_data.append(student_info)
+                fields = delta.students.get(lrn, {})
+                grades = delta.grades.get(lrn, {})
                 
-                # Extract grades for all quarters
-                rows = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L']
+                if self.engine == 'native':
+                    self.patch_file(sf9_path, [(SF9_FRONT_PAGE, fields), (SF9_GRADES, grades)])
+                    self.patch_file(sf10_path, [(SF10_FRONT_PAGE, fields), (SF10_GRADES, grades)])
+                else:
+                    app = app or self.pool.acquire()
+                    
+                    wb_sf9 = app.books.open(sf9_path)
+                    wb_sf10 = app.books.open(sf10_path)
+                    try:
+                        SF9_FRONT_PAGE.write(wb_sf9, fields, clear_missing=False)
+                        SF10_FRONT_PAGE.write(wb_sf10, fields, clear_missing=False)
+                        SF9_GRADES.write(wb_sf9, grades, clear_missing=False)
+                        SF10_GRADES.write(wb_sf10, grades, clear_missing=False)
+                        wb_sf9.save()
+                        wb_sf10.save()
+                    finally:
+                        wb_sf9.close()
+                        wb_sf10.close()
                 
-                for q_idx, wb in enumerate(mfq_workbooks, 1):
-                    for subject_idx, row in enumerate(rows):
-                        if subject_idx == 8 and q_idx < 3:
-                            continue
-                        
-                        grade = wb.sheets[0].range(f'{row}{student_row}').value
-                        if grade is not None:
-                            grades_data.append((lrn, subject_idx, q_idx, grade))
-            
-            # Insert data in a single transaction
-            with conn:
-                conn.executemany(
-                    'INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                    student_data
-                )
+                logging.info(f"Patched {len(fields) + len(grades)} cells for student {lrn}")
                 
-                conn.executemany(
-                    'INSERT OR REPLACE INTO grades VALUES (?, ?, ?, ?)',
-                    grades_data
-                )
-            
-            logging.info(f"Updated database with {len(student_data)} students and {len(grades_data)} grade records")
-            
         except Exception as e:
-            logging.error(f"Error updating database: {str(e)}")
+            logging.error(f"Error patching SF files: {str(e)}")
         finally:
-            # Close workbooks and Excel application
-            for wb in mfq_workbooks:
-                wb.close()
-            app.quit()
-            conn.close()
+            if app is not None:
+                self.pool.release(app)
 
-    def get_affected_students(self, quarter):
-        """Get students affected by changes in the specified quarter"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get all students with grades in the specified quarter
-        cursor.execute("""
-            SELECT DISTINCT s.* 
-            FROM students s
-            JOIN grades g ON s.lrn = g.lrn
-            WHERE g.quarter = ?
-        """, (quarter,))
-        
-        students = cursor.fetchall()
-        conn.close()
+    def patch_file(self, path, plans):
+        """Patch keyed values into an existing SF file without Excel, replacing it atomically"""
+        cells = {}
+        for plan, values in plans:
+            plan.cell_values(values, cells)
+        cells = {sheet: sheet_cells for sheet, sheet_cells in cells.items() if sheet_cells}
+        if not cells:
+            return
         
-        return students
+        template = XlsbTemplate(path) if path.endswith('.xlsb') else XlsxTemplate(path)
+        # Recompute the formulas reading the patched cells, over what the file already holds
+        formulas = FormulaGraph(template, {sheet: list(sheet_cells) for sheet, sheet_cells in cells.items()})
+        temp_path = path + '.tmp'
+        template.render(temp_path, formulas.apply(cells))
+        os.replace(temp_path, path)
 
-    def update_sf_files(self, students):
-        """Update SF9 and SF10 files for the specified students"""
-        conn = sqlite3.connect(self.db_path)
-        app = xw.App(visible=False)
-        app.display_alerts = False
-        app.screen_updating = False
+    def update_sf_files(self, students, app=None):
+        """Update SF9 and SF10 files for the specified students, borrowing Excel from the pool unless given one"""
+        borrowed = app is None
+        if borrowed:
+            app = self.pool.acquire()
         
         try:
+            # Every student's grades in one grouped query
+            grades_by_lrn = self.db.grades_by_lrn([student[0] for student in students])
+            
             for student in students:
                 lrn = student[0]
-                
-                # Get student's grades
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM grades WHERE lrn = ?", (lrn,))
-                grades = cursor.fetchall()
+                grades = grades_by_lrn[lrn]
                 
                 # Copy template files if they don't exist
                 sf9_path = os.path.join(self.sf9_folder, f"{lrn}.xlsb")
@@ -377,102 +358,21 @@ class AutoTransferSystem:
         except Exception as e:
             logging.error(f"Error updating SF files: {str(e)}")
         finally:
-            app.quit()
-            conn.close()
+            if borrowed:
+                self.pool.release(app)
 
     def update_front_page(self, student, wb_sf9, wb_sf10):
         """Update front page data in SF9 and SF10 files"""
-        front_sf9 = wb_sf9.sheets['FRONT']
-        front_sf10 = wb_sf10.sheets['FRONT']
-        
-        # Unpack student data
-        (lrn, name, section, grade_level, school_id, school_name, school_year, 
-         adviser, gender, birth_date, age, mother_tongue, ip_community, 
-         father_name, mother_name, guardian_name, contact_number) = student
-        
-        # SF9 Front page updates
-        sf9_data = {
-            'Q22': name,
-            'T3': lrn,
-            'Q26': section,
-            'R29': school_name,
-            'P40': grade_level,
-            'S40': school_id,
-            'R28': adviser,
-            'Q24': contact_number
-        }
-        
-        # SF10 Front page updates
-        sf10_data = {
-            'AS66': section,
-            'G68': school_name,
-            'A92': school_id,
-            'BA66': adviser,
-            'F8': mother_tongue,
-            'Y8': ip_community,
-            'AZ8': father_name,
-            'C9': lrn,
-            'AA9': guardian_name,
-            'AN9': mother_name
-        }
-        
-        # Apply updates
-        for cell, value in sf9_data.items():
-            front_sf9.range(cell).value = value
-        
-        for cell, value in sf10_data.items():
-            front_sf10.range(cell).value = value
+        fields = student_values(student)
+        SF9_FRONT_PAGE.write(wb_sf9, fields)
+        SF10_FRONT_PAGE.write(wb_sf10, fields)
 
     def update_grades(self, grades, wb_sf9, wb_sf10):
         """Update grades in SF9 and SF10 files"""
-        back_sf9 = wb_sf9.sheets['BACK']
-        front_sf10 = wb_sf10.sheets['FRONT']
-        
-        # Prepare quarter mappings
-        quarter_mappings = {
-            1: {'sf9_col': 'C', 'sf9_start_row': 7, 'sf10_col': 'AT', 'sf10_start_row': 31},
-            2: {'sf9_col': 'D', 'sf9_start_row': 7, 'sf10_col': 'AY', 'sf10_start_row': 31},
-            3: {'sf9_col': 'C', 'sf9_start_row': 23, 'sf10_col': 'AT', 'sf10_start_row': 74},
-            4: {'sf9_col': 'D', 'sf9_start_row': 23, 'sf10_col': 'AY', 'sf10_start_row': 74}
-        }
-        
-        # Prepare updates
-        sf9_updates = {}
-        sf10_updates = {}
-        
-        for grade_info in grades:
-            lrn, subject_idx, quarter, grade = grade_info
-            
-            # Skip if grade is None
-            if grade is None:
-                continue
-            
-            # Get quarter mapping
-            mapping = quarter_mappings[quarter]
-            
-            # Calculate row offsets
-            sf9_row = mapping['sf9_start_row'] + subject_idx
-            # Adjust rows for specific subjects
-            if subject_idx in [3, 4, 5]:
-                sf9_row += 1
-            elif subject_idx in [6, 7]:
-                sf9_row += 2
-            elif subject_idx == 8:
-                sf9_row += 2
-            
-            # Prepare updates
-            sf9_cell = f"{mapping['sf9_col']}{sf9_row}"
-            sf10_cell = f"{mapping['sf10_col']}{mapping['sf10_start_row'] + subject_idx}"
-            
-            sf9_updates[sf9_cell] = grade
-            sf10_updates[sf10_cell] = grade
-        
-        # Apply updates
-        for cell, value in sf9_updates.items():
-            back_sf9.range(cell).value = value
-        
-        for cell, value in sf10_updates.items():
-            front_sf10.range(cell).value = value
+        # Same layout as grade.py, so 3rd/4th quarter grades land in the second-semester rows
+        grade_map = grade_values(grades)
+        SF9_GRADES.write(wb_sf9, grade_map)
+        SF10_GRADES.write(wb_sf10, grade_map)
 
 def main():
     print("Starting Excel Auto-Transfer System")
@@ -484,11 +384,12 @@ def main():
     print("1. Install macros in MFQ files")
     print("2. Start monitoring for data changes")
     print("3. Force update all SF files")
-    print("4. Exit")
+    print("4. Archive the student database")
+    print("5. Exit")
     
     while True:
         try:
-            choice = input("\nEnter your choice (1-4): ")
+            choice = input("\nEnter your choice (1-5): ")
             
             if choice == '1':
                 print("Installing macros in MFQ files...")
@@ -505,11 +406,7 @@ def main():
                 system.update_database_from_excel()
                 
                 # Get all students
-                conn = sqlite3.connect(system.db_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM students")
-                students = cursor.fetchall()
-                conn.close()
+                students = system.db.students()
                 
                 # Update SF files for all students
                 print(f"Updating SF files for {len(students)} students...")
@@ -517,6 +414,12 @@ def main():
                 print("All SF files updated successfully.")
                 
             elif choice == '4':
+                path = input(f"Archive file (default: {ARCHIVE_PATH}): ").strip() or ARCHIVE_PATH
+                system.db.archive(path)
+                print(f"Students and packed grades archived to {path}")
+                logging.info(f"Database archived to {path}")
+                
+            elif choice == '5':
                 print("Exiting...")
                 break
                 
@@ -0,0 +1,98 @@
+from xlsxpatch import column_index, split_cell
+from xlsxread import read_block
+
+# Everything we read from a master form quarter sheet lives in this block
+MFQ_BLOCK = 'A6:BC100'
+FIRST_ROW = 6
+
+# MFQ1 read from the top so the school details above the roster come along
+SECTION_BLOCK = 'A1:BC100'
+HEADER_CELLS = ['B1', 'B2', 'B3', 'F1', 'F2', 'F3']
+
+# Male students on rows 6-49, female students on rows 52-100
+STUDENT_ROWS = list(range(6, 50)) + list(range(52, 101))
+
+# Subject grade columns, in subject_idx order
+GRADE_COLUMNS = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L']
+
+# Columns of the students table, in column order (adviser and gender are filled separately)
+STUDENT_COLUMNS = ['A', 'B', 'Q', 'P', 'S', 'R', 'T', None, None, 'Q', 'F', 'AW', 'AX', 'AY', 'BA', 'BC', 'BB']
+
+_STUDENT_INDEXES = [column_index(col) if col else None for col in STUDENT_COLUMNS]
+_GRADE_INDEXES = [column_index(col) for col in GRADE_COLUMNS]
+_ADVISER = (28 - FIRST_ROW, column_index('R'))
+
+
+def read_mfq_blocks(mfq_paths, app=None):
+    """
+    Read the MFQ_BLOCK of every MFQ workbook in one go per file.
+
+    Without an Excel app the sheet XML is parsed directly; with an xlwings app
+    each workbook costs a single range read.
+    """
+    return [_read(path, MFQ_BLOCK, app) for path in mfq_paths]
+
+
+def read_section(mfq_paths, app=None):
+    """
+    Like read_mfq_blocks, but MFQ1 is read from A1 so its school header
+    (HEADER_CELLS) comes along in the same pass.
+
+    Returns (header, blocks) with header mapping cell -> value.
+    """
+    first = _read(mfq_paths[0], SECTION_BLOCK, app)
+    header = {}
+    for cell in HEADER_CELLS:
+        col, row = split_cell(cell)
+        header[cell] = first[row - 1][column_index(col)]
+
+    blocks = [first[FIRST_ROW - 1:]] + [_read(path, MFQ_BLOCK, app) for path in mfq_paths[1:]]
+    return header, blocks
+
+
+def _read(path, ref, app):
+    if app is None:
+        return read_block(path, ref)
+
+    wb = app.books.open(path)
+    try:
+        return wb.sheets[0].range(ref).value
+    finally:
+        wb.close()
+
+
+def extract_records(blocks):
+    """
+    Slice student rows and grades out of the MFQ1-4 blocks in memory.
+
+    Returns (student_data, grades_data) ready for the students and grades tables.
+    """
+    mfq1 = blocks[0]
+    adviser_value = mfq1[_ADVISER[0]][_ADVISER[1]]
+
+    student_data = []
+    grades_data = []
+
+    for student_row in STUDENT_ROWS:
+        offset = student_row - FIRST_ROW
+        row = mfq1[offset]
+        lrn = row[0]
+        if not lrn:
+            continue
+
+        student_info = [row[index] if index is not None else None for index in _STUDENT_INDEXES]
+        student_info[7] = adviser_value
+        student_info[8] = 'Male' if student_row < 51 else 'Female'
+        student_data.append(tuple(student_info))
+
+        for quarter, block in enumerate(blocks, 1):
+            grade_row = block[offset]
+            for subject_idx, index in enumerate(_GRADE_INDEXES):
+                if subject_idx == 8 and quarter < 3:
+                    continue  # Skip 'L' for quarters 1 and 2
+
+                grade = grade_row[index]
+                if grade is not None:
+                    grades_data.append((lrn, subject_idx, quarter, grade))
+
+    return student_data, grades_data
\ No newline at end of file
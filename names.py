@@ -0,0 +1,67 @@
+import re
+from functools import lru_cache
+from collections import namedtuple
+
+# "LAST, FIRST [SECOND ...] M." -> the text before the first comma and up to the next one
+_NAME_RE = re.compile(r'([^,]*),([^,]*)')
+
+# Why a name could not be split
+BLANK = 'blank name'
+NO_COMMA = 'no comma between last and first name'
+NO_FIRST_NAME = 'no first name after the comma'
+
+NameRejection = namedtuple('NameRejection', ['index', 'value', 'reason'])
+
+# Column-wise parse result; rejected entries hold None in last, first and middle
+ParsedNames = namedtuple('ParsedNames', ['last', 'first', 'middle', 'rejected'])
+
+_REJECTED = (None, None, None)
+
+
+@lru_cache(maxsize=65536)
+def _split_name(full_name):
+    """(last, first, middle, reason) for one stripped, non-empty name"""
+    match = _NAME_RE.match(full_name)
+    if match is None:
+        return _REJECTED + (NO_COMMA,)
+
+    last_name = match.group(1).strip()
+    name_parts = match.group(2).split()
+    if not name_parts:
+        return _REJECTED + (NO_FIRST_NAME,)
+
+    # Handle case where there's no middle initial
+    if len(name_parts) == 1:
+        return last_name, name_parts[0], "", None
+    return last_name, " ".join(name_parts[:-1]), name_parts[-1], None
+
+
+def _parse(value):
+    # Handle None, empty and multi-cell values
+    if not value or isinstance(value, list):
+        return _REJECTED + (BLANK,)
+    full_name = str(value).strip()
+    if not full_name:
+        return _REJECTED + (BLANK,)
+    return _split_name(full_name)
+
+
+def parse_names(names):
+    """
+    Split a column of "LAST, FIRST M." names into last, first and middle arrays.
+    Names that cannot be split are recorded as NameRejection(index, value, reason).
+    """
+    last, first, middle, rejected = [], [], [], []
+    for index, value in enumerate(names):
+        last_name, first_name, middle_initial, reason = _parse(value)
+        if reason is not None:
+            rejected.append(NameRejection(index, value, reason))
+        last.append(last_name)
+        first.append(first_name)
+        middle.append(middle_initial)
+    return ParsedNames(last, first, middle, rejected)
+
+
+def extract_name_parts(full_name):
+    """Extract last name, first name, and middle initial from a full name, or (None, None, None)."""
+    return _parse(full_name)[:3]
\ No newline at end of file
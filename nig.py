@@ -1,7 +1,24 @@
-import xlwings as xw
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import os
+from xlsxpatch import patch_workbook
+from watcher import record_write
+from sf1cache import sf1_rows, FIRST_ROW as SF1_FIRST_ROW
+
+def sf1_student(lrn, name, sex) -> Optional[Dict[str, str]]:
+    """Build the record for one SF1 row, or None if the LRN or name is blank."""
+    if not lrn:
+        return None
+    
+    student = {
+        'lrn': str(lrn).strip() if lrn else '',
+        'name': str(name).strip() if name else '',
+        'gender': str(sex).strip() if sex else ''
+    }
+    
+    if student['lrn'] and student['name']:
+        return student
+    return None
 
 class SchoolFormProcessor:
     def __init__(self, sf1_path: str, sf5a_path: str, sf5b_path: str):
@@ -29,100 +46,100 @@ class SchoolFormProcessor:
             'male': (15, 43),
             'female': (45, 65)
         }
+        
+        # (LRN column, name column) on each form
+        self.SF5A_COLUMNS = ('C', 'D')
+        self.SF5B_COLUMNS = ('B', 'C')
 
     def read_sf1_data(self) -> Dict[str, List[Dict[str, str]]]:
         """
         Read data from SF1 and organize it by gender.
         Returns a dictionary with 'male' and 'female' lists of student records.
+        Rows come from the SF1 roster cache, so Excel is never involved and the
+        workbook is only parsed again after it changes.
         """
         try:
-            app = xw.App(visible=False)
-            wb = app.books.open(self.sf1_path)
-            sheet = wb.sheets[0]
+            rows = sf1_rows(self.sf1_path)
             data = {'male': [], 'female': []}
             
             
             for gender, (start_row, end_row) in self.SF1_RANGES.items():
                 for row in range(start_row, end_row + 1):
-                    
-                    lrn = sheet.range(f'B{row}').value
-                    name = sheet.range(f'C{row}').value
-                    sex = sheet.range(f'G{row}').value
-                    
-                    
-                    if not lrn:
-                        continue
-                    
-                    student = {
-                        'lrn': str(lrn).strip() if lrn else '',
-                        'name': str(name).strip() if name else '',
-                        'gender': str(sex).strip() if sex else ''
-                    }
-                    
-                    
-                    if student['lrn'] and student['name']:
+                    values = rows[row - SF1_FIRST_ROW]
+                    student = sf1_student(values[0], values[1], values[5])  # B, C, G
+                    if student:
                         data[gender].append(student)
             
-            wb.close()
-            app.quit()
             return data
             
         except Exception as e:
             logging.error(f"Error reading SF1: {str(e)}")
             raise
 
-    def write_to_sf5a(self, data: Dict[str, List[Dict[str, str]]], app):
+    def write_to_sf5a(self, data: Dict[str, List[Dict[str, str]]], app=None):
         """Write organized data to SF5A."""
         try:
-            wb = app.books.open(self.sf5a_path)
-            sheet = wb.sheets[0]
-            
-            
-            self._write_section(sheet, data['male'], 
-                              self.SF5A_RANGES['male'],
-                              'C', 'D')  
-            
-            
-            self._write_section(sheet, data['female'],
-                              self.SF5A_RANGES['female'],
-                              'C', 'D')  
-            
-            wb.save()
-            wb.close()
+            self._write_form(self.sf5a_path, data, self.SF5A_RANGES, self.SF5A_COLUMNS, app)
             logging.info("Successfully wrote data to SF5A")
             
         except Exception as e:
             logging.error(f"Error writing to SF5A: {str(e)}")
             raise
 
-    def write_to_sf5b(self, data: Dict[str, List[Dict[str, str]]], app):
+    def write_to_sf5b(self, data: Dict[str, List[Dict[str, str]]], app=None):
         """Write organized data to SF5B."""
         try:
-            wb = app.books.open(self.sf5b_path)
-            sheet = wb.sheets[0]
-            
-            
-            self._write_section(sheet, data['male'],
-                              self.SF5B_RANGES['male'],
-                              'B', 'C')  
-            
-            
-            self._write_section(sheet, data['female'],
-                              self.SF5B_RANGES['female'],
-                              'B', 'C')  
-            
-            wb.save()
-            wb.close()
+            self._write_form(self.sf5b_path, data, self.SF5B_RANGES, self.SF5B_COLUMNS, app)
             logging.info("Successfully wrote data to SF5B")
             
         except Exception as e:
             logging.error(f"Error writing to SF5B: {str(e)}")
             raise
 
+    def write_forms(self, data: Dict[str, List[Dict[str, str]]], app=None):
+        """
+        Write SF5A and SF5B, each as one block per gender band. Natively a form
+        takes a few milliseconds of pure-Python XML splicing, so the two are
+        written one after the other: threads gain nothing under the GIL, and
+        starting worker processes costs more than the writes themselves.
+        """
+        self.write_to_sf5a(data, app)
+        self.write_to_sf5b(data, app)
+
+    def _write_form(self, path: str, data: Dict[str, List[Dict[str, str]]],
+                    ranges: Dict[str, Tuple[int, int]], columns: Tuple[str, str], app=None):
+        """Write both gender bands of one form: patched natively, or through app."""
+        if app is None:
+            cells = {}
+            for gender, row_range in ranges.items():
+                cells.update(self.section_cells(data[gender], row_range, *columns))
+            patch_workbook(path, cells)
+            record_write(path)
+            return
+        
+        wb = app.books.open(path)
+        try:
+            sheet = wb.sheets[0]
+            for gender, row_range in ranges.items():
+                self._write_section(sheet, data[gender], row_range, *columns)
+            wb.save()
+        finally:
+            wb.close()
+        record_write(path)
+
     def _write_section(self, sheet, data: List[Dict[str, str]], 
                       row_range: Tuple[int, int], 
                       lrn_col: str, name_start_col: str):
-        """Helper method to write a section of data to a sheet."""
+        """Helper method to write a section of data to a sheet as one LRN/name block."""
+        rows = self.section_rows(data, row_range)
+        if rows:
+            start_row = row_range[0]
+            end_row = start_row + len(rows) - 1
+            sheet.range(f'{lrn_col}{start_row}:{name_start_col}{end_row}').value = rows
+
+    def section_rows(self, data: List[Dict[str, str]], 
+                     row_range: Tuple[int, int]) -> List[List[str]]:
+        """[lrn, name] rows for a section, truncated to the rows available."""
         start_row, end_row = row_range
         available_rows = end_row - start_row + 1
         
@@ -133,15 +150,17 @@ class SchoolFormProcessor:
                 f"Some records will be truncated."
             )
         
-        
-        for idx, student in enumerate(data[:available_rows]):
-            current_row = start_row + idx
-            
-            
-            sheet.range(f'{lrn_col}{current_row}').value = student['lrn']
-            
-            
-            sheet.range(f'{name_start_col}{current_row}').value = student['name']
+        return [[student['lrn'], student['name']] for student in data[:available_rows]]
+
+    def section_cells(self, data: List[Dict[str, str]], 
+                      row_range: Tuple[int, int], 
+                      lrn_col: str, name_start_col: str) -> Dict[str, str]:
+        """Map a section of data to {cell: value}, truncated to the rows available."""
+        cells = {}
+        for row, (lrn, name) in enumerate(self.section_rows(data, row_range), row_range[0]):
+            cells[f'{lrn_col}{row}'] = lrn
+            cells[f'{name_start_col}{row}'] = name
+        return cells
 
     def process_all(self):
         """Process all forms in one go."""
@@ -153,14 +172,7 @@ class SchoolFormProcessor:
             logging.info(f"Read {len(data['male'])} male and {len(data['female'])} female records from SF1")
             
             
-            app = xw.App(visible=False)
-            
-            
-            self.write_to_sf5a(data, app)
-            self.write_to_sf5b(data, app)
-            
-            
-            app.quit()
+            self.write_forms(data)
             
             logging.info("School form processing completed successfully")
             
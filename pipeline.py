@@ -0,0 +1,215 @@
+"""
+The whole section in one process.
+
+"Transfer" reads sf1.xlsx once (through the roster cache) and fans the parsed roster out to MFQ1-4 and
+SF5A/SF5B. "Finish & Encode" reads MFQ1-4 once each and feeds the school
+header into the SF9/SF10 templates, the grades into the database and the
+database into every stale SF9/SF10. Stages hand their data to each other in
+memory instead of reopening workbooks in fresh interpreters.
+
+    python pipeline.py [transfer|finish|all] [--engine native|excel]
+"""
+import os
+import time
+import argparse
+from contextlib import contextmanager
+from xlsxpatch import XlsxTemplate, patch_workbook
+from xlsbpatch import XlsbTemplate
+from excelpool import excel_session
+from cellmap import CellPlan, school_header_values
+from mfq import read_section
+from renderstate import create_render_state_table
+from sf1cache import sf1_roster
+import grade
+import nig
+import trans
+
+SF1_PATH = 'sf1.xlsx'
+SF5A_PATH = 'sf5a.xlsx'
+SF5B_PATH = 'sf5b.xlsx'
+MFQ_PATHS = ['MFQ1.xlsx', 'MFQ2.xlsx', 'MFQ3.xlsx', 'MFQ4.xlsx']
+
+# First MFQ row of each section, and the columns MFQ2-4 share with MFQ1
+MFQ_FIRST_ROWS = {'male': 6, 'female': 52}
+ROSTER_COLUMNS = ('A', 'B')
+
+
+@contextmanager
+def engine_session(engine):
+    """Yield a pooled Excel instance for engine='excel', or None for native I/O"""
+    if engine == 'native':
+        yield None
+    else:
+        with excel_session() as app:
+            yield app
+
+
+def write_cells(path, cells, app=None):
+    """
+    Write {cell: value} into the first sheet of a workbook and save it.
+    Natively the sheet XML is patched into a temp file that replaces the
+    original; through Excel each column run costs one range write.
+    """
+    if app is None:
+        patch_workbook(path, cells)
+        return
+
+    wb = app.books.open(path)
+    try:
+        CellPlan({0: {cell: cell for cell in cells}}).write(wb, cells)
+        wb.save()
+    finally:
+        wb.close()
+
+
+def read_roster(sf1_path=SF1_PATH):
+    """The sf1 register as {'male': rows, 'female': rows} of B:J values, parsed once per change"""
+    return sf1_roster(sf1_path)
+
+
+def write_mfq_rosters(roster, app=None):
+    """Write the personal details to MFQ1 and the LRN/name roster to MFQ2-4"""
+    mfq1_cells = {}
+    roster_cells = {}
+    counts = {}
+    for gender, rows in roster.items():
+        first_row = MFQ_FIRST_ROWS[gender]
+        columns = trans.collect_students(rows)
+        counts[gender] = len(columns['A'])
+        for column, values in columns.items():
+            cells = {f'{column}{first_row + i}': value for i, value in enumerate(values)}
+            mfq1_cells.update(cells)
+            if column in ROSTER_COLUMNS:
+                roster_cells.update(cells)
+
+    write_cells(MFQ_PATHS[0], mfq1_cells, app)
+    if app is None:
+        failed = trans.write_rosters(MFQ_PATHS[1:], roster_cells)
+        if failed:
+            raise RuntimeError(f"Could not write the roster to {', '.join(failed)}")
+    else:
+        for path in MFQ_PATHS[1:]:
+            write_cells(path, roster_cells, app)
+            print(f"Data successfully transferred to {path}")
+    return counts
+
+
+def write_sf5(roster, app=None):
+    """Write the roster to SF5A and SF5B"""
+    processor = nig.SchoolFormProcessor(SF1_PATH, SF5A_PATH, SF5B_PATH)
+    data = {}
+    for gender, rows in roster.items():
+        students = (nig.sf1_student(row[0], row[1], row[5]) for row in rows)
+        data[gender] = [student for student in students if student]
+    processor.write_forms(data, app)
+    print(f"Data successfully transferred to {SF5A_PATH} and {SF5B_PATH}")
+
+
+def patch_template(template, values):
+    """
+    Write {sheet: {cell: value}} into a template file in place.
+    Returns False without touching the file when every cell already holds its
+    value, so an unchanged header does not invalidate the rendered forms.
+    """
+    changed = False
+    for sheet, cells in values.items():
+        original = template.package.read(template.sheet_parts[sheet])
+        if template.plan(sheet, cells).render(cells) != original:
+            changed = True
+    if not changed:
+        return False
+
+    temp_path = template.path + '.tmp'
+    template.render(temp_path, values)
+    os.replace(temp_path, template.path)
+    return True
+
+
+def patch_front_with_excel(app, path, cells):
+    """Excel counterpart of patch_template for the FRONT sheet"""
+    wb = app.books.open(path)
+    try:
+        sheet = wb.sheets['FRONT']
+        if all(sheet.range(cell).value == value for cell, value in cells.items()):
+            return False
+        CellPlan({'FRONT': {cell: cell for cell in cells}}).write(wb, cells)
+        wb.save()
+        return True
+    finally:
+        wb.close()
+
+
+def transfer_school_header(header, app=None):
+    """Copy the MFQ1 school header into the SF9/SF10 templates (schooldata.py)"""
+    sf9_cells, sf10_cells = school_header_values(header)
+    if app is None:
+        # The masters are edited, not rendered: their calculation settings stay as they are
+        changed = patch_template(XlsbTemplate(grade.SF9_TEMPLATE, full_calc_on_load=False), {'FRONT': sf9_cells})
+        changed = patch_template(XlsxTemplate(grade.SF10_TEMPLATE, full_calc_on_load=False),
+                                 {'FRONT': sf10_cells}) or changed
+    else:
+        changed = patch_front_with_excel(app, grade.SF9_TEMPLATE, sf9_cells)
+        changed = patch_front_with_excel(app, grade.SF10_TEMPLATE, sf10_cells) or changed
+    return changed
+
+
+def transfer(engine='native'):
+    """sf1 -> MFQ1-4 and SF5A/SF5B, reading sf1 once"""
+    with engine_session(engine) as app:
+        roster = read_roster(SF1_PATH)
+        counts = write_mfq_rosters(roster, app)
+        write_sf5(roster, app)
+    print(f"Transfer completed successfully! Processed {counts['male']} male and {counts['female']} female students.")
+    return counts
+
+
+def finish(engine='native', jobs=1, force=False, stream=False):
+    """MFQ1-4 -> SF9/SF10 templates, database and forms, reading each MFQ once"""
+    sf9_folder, sf10_folder = grade.create_folders()
+    conn = grade.create_database()
+    create_render_state_table(conn)
+    try:
+        with engine_session(engine) as app:
+            header, blocks = read_section(MFQ_PATHS, app)
+            if transfer_school_header(header, app):
+                print("School details copied to the SF9/SF10 templates")
+
+        print("Loading data from Excel to database...")
+        grade.store_blocks(conn, blocks)
+        return grade.render_section(conn, sf9_folder, sf10_folder, engine=engine, jobs=jobs,
+                                    force=force, stream=stream)
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the section pipeline in a single process")
+    parser.add_argument('step', nargs='?', choices=['transfer', 'finish', 'all'], default='all',
+                        help="transfer (sf1 -> MFQ/SF5), finish (MFQ -> SF9/SF10) or all (default)")
+    parser.add_argument('--engine', choices=['native', 'excel'], default='native',
+                        help="read and write workbooks natively or through Excel (default: native)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for native SF9/SF10 rendering (default: 1)")
+    parser.add_argument('--force', action='store_true',
+                        help="re-render every student even if nothing changed")
+    parser.add_argument('--stream', action='store_true',
+                        help="render students one at a time straight from the database")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time.time()
+
+    if args.step in ('transfer', 'all'):
+        print("Transferring sf1.xlsx to the master forms and SF5A/SF5B...")
+        transfer(engine=args.engine)
+    if args.step in ('finish', 'all'):
+        print("Encoding the master forms into SF9/SF10...")
+        finish(engine=args.engine, jobs=args.jobs, force=args.force, stream=args.stream)
+
+    print(f"Pipeline completed in {time.time() - start_time:.2f} seconds.")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import hashlib
+
+# Bump when the way inputs map to output cells changes without a template change
+LAYOUT_VERSION = b'2'
+
+
+def create_render_state_table(conn):
+    """Remember, per student, which inputs produced the files on disk"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS render_state (
+        lrn TEXT PRIMARY KEY,
+        input_digest TEXT,
+        sf9_digest TEXT,
+        sf9_size INTEGER,
+        sf9_mtime_ns INTEGER,
+        sf10_digest TEXT,
+        sf10_size INTEGER,
+        sf10_mtime_ns INTEGER
+    )
+    ''')
+    conn.commit()
+
+
+def file_digest(path):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_salt(template_paths):
+    """Fold the templates into every input digest so a template edit re-renders everyone"""
+    digest = hashlib.sha1(LAYOUT_VERSION)
+    for path in template_paths:
+        digest.update(file_digest(path).encode('ascii'))
+    return digest.digest()
+
+
+def input_digest(student, student_grades, salt=b''):
+    """Digest of a student's row plus their grade rows, independent of row order"""
+    digest = hashlib.sha1(salt)
+    digest.update(repr(tuple(student)).encode('utf-8'))
+    for grade in sorted(tuple(g) for g in student_grades):
+        digest.update(repr(grade).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _output_intact(path, digest, size, mtime_ns):
+    """True when the file on disk is still the one we rendered"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+        return True
+    # Touched or copied back: only the contents decide
+    return stat.st_size == size and file_digest(path) == digest
+
+
+def _is_current(previous, digest, paths):
+    """True when a render_state row matches the inputs and both outputs are untouched"""
+    if previous is None or previous[0] != digest:
+        return False
+    sf9_path, sf10_path = paths
+    return _output_intact(sf9_path, *previous[1:4]) and _output_intact(sf10_path, *previous[4:7])
+
+
+def find_stale_students(conn, student_dict, grades_dict, output_paths, salt=b'', force=False):
+    """
+    Return {lrn: input_digest} for students whose SF9/SF10 must be rendered:
+    new students, changed rows or grades, and missing or modified outputs.
+    output_paths(lrn) gives the (sf9_path, sf10_path) pair; force marks everyone stale.
+    """
+    state = {row[0]: row[1:] for row in conn.execute('SELECT * FROM render_state')}
+
+    stale = {}
+    for lrn, student in student_dict.items():
+        digest = input_digest(student, grades_dict.get(lrn, []), salt)
+        if force or not _is_current(state.get(lrn), digest, output_paths(lrn)):
+            stale[lrn] = digest
+    return stale
+
+
+def iter_stale_records(conn, records, output_paths, salt=b'', force=False):
+    """
+    Streaming counterpart of find_stale_students: filter (student, grades)
+    pairs one at a time, yielding (student, grades, input_digest) for the
+    ones that must be rendered. State is looked up per LRN, not preloaded.
+    """
+    for student, student_grades in records:
+        lrn = student[0]
+        digest = input_digest(student, student_grades, salt)
+        if not force:
+            previous = conn.execute('SELECT * FROM render_state WHERE lrn = ?', (lrn,)).fetchone()
+            if _is_current(previous and previous[1:], digest, output_paths(lrn)):
+                continue
+        yield student, student_grades, digest
+
+
+def record_render_state(conn, rendered, output_paths):
+    """Store input and output digests for the students just rendered"""
+    rows = []
+    for lrn, digest in rendered.items():
+        row = [lrn, digest]
+        for path in output_paths(lrn):
+            stat = os.stat(path)
+            row += [file_digest(path), stat.st_size, stat.st_mtime_ns]
+        rows.append(row)
+
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO render_state VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+School-wide batch runs: the section pipeline for every section under a folder.
+
+A section is a folder with its own sf1.xlsx, MFQ1-4 and SF5A/SF5B. These
+hold the section's own grades, so a section missing any of them is reported
+incomplete and not run; only the SF9/SF10 templates it lacks are copied in
+from the program folder. Each section is then built by stagegraph.py in its own process with
+the section folder as working directory, so every section keeps its own
+files, database and Excel session, stages that are up to date are skipped,
+and a failing section does not stop the others. A section's output goes to
+batch.log in its folder.
+
+Sections run in the order given with --first, then largest first, as many
+at a time as the worker budget allows: each running section holds --jobs
+of the --workers slots.
+
+    python scheduler.py SCHOOL_DIR [--workers N] [--jobs N] [--first SECTION ...] [--list]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pipeline
+import grade
+
+PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGEGRAPH = os.path.join(PROGRAM_DIR, 'stagegraph.py')
+SECTION_LOG = 'batch.log'
+
+# Forms every section keeps its own copy of next to its sf1.xlsx
+SECTION_FILES = pipeline.MFQ_PATHS + [pipeline.SF5A_PATH, pipeline.SF5B_PATH]
+# Templates that hold no section data and can be copied in when missing
+TEMPLATE_FILES = [grade.SF9_TEMPLATE, grade.SF10_TEMPLATE]
+
+Section = namedtuple('Section', ['name', 'path', 'size'])
+Result = namedtuple('Result', ['section', 'status', 'returncode', 'seconds'])
+
+
+def find_sections(root):
+    """Every folder under root holding an sf1.xlsx, named by its path relative to root"""
+    sections = []
+    for folder, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != 'SF9SF10')
+        names = {name.lower(): name for name in files}
+        if pipeline.SF1_PATH.lower() not in names:
+            continue
+        # A section's own subfolders hold its outputs, not more sections
+        dirs[:] = []
+        size = sum(os.path.getsize(os.path.join(folder, names[path.lower()]))
+                   for path in [pipeline.SF1_PATH] + pipeline.MFQ_PATHS if path.lower() in names)
+        sections.append(Section(os.path.relpath(folder, root), folder, size))
+    return sections
+
+
+def order_sections(sections, first=()):
+    """Sections named in first (by path or folder name) in that order, then the largest first"""
+    rank = {name: i for i, name in enumerate(first)}
+
+    def key(section):
+        position = rank.get(section.name, rank.get(os.path.basename(section.path), len(rank)))
+        return position, -section.size, section.name
+
+    return sorted(sections, key=key)
+
+
+def missing_forms(folder):
+    """The section files (MFQ1-4, SF5A/SF5B) a section folder lacks"""
+    return [name for name in SECTION_FILES if not os.path.isfile(os.path.join(folder, name))]
+
+
+def seed_forms(folder, forms_dir=PROGRAM_DIR):
+    """Copy the SF9/SF10 templates a section folder is missing; returns the names copied"""
+    copied = []
+    for name in TEMPLATE_FILES:
+        source = os.path.join(forms_dir, name)
+        if not os.path.exists(os.path.join(folder, name)) and os.path.isfile(source):
+            shutil.copy(source, os.path.join(folder, name))
+            copied.append(name)
+    return copied
+
+
+def run_section(section, engine='native', jobs=1, force=False, timeout=None, forms_dir=PROGRAM_DIR):
+    """Bring one section up to date in a process of its own"""
+    start_time = time.time()
+    missing = missing_forms(section.path)
+    if missing:
+        return Result(section, f"incomplete, missing {', '.join(missing)}", None, 0.0)
+    seed_forms(section.path, forms_dir)
+    command = [sys.executable, STAGEGRAPH, 'all', '--engine', engine, '--jobs', str(jobs)]
+    if force:
+        command.append('--force')
+    # Student names are not always in the console code page
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+
+    with open(os.path.join(section.path, SECTION_LOG), 'w', encoding='utf-8') as log:
+        try:
+            returncode = subprocess.run(command, cwd=section.path, stdout=log, stderr=subprocess.STDOUT,
+                                        env=env, timeout=timeout).returncode
+            status = 'ok' if returncode == 0 else 'failed'
+        except subprocess.TimeoutExpired:
+            returncode, status = None, 'timed out'
+    return Result(section, status, returncode, time.time() - start_time)
+
+
+def run_school(root, workers=None, jobs=1, first=(), engine='native', force=False, timeout=None,
+               forms_dir=PROGRAM_DIR):
+    """Build every section under root; returns a Result per section, in the order they finished"""
+    workers = workers or os.cpu_count() or 1
+    jobs = max(1, min(jobs, workers))
+    sections = order_sections(find_sections(root), first)
+    print(f"{len(sections)} sections, {workers // jobs} at a time with {jobs} worker(s) each")
+
+    results = []
+    # The pool takes queued sections in submission order, which is the priority order
+    with ThreadPoolExecutor(max_workers=workers // jobs) as executor:
+        futures = [executor.submit(run_section, section, engine, jobs, force, timeout, forms_dir)
+                   for section in sections]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"[{result.section.name}] {result.status} in {result.seconds:.2f} seconds")
+            results.append(result)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the section pipeline for every section of a school")
+    parser.add_argument('root', help="folder holding the section folders (each with its own sf1.xlsx)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes across all sections (default: one per CPU)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes per section for native SF9/SF10 rendering, native engine only (default: 1)")
+    parser.add_argument('--first', action='append', default=[], metavar='SECTION',
+                        help="run this section before the others; repeat to give an order")
+    parser.add_argument('--engine', choices=['native', 'excel'], default='native',
+                        help="read and write workbooks natively or through Excel (default: native)")
+    parser.add_argument('--force', action='store_true',
+                        help="run every stage of every section even if its inputs are unchanged")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds a section may take before it is stopped")
+    parser.add_argument('--forms', default=PROGRAM_DIR,
+                        help="folder with the SF9/SF10 templates copied into sections that lack them")
+    parser.add_argument('--list', action='store_true',
+                        help="only show the sections in the order they would run")
+    args = parser.parse_args(argv)
+    if args.engine == 'excel' and args.jobs > 1:
+        parser.error("--jobs only applies to --engine native; Excel renders one student at a time")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        for section in order_sections(find_sections(args.root), args.first):
+            print(f"{section.name}\t{section.size} bytes")
+        return 0
+
+    start_time = time.time()
+    results = run_school(args.root, workers=args.workers, jobs=args.jobs, first=args.first,
+                         engine=args.engine, force=args.force, timeout=args.timeout, forms_dir=args.forms)
+    failed = [result for result in results if result.status != 'ok']
+    print(f"{len(results) - len(failed)} of {len(results)} sections done in {time.time() - start_time:.2f} seconds.")
+    for result in failed:
+        if result.status.startswith('incomplete'):
+            print(f"  {result.section.name}: {result.status}")
+        else:
+            print(f"  {result.section.name}: {result.status}, see {os.path.join(result.section.path, SECTION_LOG)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -1,4 +1,5 @@
 import xlwings as xw
+from cellmap import SCHOOL_HEADER_TRANSFERS
 
 def transfer_contents():
     app = xw.App(visible=False)
@@ -11,16 +12,7 @@ def transfer_contents():
     front_sf10 = wb_sf10.sheets['FRONT']
     mfq1_sheet = wb_mfq1.sheets['Sheet1']
     
-    transfers = [
-        ('B1', 'Q26', ['AS23', 'AS66']),
-        ('B2', 'T26', ['AS25', 'AS68']),
-        ('B3', 'R29', ['G25', 'G68']),
-        ('F1', 'P40', []),
-        ('F2', 'S40', ['A49', 'A92']),
-        ('F3', 'R28', ['BA23', 'BA66'])
-    ]
-    
-    for source, sf9_dest, sf10_dests in transfers:
+    for source, sf9_dest, sf10_dests in SCHOOL_HEADER_TRANSFERS:
         value = mfq1_sheet.range(source).value
         front_sf9.range(sf9_dest).value = value
         
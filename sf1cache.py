@@ -0,0 +1,106 @@
+"""
+Parsed SF1 rosters, cached by file fingerprint.
+
+The B11:J91 block of sf1.xlsx is parsed once per change of the file and kept
+in memory and in sf1_roster.json next to student_records.db. A later call
+(or a later run) only stats the file; the contents are hashed when size or
+mtime moved, and the workbook is reparsed only when the hash differs.
+"""
+import os
+import json
+from datetime import datetime
+from xlsxread import read_columns
+from renderstate import file_digest
+
+SF1_PATH = 'sf1.xlsx'
+CACHE_PATH = 'sf1_roster.json'
+
+# The sf1 register as one block: male rows 11-50, female rows 52-91
+SF1_BLOCK = 'B11:J91'
+SF1_COLUMNS = ['B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J']
+FIRST_ROW = 11
+LAST_ROW = 91
+SF1_SECTIONS = {'male': (0, 40), 'female': (41, 81)}
+
+# Bumped when the cached rows change shape, so older caches are reparsed
+CACHE_VERSION = 2
+
+# absolute sf1 path -> (size, mtime_ns, digest, rows)
+_memo = {}
+
+
+def sf1_rows(path=SF1_PATH, cache_path=CACHE_PATH):
+    """The SF1_BLOCK rows of an SF1 register, parsing the workbook only when it changed."""
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    fingerprint = (stat.st_size, stat.st_mtime_ns)
+
+    cached = _memo.get(key)
+    if cached is not None and cached[:2] == fingerprint:
+        return cached[3]
+
+    entry = _read_cache(cache_path).get(key)
+    if entry is not None and entry.get('version') != CACHE_VERSION:
+        entry = None
+    if entry is not None and (entry['size'], entry['mtime_ns']) == fingerprint:
+        rows = _typed(entry['rows'])
+        _memo[key] = fingerprint + (entry['digest'], rows)
+        return rows
+
+    # Size or mtime moved: only a different hash means a reparse
+    digest = file_digest(path)
+    if entry is not None and entry['digest'] == digest:
+        raw = entry['rows']
+    else:
+        raw = _parse(path)
+    _write_cache(cache_path, key, {
+        'version': CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest, 'rows': raw,
+    })
+    rows = _typed(raw)
+    _memo[key] = fingerprint + (digest, rows)
+    return rows
+
+
+def sf1_roster(path=SF1_PATH, cache_path=CACHE_PATH):
+    """{'male': rows, 'female': rows} of B:J values"""
+    rows = sf1_rows(path, cache_path)
+    return {gender: rows[start:end] for gender, (start, end) in SF1_SECTIONS.items()}
+
+
+def _parse(path):
+    """The block as JSON-ready rows; date cells are kept as {'date': iso text}"""
+    cells = read_columns(path, SF1_COLUMNS, FIRST_ROW, LAST_ROW)
+    return [[_json_value(cells.get(row, {}).get(col)) for col in SF1_COLUMNS]
+            for row in range(FIRST_ROW, LAST_ROW + 1)]
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return {'date': value.isoformat()}
+    return value
+
+
+def _typed(raw):
+    return [[datetime.fromisoformat(value['date']) if isinstance(value, dict) else value for value in row]
+            for row in raw]
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache_path, key, entry):
+    cache = _read_cache(cache_path)
+    cache[key] = entry
+    temp_path = cache_path + '.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # A read-only folder only costs the next run a reparse
+        pass
\ No newline at end of file
@@ -1,61 +1,32 @@
 import xlwings as xw
-
-def extract_name_parts(full_name):
-    # Handle None or empty values
-    if not full_name or isinstance(full_name, list):  # Added list check
-        return None, None, None
-        
-    # Convert to string if not already
-    full_name = str(full_name).strip()
-    if not full_name:
-        return None, None, None
-        
-    parts = full_name.split(",")
-    if len(parts) < 2:
-        print(f"Invalid format for name: {full_name}. Skipping...")
-        return None, None, None
-        
-    last_name = parts[0].strip()
-    remaining_part = parts[1].strip()
-    name_parts = remaining_part.split()
-    
-    if not name_parts:  # If no first name/middle initial
-        return None, None, None
-        
-    # Handle case where there's no middle initial
-    if len(name_parts) == 1:
-        return last_name, name_parts[0], ""
-    
-    # Normal case with middle initial
-    middle_initial = name_parts[-1]
-    first_name = " ".join(name_parts[:-1])
-    return last_name, first_name, middle_initial
+from names import extract_name_parts
+from sf1cache import sf1_rows, FIRST_ROW as SF1_FIRST_ROW
 
 def transfer_student_details():
     try:
-        # Open both workbooks
+        # sf1 comes from the roster cache; only MFQ1 is opened in Excel
+        sf_rows = sf1_rows('sf1.xlsx')
         app = xw.App(visible=False)
-        sf_wb = app.books.open('sf1.xlsx')
         mfq_wb = app.books.open('MFQ1.xlsx')
         
-        # Get active sheets
-        sf_sheet = sf_wb.sheets.active
+        # Get active sheet
         mfq_sheet = mfq_wb.sheets.active
         
         def process_students(start_row, end_row, target_start_row):
             for row in range(start_row, end_row + 1):
                 try:
-                    # Read source data (sf1.xlsx)
-                    lrn = sf_sheet.range(f'B{row}').value
+                    # Read source data (sf1.xlsx, columns B:J)
+                    values = sf_rows[row - SF1_FIRST_ROW]
+                    lrn = values[0]
                     
                     # Check if row is empty
                     if not lrn:
                         continue
                         
-                    full_name = sf_sheet.range(f'C{row}').value  # Changed to only read column C
-                    gender = sf_sheet.range(f'G{row}').value
-                    age = sf_sheet.range(f'H{row}').value  # Changed to only read column H
-                    birth_date = sf_sheet.range(f'J{row}').value  # Changed to only read column J
+                    full_name = values[1]  # Column C
+                    gender = values[5]  # Column G
+                    age = values[6]  # Column H
+                    birth_date = values[8]  # Column J
                     
                     # Skip if no name is found
                     if not full_name:
@@ -67,6 +38,7 @@ def transfer_student_details():
                     
                     # Skip if name parsing failed
                     if name_result[0] is None:
+                        print(f"Invalid format for name: {full_name}. Skipping...")
                         continue
                         
                     last_name, first_name, middle_initial = name_result
@@ -106,7 +78,6 @@ def transfer_student_details():
         
     finally:
         # Cleanup
-        sf_wb.close()
         mfq_wb.close()
         app.quit()
 
@@ -0,0 +1,252 @@
+"""
+Make-style stage graph for the section forms.
+
+    sf1.xlsx    --roster-->    MFQ1-4.xlsx
+    MFQ1-4.xlsx --database-->  students/grades tables (and the template headers)
+    database    --forms-->     SF9SF10/SF9, SF9SF10/SF10
+    sf1.xlsx    --sf5-->       sf5a.xlsx, sf5b.xlsx
+
+Building a target runs the stages upstream of it first. A stage is skipped
+when every input has the fingerprint (size, mtime, SHA-1) it had on the
+stage's last successful run and all of its outputs still exist.
+
+    python stagegraph.py [forms|sf5|roster|database|all] [--engine excel] [--force]
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+from renderstate import file_digest, create_render_state_table
+from mfq import read_section
+import pipeline
+import grade
+
+
+def create_stage_state_table(conn):
+    """Remember, per stage, the input fingerprints of its last successful run"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stage_state (
+        stage TEXT,
+        artifact TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        digest TEXT,
+        PRIMARY KEY (stage, artifact)
+    )
+    ''')
+    conn.commit()
+
+
+class File:
+    """A workbook or folder on disk"""
+
+    def __init__(self, path):
+        self.key = path
+
+    def exists(self, conn):
+        return os.path.exists(self.key)
+
+    def fingerprint(self, conn, previous=None):
+        """(size, mtime_ns, digest); the file is only hashed when size or mtime moved"""
+        if not os.path.isfile(self.key):
+            return None
+        stat = os.stat(self.key)
+        if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            return previous
+        return stat.st_size, stat.st_mtime_ns, file_digest(self.key)
+
+
+class Tables:
+    """
+    Tables inside student_records.db. The database file itself changes with
+    every bookkeeping write, so these are fingerprinted by their rows.
+    """
+
+    def __init__(self, *tables):
+        self.tables = tables
+        self.key = 'student_records.db:' + ','.join(tables)
+
+    def exists(self, conn):
+        return True
+
+    def fingerprint(self, conn, previous=None):
+        digest = hashlib.sha1()
+        for table in self.tables:
+            for row in conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2, 3'):
+                digest.update(repr(row).encode('utf-8'))
+        return None, None, digest.hexdigest()
+
+
+class Stage:
+    def __init__(self, name, inputs, outputs, action, description):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.action = action
+        self.description = description
+
+
+class BuildContext:
+    """What the stages of one build share: the database, the engine and the sf1 roster"""
+
+    def __init__(self, conn, app=None, engine='native', jobs=1, force=False):
+        self.conn = conn
+        self.app = app
+        self.engine = engine
+        self.jobs = jobs
+        self.force = force
+        self._roster = None
+
+    @property
+    def roster(self):
+        # sf1 is read at most once per build, however many stages need it
+        if self._roster is None:
+            self._roster = pipeline.read_roster(pipeline.SF1_PATH)
+        return self._roster
+
+
+def build_roster(ctx):
+    pipeline.write_mfq_rosters(ctx.roster, ctx.app)
+
+
+def build_sf5(ctx):
+    pipeline.write_sf5(ctx.roster, ctx.app)
+
+
+def build_database(ctx):
+    header, blocks = read_section(pipeline.MFQ_PATHS, ctx.app)
+    if pipeline.transfer_school_header(header, ctx.app):
+        print("School details copied to the SF9/SF10 templates")
+    grade.store_blocks(ctx.conn, blocks)
+
+
+def build_forms(ctx):
+    sf9_folder, sf10_folder = grade.create_folders()
+    grade.render_section(ctx.conn, sf9_folder, sf10_folder, engine=ctx.engine,
+                         jobs=ctx.jobs, force=ctx.force)
+
+
+MFQ_FILES = [File(path) for path in pipeline.MFQ_PATHS]
+RECORDS = Tables('students', 'grades')
+TEMPLATES = [File(grade.SF9_TEMPLATE), File(grade.SF10_TEMPLATE)]
+
+STAGES = [
+    Stage('roster', [File(pipeline.SF1_PATH)], MFQ_FILES, build_roster,
+          "sf1 -> MFQ1-4 roster"),
+    Stage('sf5', [File(pipeline.SF1_PATH)], [File(pipeline.SF5A_PATH), File(pipeline.SF5B_PATH)], build_sf5,
+          "sf1 -> SF5A/SF5B"),
+    Stage('database', MFQ_FILES, [RECORDS] + TEMPLATES, build_database,
+          "MFQ1-4 -> database"),
+    Stage('forms', [RECORDS] + TEMPLATES, [File(os.path.join('SF9SF10', 'SF9')), File(os.path.join('SF9SF10', 'SF10'))],
+          build_forms, "database -> SF9/SF10"),
+]
+
+
+class StageGraph:
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        self.producers = {}
+        for stage in stages:
+            for artifact in stage.outputs:
+                self.producers[artifact.key] = stage
+
+    def plan(self, targets):
+        """Stages needed for targets, upstream first"""
+        order = []
+        visiting = set()
+
+        def visit(stage):
+            if stage in order:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {stage.name}")
+            visiting.add(stage.name)
+            for artifact in stage.inputs:
+                producer = self.producers.get(artifact.key)
+                if producer is not None and producer is not stage:
+                    visit(producer)
+            visiting.discard(stage.name)
+            order.append(stage)
+
+        for target in targets:
+            visit(self.stages[target])
+        return order
+
+    def build(self, targets, ctx):
+        """Run what is out of date; returns {stage name: 'ran' | 'skipped'}"""
+        results = {}
+        for stage in self.plan(targets):
+            previous = {row[0]: row[1:] for row in ctx.conn.execute(
+                'SELECT artifact, size, mtime_ns, digest FROM stage_state WHERE stage = ?', (stage.name,))}
+            fingerprints = {artifact.key: artifact.fingerprint(ctx.conn, previous.get(artifact.key))
+                            for artifact in stage.inputs}
+
+            current = (
+                not ctx.force
+                and all(fingerprints[key] is not None and previous.get(key, (None,) * 3)[2] == fingerprints[key][2]
+                        for key in fingerprints)
+                and all(artifact.exists(ctx.conn) for artifact in stage.outputs)
+            )
+            if current:
+                print(f"[{stage.name}] up to date ({stage.description})")
+                results[stage.name] = 'skipped'
+            else:
+                print(f"[{stage.name}] running ({stage.description})")
+                stage.action(ctx)
+                results[stage.name] = 'ran'
+
+            # Inputs as they were when the stage started; refreshes mtimes of touched files too
+            with ctx.conn:
+                ctx.conn.execute('DELETE FROM stage_state WHERE stage = ?', (stage.name,))
+                ctx.conn.executemany(
+                    'INSERT INTO stage_state VALUES (?, ?, ?, ?, ?)',
+                    [(stage.name, key) + tuple(fp) for key, fp in fingerprints.items() if fp is not None]
+                )
+        return results
+
+
+GRAPH = StageGraph(STAGES)
+
+
+def build(targets, engine='native', jobs=1, force=False):
+    """Bring targets up to date in this process"""
+    conn = grade.create_database()
+    create_stage_state_table(conn)
+    create_render_state_table(conn)
+    try:
+        with pipeline.engine_session(engine) as app:
+            ctx = BuildContext(conn, app, engine=engine, jobs=jobs, force=force)
+            return GRAPH.build(targets, ctx)
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bring section forms up to date, skipping unchanged stages")
+    parser.add_argument('targets', nargs='*', choices=list(GRAPH.stages) + ['all'], default='all',
+                        help="stages to build with their upstream stages (default: all)")
+    parser.add_argument('--engine', choices=['native', 'excel'], default='native',
+                        help="read and write workbooks natively or through Excel (default: native)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="worker processes for native SF9/SF10 rendering, native engine only (default: 1)")
+    parser.add_argument('--force', action='store_true',
+                        help="run every stage even if its inputs are unchanged")
+    args = parser.parse_args(argv)
+    if args.engine == 'excel' and args.jobs > 1:
+        parser.error("--jobs only applies to --engine native; Excel renders one student at a time")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start_time = time.time()
+    targets = list(GRAPH.stages) if 'all' in args.targets else args.targets
+    results = build(targets, engine=args.engine, jobs=args.jobs, force=args.force)
+    ran = [name for name, result in results.items() if result == 'ran']
+    print(f"Ran {len(ran)} of {len(results)} stages in {time.time() - start_time:.2f} seconds.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
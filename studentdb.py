@@ -0,0 +1,280 @@
+"""
+Data access for student_records.db.
+
+StudentDB keeps one connection open for the life of the process and only
+issues fixed SQL text, so sqlite3's statement cache compiles each query
+once. Lists of LRNs go in as a single JSON parameter, so fetching the
+grades of any number of students is one grouped query instead of one query
+per student.
+
+Grades can also be kept packed: one WITHOUT ROWID grade_vectors row per
+student holding the 9 x 4 subject/quarter matrix as a fixed-width blob, so
+a student's grades are a single primary-key probe. The grade rows stay the
+record sync_records diffs and logs changes against, so the vectors are an
+index on top of them and the live database grows by their size; once the
+table exists sync_records keeps it current, and reads prefer it.
+archive_database is what makes a section small: it copies only the students
+and their packed grades into a file of their own.
+"""
+import os
+import json
+import math
+import struct
+import sqlite3
+import threading
+from itertools import groupby
+from operator import itemgetter
+
+DB_PATH = 'student_records.db'
+
+# Packed grades: float64 per (subject_idx, quarter), NaN where there is no grade.
+# A student with a grade that is not a number (e.g. "INC") gets a NULL vector and keeps its rows.
+SUBJECTS = 9
+QUARTERS = 4
+_GRADE_VECTOR = struct.Struct(f'<{SUBJECTS * QUARTERS}d')
+_NO_GRADES = [math.nan] * (SUBJECTS * QUARTERS)
+
+_STUDENTS_SQL = 'SELECT * FROM students ORDER BY lrn'
+_STUDENTS_IN_SQL = '''
+    SELECT * FROM students
+    WHERE lrn IN (SELECT value FROM json_each(?))
+    ORDER BY lrn
+'''
+_GRADES_IN_SQL = '''
+    SELECT * FROM grades
+    WHERE lrn IN (SELECT value FROM json_each(?))
+    ORDER BY lrn, subject_idx, quarter
+'''
+_VECTORS_IN_SQL = '''
+    SELECT lrn, grades FROM grade_vectors
+    WHERE lrn IN (SELECT value FROM json_each(?))
+'''
+_GRADES_SQL = 'SELECT * FROM grades WHERE lrn = ? ORDER BY subject_idx, quarter'
+
+
+def create_tables(conn):
+    """Create the students, grades and grade_changes tables if they do not exist yet"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS students (
+        lrn TEXT PRIMARY KEY,
+        name TEXT,
+        section TEXT,
+        grade_level TEXT,
+        school_id TEXT,
+        school_name TEXT,
+        school_year TEXT,
+        adviser TEXT,
+        gender TEXT,
+        birth_date TEXT,
+        age TEXT,
+        mother_tongue TEXT,
+        ip_community TEXT,
+        father_name TEXT,
+        mother_name TEXT,
+        guardian_name TEXT,
+        contact_number TEXT
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS grades (
+        lrn TEXT,
+        subject_idx INTEGER,
+        quarter INTEGER,
+        grade REAL,
+        PRIMARY KEY (lrn, subject_idx, quarter),
+        FOREIGN KEY (lrn) REFERENCES students(lrn)
+    )
+    ''')
+
+    # The primary key already starts with lrn, so a separate lrn index only costs space
+    conn.execute('DROP INDEX IF EXISTS idx_grades_lrn')
+
+    # Every field and grade sync_records changed; seq only ever grows
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS grade_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        changed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        lrn TEXT,
+        field TEXT,
+        subject_idx INTEGER,
+        quarter INTEGER,
+        old_value,
+        new_value
+    )
+    ''')
+    conn.commit()
+
+
+def create_grade_vectors_table(conn, schema='main'):
+    """One packed row of grades per student"""
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {schema}.grade_vectors (
+        lrn TEXT PRIMARY KEY,
+        grades BLOB
+    ) WITHOUT ROWID
+    ''')
+
+
+def has_grade_vectors(conn):
+    """True when the database keeps packed grades"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'grade_vectors'").fetchone() is not None
+
+
+def pack_grades(student_grades):
+    """(lrn, subject_idx, quarter, grade) rows -> fixed-width grade vector, or None if one is not a number"""
+    vector = list(_NO_GRADES)
+    for _, subject_idx, quarter, grade in student_grades:
+        if not isinstance(grade, (int, float)):
+            return None
+        vector[subject_idx * QUARTERS + quarter - 1] = grade
+    return _GRADE_VECTOR.pack(*vector)
+
+
+def unpack_grades(lrn, blob):
+    """Grade vector -> (lrn, subject_idx, quarter, grade) rows, like the grades table"""
+    return [(lrn, index // QUARTERS, index % QUARTERS + 1, grade)
+            for index, grade in enumerate(_GRADE_VECTOR.unpack(blob)) if not math.isnan(grade)]
+
+
+def vector_grades(conn, lrn, blob):
+    """Grade rows of one student from its vector, or from the grades table when it has none"""
+    if blob is not None:
+        return unpack_grades(lrn, blob)
+    return conn.execute(_GRADES_SQL, (lrn,)).fetchall()
+
+
+def store_grade_vectors(conn, lrns=None, schema='main'):
+    """
+    Repack the grade rows of lrns (every student when None) into grade_vectors.
+    Runs inside the caller's transaction.
+    """
+    if lrns is None:
+        rows = conn.execute('SELECT * FROM grades ORDER BY lrn').fetchall()
+        lrns = [row[0] for row in conn.execute('SELECT lrn FROM students')]
+    else:
+        lrns = [str(lrn) for lrn in lrns]
+        rows = conn.execute(_GRADES_IN_SQL, (json.dumps(lrns),)).fetchall()
+    grades = {lrn: [] for lrn in lrns}
+    for lrn, student_grades in groupby(rows, key=itemgetter(0)):
+        grades[lrn] = list(student_grades)
+    conn.executemany(f'INSERT OR REPLACE INTO {schema}.grade_vectors VALUES (?, ?)',
+                     [(lrn, pack_grades(student_grades)) for lrn, student_grades in grades.items()])
+
+
+def enable_packed_grades(conn):
+    """Switch a database to packed grade storage, packing what is already there"""
+    with conn:
+        create_grade_vectors_table(conn)
+        store_grade_vectors(conn)
+
+
+def archive_database(conn, dest_path):
+    """
+    Copy the students and their packed grades into a compact database at dest_path.
+    Open it with StudentDB like any other; only the grade rows of students
+    that could not be packed come along.
+    """
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    packed = has_grade_vectors(conn)
+    conn.execute('ATTACH DATABASE ? AS archive', (dest_path,))
+    try:
+        with conn:
+            for table in ('students', 'grades'):
+                schema = conn.execute("SELECT sql FROM main.sqlite_master WHERE name = ?", (table,)).fetchone()[0]
+                conn.execute(schema.replace(table, f'archive.{table}', 1))
+            create_grade_vectors_table(conn, 'archive')
+            conn.execute('INSERT INTO archive.students SELECT * FROM main.students')
+            if packed:
+                conn.execute('INSERT INTO archive.grade_vectors SELECT * FROM main.grade_vectors')
+            else:
+                store_grade_vectors(conn, schema='archive')
+            conn.execute('''
+            INSERT INTO archive.grades SELECT * FROM main.grades
+            WHERE lrn IN (SELECT lrn FROM archive.grade_vectors WHERE grades IS NULL)
+            ''')
+        conn.execute('VACUUM archive')
+    finally:
+        conn.execute('DETACH DATABASE archive')
+
+
+def connect(path=DB_PATH):
+    """A WAL-mode connection with the tables in place"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")  # Use WAL mode for better concurrency
+    conn.execute("PRAGMA synchronous=NORMAL")  # Reduce synchronous writes for speed
+    create_tables(conn)
+    return conn
+
+
+class StudentDB:
+    """
+    One long-lived connection to a student database.
+    Calls are serialized, so the monitoring thread and the menu can share it.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = connect(path)
+        self.lock = threading.RLock()
+        self.packed = has_grade_vectors(self.conn)
+
+    def students(self, lrns=None):
+        """Every student row in LRN order, or just those in lrns"""
+        with self.lock:
+            if lrns is None:
+                return self.conn.execute(_STUDENTS_SQL).fetchall()
+            return self.conn.execute(_STUDENTS_IN_SQL, (json.dumps([str(lrn) for lrn in lrns]),)).fetchall()
+
+    def grades_by_lrn(self, lrns):
+        """{lrn: grade rows} for every LRN in lrns, from one query; students without grades get []"""
+        lrns = [str(lrn) for lrn in lrns]
+        grades = {lrn: [] for lrn in lrns}
+        if not lrns:
+            return grades
+        with self.lock:
+            if self.packed:
+                unpacked = []
+                for lrn, blob in self.conn.execute(_VECTORS_IN_SQL, (json.dumps(lrns),)):
+                    if blob is None:
+                        unpacked.append(lrn)
+                    else:
+                        grades[lrn] = unpack_grades(lrn, blob)
+                if not unpacked:
+                    return grades
+                lrns = unpacked
+            rows = self.conn.execute(_GRADES_IN_SQL, (json.dumps(lrns),)).fetchall()
+        for lrn, student_grades in groupby(rows, key=itemgetter(0)):
+            grades[lrn] = list(student_grades)
+        return grades
+
+    def enable_packed_grades(self):
+        """Keep grades packed from now on (see enable_packed_grades)"""
+        with self.lock:
+            enable_packed_grades(self.conn)
+            self.packed = True
+
+    def archive(self, dest_path):
+        """Write a compact copy of the database to dest_path (see archive_database)"""
+        with self.lock:
+            archive_database(self.conn, dest_path)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_db(path=DB_PATH):
+    """The process-wide StudentDB for path"""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = StudentDB(path)
+        return db
\ No newline at end of file
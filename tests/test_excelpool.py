@@ -0,0 +1,45 @@
+import threading
+
+from excelpool import ExcelPool
+
+class FakeApp:
+    def __init__(self):
+        self.books = []
+        self.quit_called = False
+        self.killed = False
+
+    def quit(self):
+        self.quit_called = True
+
+    def kill(self):
+        self.killed = True
+
+def _in_thread(target):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+def test_idle_instance_is_reused_by_its_thread():
+    pool = ExcelPool(factory=FakeApp)
+    app = pool.acquire()
+    pool.release(app)
+
+    assert pool.acquire() is app
+
+def test_instance_of_an_ended_thread_is_killed_not_reused():
+    pool = ExcelPool(factory=FakeApp)
+
+    def borrow():
+        app = pool.acquire()
+        pool.release(app)
+        return app
+
+    first = _in_thread(borrow)
+    second = _in_thread(pool.acquire)
+
+    assert second is not first
+    assert first._app.killed
+    assert first not in pool._all
+    assert not any(thread is first.thread for thread in pool._idle)
@@ -0,0 +1,108 @@
+import zipfile
+
+import pytest
+
+from formulas import ExcelError, FormulaGraph, Unsupported, evaluate, excel_round, parse_formula
+from xlsxpatch import Cached, XlsxTemplate
+from xlsxread import read_block
+
+# Sheet S: A1:A3 = 1, 2, 3; A4 blank; B1 = 'text'; B2 = TRUE; B3 = ''
+CELLS = {
+    ('S', 0, 0): 1.0, ('S', 1, 0): 2.0, ('S', 2, 0): 3.0,
+    ('S', 0, 1): 'text', ('S', 1, 1): True, ('S', 2, 1): '',
+}
+
+def _evaluate(text):
+    result = evaluate(parse_formula(text, 'S', ['S']), CELLS.get)
+    return result.code if isinstance(result, ExcelError) else result
+
+@pytest.mark.parametrize('text, expected', [
+    ('1+2*3', 7.0),
+    ('(1+2)*3', 9.0),
+    ('-A1^2', 1.0),
+    ('A1&"-"&B1', '1-text'),
+    ('A2>=A1', True),
+    ('"a"="A"', True),
+    ('ABS(-2.5)', 2.5),
+    ('AND(A1,B2)', True),
+    ('AVERAGE(A1:A4)', 2.0),
+    ('COUNT(A1:B4)', 3),
+    ('COUNTA(A1:B4)', 6),
+    ('COUNTBLANK(A1:B4)', 3),
+    ('IF(A1>2,"big","small")', 'small'),
+    ('IF(A3>2,"big")', 'big'),
+    ('IFERROR(1/0,"none")', 'none'),
+    ('INT(-1.5)', -2.0),
+    ('ISBLANK(A4)', True),
+    ('ISERROR(A1/0)', True),
+    ('ISNUMBER(A1)', True),
+    ('ISTEXT(B1)', True),
+    ('MAX(A1:A4)', 3.0),
+    ('MIN(A1:A4)', 1.0),
+    ('NOT(B2)', False),
+    ('OR(A1>5,A2>5)', False),
+    ('ROUND(AVERAGE(91,92),0)', 92.0),
+    ('ROUND(-2.5,0)', -3.0),
+    ('ROUND(2.675,2)', 2.68),
+    ('SUM(A1:A3,10)', 16.0),
+    ('1/0', '#DIV/0!'),
+    ('A1+B1', '#VALUE!'),
+    ('AVERAGE(A4)', '#DIV/0!'),
+    ('A4', 0),
+])
+def test_evaluate(text, expected):
+    assert _evaluate(text) == expected
+
+def test_excel_round_halves_away_from_zero():
+    assert excel_round(91.5) == 92.0
+    assert excel_round(0.5) == 1.0
+    assert excel_round(-0.5) == -1.0
+    assert excel_round(1.005, 2) == 1.01
+
+@pytest.mark.parametrize('text', ['VLOOKUP(A1,A1:B3,2)', 'SUM(Names)', 'Other!A1', 'ROUND(1)'])
+def test_unsupported_formulas(text):
+    with pytest.raises(Unsupported):
+        parse_formula(text, 'S', ['S'])
+
+SHEET = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+         '<row r="1"><c r="A1"><v>1</v></c><c r="B1"><f>A1*2</f><v>2</v></c>'
+         '<c r="C1"><f>VLOOKUP(A1,A2:B3,2)</f><v>7</v></c><c r="D1"><f>C1+B1</f><v>9</v></c>'
+         '<c r="E1"><f>E2</f><v>0</v></c></row>'
+         '</sheetData></worksheet>')
+
+def _workbook(path, sheet_xml):
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('[Content_Types].xml', '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        zf.writestr('xl/workbook.xml',
+                    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                    '<sheets><sheet name="S" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels',
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                    'relationships/worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+        zf.writestr('xl/worksheets/sheet1.xml', sheet_xml)
+    return str(path)
+
+def test_graph_keeps_unsupported_formulas_at_their_template_value(tmp_path):
+    template = XlsxTemplate(_workbook(tmp_path / 'book.xlsx', SHEET))
+    graph = FormulaGraph(template, {'S': ['A1']})
+
+    assert graph.targets() == {'S': ['B1', 'D1']}
+
+    values = graph.apply({'S': {'A1': 5}})
+    assert values['S']['B1'].value == 10.0
+    assert 'C1' not in values['S']
+    assert values['S']['D1'].value == 17.0
+
+    dest = str(tmp_path / 'out.xlsx')
+    template.render(dest, values)
+    assert read_block(dest, 'A1:E1') == [[5.0, 10.0, 7.0, 17.0, 0.0]]
+
+def test_graph_results_are_cached_values(tmp_path):
+    template = XlsxTemplate(_workbook(tmp_path / 'book.xlsx', SHEET))
+    results = FormulaGraph(template, {'S': ['A1']}).evaluate({'S': {'A1': None}})
+
+    assert all(isinstance(value, Cached) for value in results['S'].values())
+    assert results['S']['B1'].value == 0
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from gradecalc import compute, create_results_tables, rank, remarks
+from studentdb import SUBJECTS, QUARTERS
+
+def _grades(students=1):
+    return np.full((students, SUBJECTS, QUARTERS), np.nan)
+
+def test_sf10_values_are_rounded_and_sf9_values_are_not():
+    grades = _grades()
+    grades[0, 0] = [91, 92, 94, 95]
+    grades[0, 1] = [90, 90, 90, 91]
+
+    results = compute(grades)
+
+    assert results.finals[0, :2].tolist() == [[92.0, 95.0], [90.0, 91.0]]
+    assert results.semester_averages[0].tolist() == [91.0, 93.0]
+    assert results.final_means[0, :2].tolist() == [[91.5, 94.5], [90.0, 90.5]]
+    assert results.semester_means[0].tolist() == [90.75, 92.5]
+    assert results.general_average[0] == 92.0
+
+def test_missing_quarter():
+    grades = _grades()
+    grades[0, 0, :2] = [80, np.nan]
+    grades[0, 1, :2] = [90, 91]
+
+    results = compute(grades)
+
+    assert np.isnan(results.finals[0, 0, 0])
+    assert results.semester_averages[0, 0] == 91.0
+    assert results.final_means[0, 0, 0] == 80.0
+    assert results.semester_means[0, 0] == (80 + 90.5) / 2
+    assert np.isnan(results.semester_averages[0, 1])
+    assert results.general_average[0] == 91.0
+
+def test_rank_ties_and_blanks():
+    assert rank(np.array([90.0, 85.0, 90.0, np.nan, 70.0])).tolist() == [1, 3, 1, 0, 4]
+
+def test_remarks():
+    assert remarks(np.array([75.0, 74.9, np.nan])).tolist() == ['PASSED', 'FAILED', None]
+
+def test_older_results_layout_is_rebuilt():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE final_ratings (lrn TEXT, semester INTEGER, subject_idx INTEGER, '
+                 'rating REAL, remarks TEXT, PRIMARY KEY (lrn, semester, subject_idx)) WITHOUT ROWID')
+    conn.execute('CREATE TABLE general_averages (lrn TEXT PRIMARY KEY, first_semester REAL, '
+                 'second_semester REAL, general_average REAL, remarks TEXT, rank INTEGER)')
+
+    create_results_tables(conn)
+
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(final_ratings)')]
+    assert columns == ['lrn', 'semester', 'subject_idx', 'mean', 'rating', 'remarks']
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(general_averages)')]
+    assert 'first_semester_mean' in columns
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('watchdog')
+
+from macro import AutoTransferSystem
+from studentdb import has_grade_vectors
+
+
+def test_packed_grades_enabled_from_constructor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    system = AutoTransferSystem(packed_grades=True)
+    assert system.db.packed
+    assert has_grade_vectors(system.db.conn)
+
+
+def test_rows_by_default(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    system = AutoTransferSystem()
+    assert not system.db.packed
+    assert not has_grade_vectors(system.db.conn)
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+
+import pytest
+
+pytest.importorskip('pandas')
+
+import scheduler
+from benchmarks.synth import write_section
+
+def _lrns(folder, table):
+    conn = sqlite3.connect(os.path.join(folder, 'student_records.db'))
+    try:
+        return {lrn for (lrn,) in conn.execute(f'SELECT DISTINCT lrn FROM {table}')}
+    finally:
+        conn.close()
+
+def test_sections_keep_their_own_grades(tmp_path):
+    first = write_section(str(tmp_path / 'a'), 6, scheduler.PROGRAM_DIR, seed=1)
+    second = write_section(str(tmp_path / 'b'), 5, scheduler.PROGRAM_DIR, seed=2)
+
+    results = {result.section.name: result for result in scheduler.run_school(str(tmp_path), workers=2)}
+
+    assert {name: result.status for name, result in results.items()} == {'a': 'ok', 'b': 'ok'}
+    for folder, roster in ((tmp_path / 'a', first), (tmp_path / 'b', second)):
+        lrns = {student['lrn'] for student in roster}
+        assert _lrns(folder, 'students') == lrns
+        assert _lrns(folder, 'grades') <= lrns
+
+def test_section_without_its_forms_is_not_seeded(tmp_path):
+    folder = tmp_path / 'c'
+    write_section(str(folder), 4, scheduler.PROGRAM_DIR)
+    for name in scheduler.SECTION_FILES + scheduler.TEMPLATE_FILES:
+        os.remove(folder / name)
+
+    [result] = scheduler.run_school(str(tmp_path), workers=1)
+
+    assert result.status.startswith('incomplete')
+    assert result.returncode is None
+    assert not os.path.exists(folder / 'student_records.db')
+    assert all(not os.path.exists(folder / name) for name in scheduler.SECTION_FILES)
+
+def test_seed_forms_copies_only_templates(tmp_path):
+    copied = scheduler.seed_forms(str(tmp_path))
+
+    assert sorted(copied) == sorted(scheduler.TEMPLATE_FILES)
+    assert sorted(os.listdir(tmp_path)) == sorted(scheduler.TEMPLATE_FILES)
+
+@pytest.mark.parametrize('parse_args', [scheduler.parse_args, scheduler.grade.parse_args])
+def test_jobs_need_the_native_engine(parse_args):
+    argv = ['school'] if parse_args is scheduler.parse_args else []
+    assert parse_args(argv + ['--engine', 'native', '--jobs', '4']).jobs == 4
+    assert parse_args(argv + ['--engine', 'excel']).jobs == 1
+    with pytest.raises(SystemExit):
+        parse_args(argv + ['--engine', 'excel', '--jobs', '4'])
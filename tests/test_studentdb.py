@@ -0,0 +1,54 @@
+import pytest
+
+from studentdb import (StudentDB, QUARTERS, SUBJECTS, archive_database, connect, enable_packed_grades,
+                       pack_grades, unpack_grades)
+
+def _rows(lrn, grades):
+    return [(lrn, subject_idx, quarter, grade) for (subject_idx, quarter), grade in sorted(grades.items())]
+
+def test_pack_unpack_round_trip():
+    rows = _rows('1', {(0, 1): 90.0, (0, 2): 91.5, (4, 3): 75.0, (SUBJECTS - 1, QUARTERS): 100.0})
+
+    blob = pack_grades(rows)
+
+    assert len(blob) == SUBJECTS * QUARTERS * 8
+    assert unpack_grades('1', blob) == rows
+
+def test_pack_empty_student():
+    assert unpack_grades('1', pack_grades([])) == []
+
+def test_non_numeric_grade_is_not_packed():
+    assert pack_grades(_rows('1', {(0, 1): 90.0, (0, 2): 'INC'})) is None
+
+def _section(path):
+    conn = connect(path)
+    conn.executemany('INSERT INTO students (lrn, name) VALUES (?, ?)', [('1', 'A'), ('2', 'B'), ('3', 'C')])
+    conn.executemany('INSERT INTO grades VALUES (?, ?, ?, ?)',
+                     _rows('1', {(0, 1): 90.0, (8, 4): 88.0}) + _rows('2', {(1, 1): 'INC', (1, 2): 80.0}))
+    conn.commit()
+    return conn
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_archive_keeps_every_grade(tmp_path, packed):
+    conn = _section(str(tmp_path / 'section.db'))
+    if packed:
+        enable_packed_grades(conn)
+    expected = StudentDB(str(tmp_path / 'section.db')).grades_by_lrn(['1', '2', '3'])
+
+    archive_database(conn, str(tmp_path / 'archive.db'))
+
+    archive = StudentDB(str(tmp_path / 'archive.db'))
+    assert archive.packed
+    assert archive.grades_by_lrn(['1', '2', '3']) == expected
+    assert [row[0] for row in archive.students()] == ['1', '2', '3']
+    # Only the student that could not be packed keeps grade rows
+    assert {row[0] for row in archive.conn.execute('SELECT lrn FROM grades')} == {'2'}
+
+def test_packed_vectors_follow_the_rows(tmp_path):
+    conn = _section(str(tmp_path / 'section.db'))
+    enable_packed_grades(conn)
+
+    blob = conn.execute("SELECT grades FROM grade_vectors WHERE lrn = '1'").fetchone()[0]
+
+    assert unpack_grades('1', blob) == [('1', 0, 1, 90.0), ('1', 8, 4, 88.0)]
+    assert conn.execute("SELECT grades FROM grade_vectors WHERE lrn = '2'").fetchone()[0] is None
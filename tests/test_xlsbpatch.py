@@ -0,0 +1,132 @@
+import os
+import struct
+import zipfile
+
+import pytest
+
+from formulas import _xlsb_cells
+from xlsxpatch import Cached
+from xlsbpatch import (XlsbTemplate, BRT_CELL_BLANK, BRT_CELL_REAL, BRT_CELL_ST, BRT_FMLA_NUM, BRT_FMLA_STRING,
+                       BRT_INDEX_ROW_BLOCK, BRT_ROW_HDR, CELL_TYPES, iter_records)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SF9 = os.path.join(REPO_ROOT, 'SF9.xlsb')
+
+def _index_offsets(index):
+    """Every stream offset a binary index points at"""
+    offsets = []
+    for record_type, _, payload, end in iter_records(index):
+        if record_type == BRT_INDEX_ROW_BLOCK:
+            rows, base = struct.unpack_from('<IQ', index, payload)
+            first = payload + 12 + 2 * bin(rows).count('1')
+            offsets.append(base)
+            offsets.extend(base + struct.unpack_from('<I', index, pos)[0] for pos in range(first, end, 4))
+    return offsets
+
+def _record_at(data, offset):
+    for record_type, start, payload, _ in iter_records(data):
+        if start == offset:
+            return record_type, data[payload:payload + 4]
+    return None
+
+def test_binary_index_follows_the_spliced_records(tmp_path):
+    template = XlsbTemplate(SF9, full_calc_on_load=False)
+    dest = str(tmp_path / 'out.xlsb')
+
+    template.render(dest, {'FRONT': {'C3': 'A school name longer than the template text'}})
+
+    part = template.sheet_parts['FRONT']
+    index_part = template._binary_index(part)[0]
+    with zipfile.ZipFile(SF9) as before, zipfile.ZipFile(dest) as after:
+        assert after.read('xl/workbook.bin') == before.read('xl/workbook.bin')
+        old, new = _index_offsets(before.read(index_part)), _index_offsets(after.read(index_part))
+        assert old != new
+        old_data, new_data = before.read(part), after.read(part)
+        records = [_record_at(old_data, offset) for offset in old]
+        assert None not in records
+        assert records == [_record_at(new_data, offset) for offset in new]
+
+def _cell_records(data):
+    """{(row, col): record type} of a worksheet stream, zero-based"""
+    cells = {}
+    row = None
+    for record_type, _, payload, _ in iter_records(data):
+        if record_type == BRT_ROW_HDR:
+            row = struct.unpack_from('<I', data, payload)[0]
+        elif record_type in CELL_TYPES and row is not None:
+            cells[(row, struct.unpack_from('<I', data, payload)[0])] = record_type
+    return cells
+
+def _sheet(path, template, sheet):
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(template.sheet_parts[sheet])
+
+def test_cell_records_are_rewritten(tmp_path):
+    template = XlsbTemplate(SF9)
+    dest = str(tmp_path / 'out.xlsb')
+
+    template.render(dest, {'BACK': {'C7': 91, 'D7': 'INC', 'C8': None, 'C300': 80, 'E7': Cached(91.5),
+                                    'E8': Cached('')}})
+
+    records = _cell_records(_sheet(dest, template, 'BACK'))
+    assert records[(6, 2)] == BRT_CELL_REAL
+    assert records[(6, 3)] == BRT_CELL_ST
+    assert records[(7, 2)] == BRT_CELL_BLANK
+    assert records[(299, 2)] == BRT_CELL_REAL
+    assert records[(6, 4)] == BRT_FMLA_NUM
+    assert records[(7, 4)] == BRT_FMLA_STRING
+
+    values, formulas = _xlsb_cells(XlsbTemplate(dest), ['BACK'])
+    assert values[('BACK', 6, 2)] == 91.0
+    assert values[('BACK', 6, 3)] == 'INC'
+    assert values[('BACK', 7, 2)] is None
+    assert values[('BACK', 299, 2)] == 80.0
+    assert values[('BACK', 6, 4)] == 91.5
+    # The formula stays behind its new cached value
+    assert formulas[('BACK', 6, 4)][1] == 'AVERAGE'
+
+def test_binary_index_is_dropped_when_rows_are_inserted(tmp_path):
+    template = XlsbTemplate(SF9)
+    dest = str(tmp_path / 'out.xlsb')
+
+    template.render(dest, {'BACK': {'C300': 80}})
+
+    part = template.sheet_parts['BACK']
+    index_part, rels_part, _ = template._binary_index(part)
+    with zipfile.ZipFile(dest) as zf:
+        assert index_part not in zf.namelist()
+        assert b'xlBinaryIndex' not in zf.read(rels_part)
+        assert os.path.basename(index_part).encode() not in zf.read('[Content_Types].xml')
+        other = template._binary_index(template.sheet_parts['FRONT'])[0]
+        assert other in zf.namelist()
+
+def test_formula_cells_only_take_cached_results(tmp_path):
+    with pytest.raises(ValueError, match='E7 holds a formula'):
+        XlsbTemplate(SF9).render(str(tmp_path / 'out.xlsb'), {'BACK': {'E7': 91.5}})
+
+def test_full_calc_on_load_sets_the_workbook_flag(tmp_path):
+    dest = str(tmp_path / 'out.xlsb')
+    XlsbTemplate(SF9).render(dest, {'BACK': {'C7': 90}})
+
+    with zipfile.ZipFile(SF9) as before, zipfile.ZipFile(dest) as after:
+        assert after.read('xl/workbook.bin') != before.read('xl/workbook.bin')
+
+def test_rendered_sf9_reads_back_with_its_computed_results(tmp_path, monkeypatch):
+    pytest.importorskip('pandas')
+    monkeypatch.chdir(REPO_ROOT)
+    import grade
+
+    student = ('123456789012', 'DELA CRUZ, JUAN A.') + (None,) * 15
+    grades = [('123456789012', 0, 1, 91.0), ('123456789012', 0, 2, 92.0),
+              ('123456789012', 1, 1, 94.0), ('123456789012', 1, 2, 96.0)]
+    grades += [('123456789012', subject_idx, quarter, 90.0) for subject_idx in range(2, 8) for quarter in (1, 2)]
+    grade.render_student(student, grades, grade.load_templates(), str(tmp_path), str(tmp_path))
+
+    template = XlsbTemplate(str(tmp_path / '123456789012.xlsb'))
+    values, _ = _xlsb_cells(template, list(template.sheet_parts))
+    assert values[('FRONT', 21, 16)] == 'DELA CRUZ, JUAN A.'
+    assert [values[('BACK', 6, col)] for col in (2, 3, 4)] == [91.0, 92.0, 91.5]
+    assert [values[('BACK', 7, col)] for col in (2, 3, 4)] == [94.0, 96.0, 95.0]
+    # General average for the semester: AVERAGE of the unrounded finals
+    assert values[('BACK', 17, 4)] == (91.5 + 95 + 6 * 90) / 8
+    assert values[('BACK', 32, 4)].code == '#DIV/0!'
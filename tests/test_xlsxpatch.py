@@ -0,0 +1,106 @@
+import os
+import zipfile
+
+import pytest
+
+from xlsxpatch import KEEP, Cached, XlsxTemplate
+from xlsxread import read_block
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHEET = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+         '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" s="3" t="inlineStr"><is><t>inline</t></is></c>'
+         '<c r="C1"><v>1.5</v></c><c r="D1" t="str"><f>A1&amp;B1</f><v>sharedinline</v></c></row>'
+         '<row r="3"/>'
+         '</sheetData></worksheet>')
+STRINGS = ('<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="1" uniqueCount="1">'
+           '<si><t>shared</t></si></sst>')
+WORKBOOK = ('<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="S" sheetId="1" r:id="rId1"/></sheets><calcPr calcId="191029"/></workbook>')
+
+@pytest.fixture
+def book(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('[Content_Types].xml', '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        zf.writestr('xl/workbook.xml', WORKBOOK)
+        zf.writestr('xl/_rels/workbook.xml.rels',
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                    'relationships/worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+        zf.writestr('xl/worksheets/sheet1.xml', SHEET)
+        zf.writestr('xl/sharedStrings.xml', STRINGS)
+    return path
+
+def _read(path, name):
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(name)
+
+def test_untouched_cells_keep_shared_and_inline_strings(book, tmp_path):
+    dest = str(tmp_path / 'out.xlsx')
+    XlsxTemplate(book).render(dest, {'S': {'A1': KEEP, 'C1': 2}})
+
+    assert read_block(dest, 'A1:D1') == [['shared', 'inline', 2.0, 'sharedinline']]
+    assert _read(dest, 'xl/sharedStrings.xml') == STRINGS.encode()
+    assert b'<c r="A1" t="s"><v>0</v></c>' in _read(dest, 'xl/worksheets/sheet1.xml')
+
+def test_written_strings_are_inline_and_keep_the_style(book, tmp_path):
+    dest = str(tmp_path / 'out.xlsx')
+    XlsxTemplate(book).render(dest, {'S': {'A1': 'new', 'B1': ' padded', 'C1': None}})
+
+    sheet = _read(dest, 'xl/worksheets/sheet1.xml')
+    assert b'<c r="A1" t="inlineStr"><is><t>new</t></is></c>' in sheet
+    assert b'<c r="B1" s="3" t="inlineStr"><is><t xml:space="preserve"> padded</t></is></c>' in sheet
+    assert b'<c r="C1"/>' in sheet
+    assert read_block(dest, 'A1:C1') == [['new', ' padded', None]]
+    assert _read(dest, 'xl/sharedStrings.xml') == STRINGS.encode()
+
+def test_missing_rows_and_cells_are_inserted_in_order(book, tmp_path):
+    dest = str(tmp_path / 'out.xlsx')
+    XlsxTemplate(book).render(dest, {'S': {'A2': 1, 'B3': 'x', 'A3': 2, 'F1': True}})
+
+    assert read_block(dest, 'A1:F3') == [
+        ['shared', 'inline', 1.5, 'sharedinline', None, True],
+        [1.0, None, None, None, None, None],
+        [2.0, 'x', None, None, None, None],
+    ]
+
+def test_formula_cells_only_take_cached_results(book, tmp_path):
+    template = XlsxTemplate(book)
+    dest = str(tmp_path / 'out.xlsx')
+
+    with pytest.raises(ValueError, match='D1 holds a formula'):
+        template.render(dest, {'S': {'D1': 'plain'}})
+
+    template.render(dest, {'S': {'D1': Cached(92.0)}})
+    sheet = _read(dest, 'xl/worksheets/sheet1.xml')
+    assert b'<c r="D1"><f>A1&amp;B1</f><v>92</v></c>' in sheet
+    template.render(dest, {'S': {'D1': Cached('#DIV/0!', error=True)}})
+    assert b'<c r="D1" t="e"><f>A1&amp;B1</f><v>#DIV/0!</v></c>' in _read(dest, 'xl/worksheets/sheet1.xml')
+
+def test_full_calc_on_load(book, tmp_path):
+    XlsxTemplate(book).render(str(tmp_path / 'calc.xlsx'), {'S': {'C1': 3}})
+    XlsxTemplate(book, full_calc_on_load=False).render(str(tmp_path / 'plain.xlsx'), {'S': {'C1': 3}})
+
+    assert b'<calcPr fullCalcOnLoad="1" calcId="191029"/>' in _read(str(tmp_path / 'calc.xlsx'), 'xl/workbook.xml')
+    assert _read(str(tmp_path / 'plain.xlsx'), 'xl/workbook.xml') == WORKBOOK.encode()
+
+def test_rendered_sf10_reads_back_with_its_computed_results(tmp_path, monkeypatch):
+    pytest.importorskip('pandas')
+    monkeypatch.chdir(REPO_ROOT)
+    import grade
+
+    student = ('123456789012', 'DELA CRUZ, JUAN A.') + (None,) * 15
+    grades = [('123456789012', 0, 1, 91.0), ('123456789012', 0, 2, 92.0),
+              ('123456789012', 1, 1, 70.0), ('123456789012', 1, 2, 74.0)]
+    grade.render_student(student, grades, grade.load_templates(), str(tmp_path), str(tmp_path))
+
+    path = str(tmp_path / '123456789012.xlsx')
+    assert read_block(path, 'AT31:BI32', sheet='FRONT') == [
+        [91.0, None, None, None, None, 92.0, None, None, None, None, 92.0, None, None, None, None, 'PASSED'],
+        [70.0, None, None, None, None, 74.0, None, None, None, None, 72.0, None, None, None, None, 'FAILED'],
+    ]
+    # Semester average: ROUND over the final ratings
+    assert read_block(path, 'BD43', sheet='FRONT') == [[82.0]]
@@ -0,0 +1,41 @@
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from xlsxread import convert_value, is_date_format, read_columns, read_date_styles
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SF1 = os.path.join(REPO_ROOT, 'sf1.xlsx')
+
+@pytest.mark.parametrize('code, expected', [
+    ('yyyy-mm-dd', True),
+    ('[$-409]d-mmm-yy;@', True),
+    ('[h]:mm:ss', True),
+    ('"Day "0', False),
+    ('0.00_);[Red](0.00)', False),
+    ('General', False),
+    ('\\d0', False),
+])
+def test_is_date_format(code, expected):
+    assert is_date_format(code) is expected
+
+def test_convert_value_dates():
+    assert convert_value(None, '30203', [], date=True) == datetime(1982, 9, 9)
+    assert convert_value(None, '30203.5', [], date=True) == datetime(1982, 9, 9, 12)
+    assert convert_value(None, '30203', []) == 30203.0
+    assert convert_value('s', '0', ['text'], date=True) == 'text'
+
+def test_birth_date_read_as_datetime():
+    cells = read_columns(SF1, ['C', 'H', 'J'], 11, 11)
+
+    assert cells[11]['H'] == datetime(1982, 9, 9)
+    assert cells[11]['C'] == 'Doe, John Lennon'
+    assert cells[11]['J'] == 42.0
+
+def test_read_date_styles_uses_cell_formats():
+    with zipfile.ZipFile(SF1) as zf:
+        styles = read_date_styles(zf)
+    assert 0 not in styles
+    assert styles
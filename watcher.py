@@ -0,0 +1,134 @@
+import os
+import time
+import queue
+import logging
+import threading
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+_STOP = object()
+
+# Files this process wrote itself: absolute path -> (size, mtime_ns) right after the write
+_own_writes = {}
+_own_writes_lock = threading.Lock()
+
+
+def _fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def record_write(path):
+    """Remember that we just wrote path, so watchers do not react to our own save"""
+    fingerprint = _fingerprint(path)
+    if fingerprint is not None:
+        with _own_writes_lock:
+            _own_writes[os.path.abspath(path)] = fingerprint
+
+
+def is_own_write(path):
+    """True while path still looks exactly as our last write left it"""
+    with _own_writes_lock:
+        recorded = _own_writes.get(os.path.abspath(path))
+    return recorded is not None and recorded == _fingerprint(path)
+
+
+class _QueueHandler(FileSystemEventHandler):
+    """Forward matching file events to the watcher's queue"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ('created', 'modified', 'moved'):
+            return
+        # Excel saves through a temp file and renames it over the workbook
+        path = getattr(event, 'dest_path', '') or event.src_path
+        if self.watcher.match(path):
+            self.watcher.notify(path)
+
+
+class CoalescingWatcher:
+    """
+    Watch a folder and hand bursts of file changes to a callback as one batch.
+
+    A batch opens with the first matching event and stays open until no new
+    event has arrived for `window` seconds (capped at `max_delay`), so a save
+    plus trigger file, or a run of quick edits, costs a single callback.
+    Events that arrive while the callback runs form the next batch. Files
+    still as this process last wrote them (see record_write) are dropped, so a
+    callback that saves watched files does not trigger itself.
+    """
+
+    def __init__(self, folder, callback, match=None, window=0.5, max_delay=5.0):
+        self.folder = folder
+        self.callback = callback
+        self.match = match or (lambda path: True)
+        self.window = window
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.observer = None
+        self.worker = None
+
+    def notify(self, path):
+        """Queue a path as if it had just changed"""
+        self.queue.put(os.path.abspath(path))
+
+    def start(self):
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+        self.observer = Observer()
+        self.observer.schedule(_QueueHandler(self), self.folder, recursive=False)
+        self.observer.start()
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self.worker is not None:
+            self.queue.put(_STOP)
+            self.worker.join()
+            self.worker = None
+
+    def is_alive(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def _collect(self, first):
+        """Gather everything that arrives within the debounce window after first"""
+        batch = {first}
+        started = time.monotonic()
+        deadline = started + self.window
+        while True:
+            timeout = min(deadline, started + self.max_delay) - time.monotonic()
+            if timeout <= 0:
+                return batch, False
+            try:
+                path = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                return batch, False
+            if path is _STOP:
+                return batch, True
+            batch.add(path)
+            deadline = time.monotonic() + self.window
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is _STOP:
+                return
+            batch, stopping = self._collect(first)
+            # Checked after the window: by then the writer has recorded its save
+            changed = sorted(path for path in batch if not is_own_write(path))
+            if changed:
+                try:
+                    self.callback(changed)
+                except Exception as e:
+                    logging.error(f"Error handling changes to {changed}: {str(e)}")
+            else:
+                logging.debug(f"Ignoring our own writes to {sorted(batch)}")
+            if stopping:
+                return
\ No newline at end of file
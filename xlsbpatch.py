@@ -0,0 +1,423 @@
+import re
+import struct
+import math
+from datetime import date, datetime
+from xlsxpatch import ZipPackage, KEEP, Cached, column_index, split_cell, excel_serial, relationship_targets
+
+# BIFF12 record types used by the patcher
+BRT_ROW_HDR = 0
+BRT_CELL_BLANK = 1
+BRT_CELL_BOOL = 4
+BRT_CELL_REAL = 5
+BRT_CELL_ST = 6
+BRT_FMLA_STRING = 8
+BRT_FMLA_NUM = 9
+BRT_FMLA_BOOL = 10
+BRT_FMLA_ERROR = 11
+BRT_FMLA_TYPES = (BRT_FMLA_STRING, BRT_FMLA_NUM, BRT_FMLA_BOOL, BRT_FMLA_ERROR)
+BRT_BEGIN_SHEET_DATA = 145
+BRT_END_SHEET_DATA = 146
+BRT_BUNDLE_SH = 156
+BRT_CALC_PROP = 157
+BRT_AC_BEGIN = 37
+BRT_AC_END = 38
+BRT_INDEX_ROW_BLOCK = 40
+BRT_ARR_FMLA = 426
+BRT_SHR_FMLA = 427
+
+# BIFF12 error value codes
+ERROR_CODES = {0x00: '#NULL!', 0x07: '#DIV/0!', 0x0F: '#VALUE!', 0x17: '#REF!',
+               0x1D: '#NAME?', 0x24: '#NUM!', 0x2A: '#N/A'}
+_ERROR_BYTES = {text: code for code, text in ERROR_CODES.items()}
+
+# Cell records carry (col, style) up front; formula side records follow their cell
+CELL_TYPES = frozenset(range(1, 12)) | {62}
+CELL_TRAILER_TYPES = frozenset((426, 427, 428))
+
+
+def iter_records(data, start=0, end=None):
+    """Yield (record_type, record_start, payload_start, record_end) for a BIFF12 stream."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos < end:
+        record_start = pos
+        record_type = data[pos]
+        pos += 1
+        if record_type & 0x80:
+            record_type = (record_type & 0x7F) | ((data[pos] & 0x7F) << 7)
+            pos += 1
+
+        size = 0
+        for shift in (0, 7, 14, 21):
+            byte = data[pos]
+            pos += 1
+            size |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+
+        yield record_type, record_start, pos, pos + size
+        pos += size
+
+
+def encode_record(record_type, payload):
+    """Encode a BIFF12 record header and payload."""
+    header = bytearray()
+    if record_type >= 0x80:
+        header += bytes(((record_type & 0x7F) | 0x80, record_type >> 7))
+    else:
+        header.append(record_type)
+
+    size = len(payload)
+    while True:
+        byte = size & 0x7F
+        size >>= 7
+        if size:
+            header.append(byte | 0x80)
+        else:
+            header.append(byte)
+            break
+    return bytes(header) + payload
+
+
+def wide_string(text):
+    """Encode an XLWideString (character count + UTF-16LE)."""
+    encoded = text.encode('utf-16-le')
+    return struct.pack('<I', len(encoded) // 2) + encoded
+
+
+def read_wide_string(data, pos):
+    """Decode an XLWideString at pos, returning (text, next_pos)."""
+    count = struct.unpack_from('<I', data, pos)[0]
+    if count == 0xFFFFFFFF:
+        return None, pos + 4
+    end = pos + 4 + count * 2
+    return data[pos + 4:end].decode('utf-16-le'), end
+
+
+class XlsbTemplate:
+    """
+    Native .xlsb (BIFF12) template renderer.
+
+    Each target sheet's record stream is parsed once into a splice plan. Per
+    student, only the target cell records are re-encoded and spliced between
+    the untouched byte ranges; all other package members are copied as-is.
+    The per-sheet binary index (cached record offsets) has its offsets moved
+    past the re-encoded records. When a plan has to insert records (rows or
+    cells the template lacks) the index is dropped instead; Excel rebuilds it
+    on save.
+    """
+
+    def __init__(self, path, targets=None, full_calc_on_load=True):
+        self.path = path
+        self.package = ZipPackage(path)
+        self.sheet_parts = self._find_sheets()
+        self.plans = {}
+        self._index_parts = {}
+
+        for sheet, cells in (targets or {}).items():
+            self.plan(sheet, cells)
+
+        self.workbook_bin = self._workbook_bin() if full_calc_on_load else None
+
+    def _find_sheets(self):
+        workbook = self.package.read('xl/workbook.bin')
+        parts = relationship_targets(self.package, 'xl/_rels/workbook.bin.rels')
+        sheets = {}
+        for record_type, _, payload, _ in iter_records(workbook):
+            if record_type == BRT_BUNDLE_SH:
+                rel_id, pos = read_wide_string(workbook, payload + 8)
+                name, _ = read_wide_string(workbook, pos)
+                sheets[name] = parts[rel_id]
+        return sheets
+
+    def _workbook_bin(self):
+        """Return workbook.bin with fFullCalcOnLoad set in BrtCalcProp."""
+        workbook = bytearray(self.package.read('xl/workbook.bin'))
+        for record_type, _, payload, _ in iter_records(workbook):
+            if record_type == BRT_CALC_PROP:
+                # Flags follow recalcID, fAutoRecalc, cCalcCount, xnumDelta and cRefCycle
+                workbook[payload + 24] |= 0x01
+                return bytes(workbook)
+        return None
+
+    def _binary_index(self, part):
+        """Find the binary index member of a sheet and the package edits that remove it."""
+        if part in self._index_parts:
+            return self._index_parts[part]
+
+        folder, name = part.rsplit('/', 1)
+        rels_part = f'{folder}/_rels/{name}.rels'
+        result = None
+        if rels_part in self.package.names:
+            rels = self.package.read(rels_part).decode('utf-8')
+            match = re.search(r'<Relationship\b[^>]*xlBinaryIndex[^>]*/>', rels)
+            if match:
+                target = re.search(r'\bTarget="([^"]+)"', match.group(0)).group(1)
+                index_part = f'{folder}/{target}'
+                result = (index_part, rels_part, (rels[:match.start()] + rels[match.end():]).encode('utf-8'))
+        self._index_parts[part] = result
+        return result
+
+    def plan(self, sheet, cells):
+        """Compile (or fetch) the splice plan for a set of cells on a sheet."""
+        cells = frozenset(cell.upper() for cell in cells)
+        existing = self.plans.get(sheet)
+        if existing is not None:
+            if cells <= existing.cells:
+                return existing
+            cells |= existing.cells
+
+        plan = BinarySheetPlan(self.package.read(self.sheet_parts[sheet]), cells)
+        self.plans[sheet] = plan
+        return plan
+
+    def render(self, dest, values):
+        """
+        Write a copy of the template to dest.
+
+        values maps sheet name -> {cell: value}. Cells mapped to KEEP (or not
+        mentioned) keep their template record; None blanks the cell.
+        """
+        replacements = {}
+        drop = set()
+        for sheet, cell_values in values.items():
+            part = self.sheet_parts[sheet]
+            plan = self.plan(sheet, cell_values.keys())
+            moves = []
+            replacements[part] = plan.render(cell_values, moves)
+
+            index = self._binary_index(part)
+            if not index:
+                continue
+            index_part, rels_part, rels = index
+            rebased = rebase_index(self.package.read(index_part), moves) if plan.in_place else None
+            if rebased is None:
+                drop.add(index_part)
+                replacements[rels_part] = rels
+            elif moves:
+                replacements[index_part] = rebased
+
+        if drop:
+            content_types = self.package.read('[Content_Types].xml').decode('utf-8')
+            for index_part in drop:
+                content_types = re.sub(
+                    r'<Override PartName="/%s"[^>]*/>' % re.escape(index_part), '', content_types)
+            replacements['[Content_Types].xml'] = content_types.encode('utf-8')
+
+        if self.workbook_bin is not None:
+            replacements['xl/workbook.bin'] = self.workbook_bin
+
+        self.package.write(dest, replacements, drop=drop)
+
+
+class BinarySheetPlan:
+    """Precomputed split of a BIFF12 worksheet stream around a fixed set of target cells."""
+
+    def __init__(self, data, cells):
+        self.cells = frozenset(cells)
+        self.parts = []
+        # Template stream offset of each slot in parts, and whether every slot replaces a record
+        self.slot_starts = []
+        self.in_place = True
+        self._compile(data)
+
+    def _compile(self, data):
+        targets = {}
+        for cell in self.cells:
+            letters, row = split_cell(cell)
+            targets.setdefault(row - 1, {})[column_index(letters)] = cell
+
+        rows = []  # (row, group_start, cells {col: (start, end, type)}, content_end)
+        data_start = data_end = None
+        current = None
+        depth = 0
+        anchor = None
+
+        for record_type, start, payload, end in iter_records(data):
+            if record_type == BRT_BEGIN_SHEET_DATA:
+                data_start = end
+                continue
+            if data_start is None:
+                continue
+            if record_type == BRT_END_SHEET_DATA:
+                data_end = start
+                break
+
+            # Future-record blocks (BrtACBegin..BrtACEnd) belong to the row that follows
+            if record_type == BRT_AC_BEGIN:
+                if depth == 0 and anchor is None:
+                    anchor = start
+                depth += 1
+                continue
+            if record_type == BRT_AC_END:
+                depth -= 1
+                continue
+            if depth:
+                continue
+
+            if record_type == BRT_ROW_HDR:
+                row = struct.unpack_from('<I', data, payload)[0]
+                current = [row, anchor if anchor is not None else start, {}, end]
+                rows.append(current)
+            elif current is not None and record_type in CELL_TYPES:
+                col = struct.unpack_from('<I', data, payload)[0]
+                current[2][col] = (start, end, record_type, payload)
+                current[3] = end
+            elif current is not None and record_type in CELL_TRAILER_TYPES:
+                current[3] = end
+            anchor = None
+
+        if data_start is None or data_end is None:
+            raise ValueError("Worksheet stream has no sheet data")
+
+        edits = []
+        seen = set()
+        for row, group_start, existing, content_end in rows:
+            if row not in targets:
+                continue
+            seen.add(row)
+            for col in sorted(targets[row]):
+                cell = targets[row][col]
+                if col in existing:
+                    start, end, record_type, payload = existing[col]
+                    if record_type in BRT_FMLA_TYPES:
+                        slot = _BinaryFormulaSlot(cell, record_type, data[payload:end], data[start:end])
+                    else:
+                        slot = _BinarySlot(cell, col, data[payload + 4:payload + 8], data[start:end])
+                    edits.append((start, end, [slot]))
+                else:
+                    later = [entry[0] for c, entry in existing.items() if c > col]
+                    position = min(later) if later else content_end
+                    edits.append((position, position, [_BinarySlot(cell, col, b'\x00\x00\x00\x00', b'')]))
+
+        for row in sorted(set(targets) - seen):
+            position = data_end
+            for other_row, group_start, _, _ in rows:
+                if other_row > row:
+                    position = group_start
+                    break
+            cols = sorted(targets[row])
+            header = encode_record(BRT_ROW_HDR, struct.pack(
+                '<IIHBBBI', row, 0, 0x012C, 0, 0, 0, 1) + struct.pack('<II', cols[0], cols[-1]))
+            slots = [_BinarySlot(targets[row][col], col, b'\x00\x00\x00\x00', b'') for col in cols]
+            edits.append((position, position, [header] + slots))
+
+        edits.sort(key=lambda edit: (edit[0], edit[1]))
+        cursor = 0
+        for start, end, pieces in edits:
+            if start > cursor:
+                self.parts.append(data[cursor:start])
+            self.parts.extend(pieces)
+            self.slot_starts.extend(start for piece in pieces if not isinstance(piece, bytes))
+            if start == end:
+                self.in_place = False
+            cursor = max(cursor, end)
+        self.parts.append(data[cursor:])
+
+    def render(self, values, moves=None):
+        """
+        Produce the sheet stream with the given cell values spliced in.
+        With a moves list, (template offset, growth) is appended for every
+        record that came out longer or shorter than the template's.
+        """
+        out = []
+        starts = iter(self.slot_starts)
+        for part in self.parts:
+            if isinstance(part, bytes):
+                out.append(part)
+            else:
+                record = part.render(values.get(part.cell, KEEP))
+                start = next(starts)
+                if moves is not None and len(record) != len(part.original):
+                    moves.append((start, len(record) - len(part.original)))
+                out.append(record)
+        return b''.join(out)
+
+
+def rebase_index(index, moves):
+    """
+    A sheet's binary index with its stream offsets shifted by moves, as
+    returned by BinarySheetPlan.render. Each BrtIndexRowBlock holds a row
+    bitmask, the block's stream offset and, per present row, a column-block
+    bitmask followed by one offset (from the block's) per set column-block bit.
+    Returns None for an index laid out otherwise.
+    """
+    def moved(offset):
+        return offset + sum(growth for start, growth in moves if start < offset)
+
+    data = bytearray(index)
+    for record_type, _, payload, end in iter_records(index):
+        if record_type != BRT_INDEX_ROW_BLOCK:
+            continue
+        rows, base = struct.unpack_from('<IQ', index, payload)
+        present = bin(rows).count('1')
+        pos = payload + 12 + 2 * present
+        if pos > end:
+            return None
+        count = sum(bin(bits).count('1') for bits in struct.unpack_from(f'<{present}H', index, payload + 12))
+        if pos + 4 * count != end:
+            return None
+
+        new_base = moved(base)
+        struct.pack_into('<Q', data, payload + 4, new_base)
+        for offset_pos in range(pos, end, 4):
+            offset = struct.unpack_from('<I', index, offset_pos)[0]
+            struct.pack_into('<I', data, offset_pos, moved(base + offset) - new_base)
+    return bytes(data)
+
+
+class _BinarySlot:
+    __slots__ = ('cell', 'prefix', 'original')
+
+    def __init__(self, cell, col, style, original):
+        self.cell = cell
+        self.prefix = struct.pack('<I', col) + style
+        self.original = original
+
+    def render(self, value):
+        if value is KEEP:
+            return self.original
+        if value is None or (isinstance(value, float) and not math.isfinite(value)):
+            return encode_record(BRT_CELL_BLANK, self.prefix)
+        if isinstance(value, bool):
+            return encode_record(BRT_CELL_BOOL, self.prefix + (b'\x01' if value else b'\x00'))
+        if isinstance(value, (int, float)):
+            return encode_record(BRT_CELL_REAL, self.prefix + struct.pack('<d', value))
+        if isinstance(value, (date, datetime)):
+            return encode_record(BRT_CELL_REAL, self.prefix + struct.pack('<d', excel_serial(value)))
+        return encode_record(BRT_CELL_ST, self.prefix + wide_string(str(value)))
+
+
+class _BinaryFormulaSlot:
+    """A formula cell: only Cached results can be written, and the formula stays"""
+    __slots__ = ('cell', 'prefix', 'formula', 'original')
+
+    def __init__(self, cell, record_type, payload, original):
+        self.cell = cell
+        self.prefix = payload[:8]
+        # The cached value sits between (col, style) and the flags + parsed formula
+        if record_type == BRT_FMLA_STRING:
+            value_size = 4 + 2 * struct.unpack_from('<I', payload, 8)[0]
+        elif record_type == BRT_FMLA_NUM:
+            value_size = 8
+        else:
+            value_size = 1
+        self.formula = payload[8 + value_size:]
+        self.original = original
+
+    def render(self, value):
+        if value is KEEP:
+            return self.original
+        if not isinstance(value, Cached):
+            raise ValueError(f"Template cell {self.cell} holds a formula and cannot be overwritten")
+        result = value.value
+        if value.error:
+            return encode_record(BRT_FMLA_ERROR, self.prefix + bytes((_ERROR_BYTES.get(result, 0x2A),)) + self.formula)
+        if isinstance(result, bool):
+            return encode_record(BRT_FMLA_BOOL, self.prefix + (b'\x01' if result else b'\x00') + self.formula)
+        if isinstance(result, (date, datetime)):
+            result = excel_serial(result)
+        if isinstance(result, (int, float)):
+            return encode_record(BRT_FMLA_NUM, self.prefix + struct.pack('<d', result) + self.formula)
+        text = '' if result is None else str(result)
+        return encode_record(BRT_FMLA_STRING, self.prefix + wide_string(text) + self.formula)
\ No newline at end of file
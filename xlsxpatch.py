@@ -0,0 +1,430 @@
+import os
+import re
+import struct
+import zipfile
+import zlib
+import math
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+# Excel's day zero for the 1900 date system (accounts for the 1900 leap-year bug)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Marker for "leave the template cell exactly as it is"
+KEEP = object()
+
+
+class Cached:
+    """
+    The computed result of a formula cell (see formulas.py). Rendering it keeps
+    the cell's formula and only replaces the cached value viewers display;
+    with error=True the value is an error code such as '#DIV/0!'.
+    """
+    __slots__ = ('value', 'error')
+
+    def __init__(self, value, error=False):
+        self.value = value
+        self.error = error
+
+
+def column_index(letters):
+    """Convert column letters ('A', 'AT') to a zero-based column index."""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - 64)
+    return index - 1
+
+
+def column_letters(index):
+    """Convert a zero-based column index back to column letters."""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def split_cell(cell):
+    """Split an A1-style reference into (column_letters, row_number)."""
+    match = re.fullmatch(r'\$?([A-Z]{1,3})\$?(\d+)', cell.upper())
+    if not match:
+        raise ValueError(f"Invalid cell reference: {cell}")
+    return match.group(1), int(match.group(2))
+
+
+def excel_serial(value):
+    """Convert a date/datetime into an Excel serial number."""
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    delta = value - EXCEL_EPOCH
+    return delta.days + delta.seconds / 86400
+
+
+class ZipPackage:
+    """
+    A template zip that is read once and re-emitted many times.
+
+    Members that are not replaced are copied as their original compressed
+    bytes (no inflate/deflate round trip), so every untouched part of the
+    workbook is byte-for-byte identical to the template.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.members = []
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                # Skip the local file header to reach the compressed payload
+                offset = info.header_offset
+                name_len, extra_len = struct.unpack('<HH', data[offset + 26:offset + 30])
+                start = offset + 30 + name_len + extra_len
+                raw = data[start:start + info.compress_size]
+                self.members.append((info, raw))
+
+        self.names = [info.filename for info, _ in self.members]
+
+    def read(self, name):
+        """Return the uncompressed content of a member."""
+        for info, raw in self.members:
+            if info.filename == name:
+                if info.compress_type == zipfile.ZIP_STORED:
+                    return raw
+                return zlib.decompress(raw, -15)
+        raise KeyError(name)
+
+    def write(self, dest, replacements=None, drop=()):
+        """Write the package to dest, swapping in replacement member contents."""
+        replacements = replacements or {}
+        local_parts = []
+        central_parts = []
+        offset = 0
+
+        for info, raw in self.members:
+            name = info.filename
+            if name in drop:
+                continue
+
+            if name in replacements:
+                content = replacements[name]
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                payload = compressor.compress(content) + compressor.flush()
+                method = zipfile.ZIP_DEFLATED
+                crc = zlib.crc32(content)
+                size = len(content)
+            else:
+                payload = raw
+                method = info.compress_type
+                crc = info.CRC
+                size = info.file_size
+
+            encoded_name = name.encode('utf-8')
+            # Sizes are always written up front, so no data descriptor is needed
+            flags = info.flag_bits & 0x0800
+            dos_time = (info.date_time[3] << 11) | (info.date_time[4] << 5) | (info.date_time[5] // 2)
+            dos_date = ((info.date_time[0] - 1980) << 9) | (info.date_time[1] << 5) | info.date_time[2]
+
+            local_parts.append(struct.pack(
+                '<IHHHHHIIIHH', 0x04034b50, 20, flags, method, dos_time, dos_date,
+                crc, len(payload), size, len(encoded_name), 0
+            ))
+            local_parts.append(encoded_name)
+            local_parts.append(payload)
+
+            central_parts.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, flags, method, dos_time, dos_date,
+                crc, len(payload), size, len(encoded_name), 0, 0, 0, 0,
+                info.external_attr, offset
+            ))
+            central_parts.append(encoded_name)
+
+            offset += 30 + len(encoded_name) + len(payload)
+
+        central = b''.join(central_parts)
+        end_record = struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, len(central_parts) // 2,
+            len(central_parts) // 2, len(central), offset, 0
+        )
+
+        with open(dest, 'wb') as f:
+            f.write(b''.join(local_parts))
+            f.write(central)
+            f.write(end_record)
+
+
+def relationship_targets(package, rels_part):
+    """Map relationship ids in a workbook .rels part to package part names."""
+    rels = package.read(rels_part).decode('utf-8')
+    targets = {}
+    for attrs in re.findall(r'<Relationship\b([^>]*)/?>', rels):
+        rel_id = re.search(r'\bId="([^"]+)"', attrs)
+        target = re.search(r'\bTarget="([^"]+)"', attrs)
+        if rel_id and target:
+            path = target.group(1)
+            path = path[1:] if path.startswith('/') else 'xl/' + path
+            targets[rel_id.group(1)] = path
+    return targets
+
+
+_ROW_RE = re.compile(rb'<row\b[^>]*?\br="(\d+)"[^>]*?(/>|>)')
+_CELL_RE = re.compile(rb'<c\b[^>]*?\br="([A-Z]+)(\d+)"[^>]*?(?:/>|>.*?</c>)', re.S)
+_STYLE_RE = re.compile(rb'\bs="(\d+)"')
+_TYPE_RE = re.compile(rb'\s+t="[^"]*"')
+_FORMULA_RE = re.compile(rb'<f\b[^>]*?(?:/>|>.*?</f>)', re.S)
+
+
+class XlsxTemplate:
+    """
+    Native .xlsx template renderer.
+
+    The template is read once; for every sheet a splice plan is compiled that
+    separates the untouched XML from the handful of cells we write. Rendering a
+    copy is then a single join of precomputed byte chunks, and all other zip
+    members (styles, drawings, merges, printer settings) pass through unchanged.
+    """
+
+    def __init__(self, path, targets=None, full_calc_on_load=True):
+        self.path = path
+        self.package = ZipPackage(path)
+        self.full_calc_on_load = full_calc_on_load
+        self.sheet_parts = self._find_sheets()
+        self.plans = {}
+
+        for sheet, cells in (targets or {}).items():
+            self.plan(sheet, cells)
+
+        self.workbook_xml = self._workbook_xml()
+
+    def _find_sheets(self):
+        workbook = self.package.read('xl/workbook.xml').decode('utf-8')
+        parts = relationship_targets(self.package, 'xl/_rels/workbook.xml.rels')
+        sheets = {}
+        for attrs in re.findall(r'<sheet\b([^>]*)/>', workbook):
+            name = re.search(r'\bname="([^"]*)"', attrs).group(1)
+            rel_id = re.search(r'\br:id="([^"]*)"', attrs).group(1)
+            sheets[name.replace('&amp;', '&')] = parts[rel_id]
+        return sheets
+
+    def _workbook_xml(self):
+        """Return workbook.xml with full recalculation on load switched on."""
+        if not self.full_calc_on_load:
+            return None
+        workbook = self.package.read('xl/workbook.xml')
+        if b'fullCalcOnLoad=' in workbook:
+            return None
+        if b'<calcPr' in workbook:
+            return workbook.replace(b'<calcPr', b'<calcPr fullCalcOnLoad="1"', 1)
+        return workbook.replace(b'</workbook>', b'<calcPr fullCalcOnLoad="1"/></workbook>', 1)
+
+    def plan(self, sheet, cells):
+        """Compile (or fetch) the splice plan for a set of cells on a sheet."""
+        cells = frozenset(cell.upper() for cell in cells)
+        existing = self.plans.get(sheet)
+        if existing is not None:
+            if cells <= existing.cells:
+                return existing
+            cells |= existing.cells
+
+        plan = SheetPlan(self.package.read(self.sheet_parts[sheet]), cells)
+        self.plans[sheet] = plan
+        return plan
+
+    def render(self, dest, values):
+        """
+        Write a copy of the template to dest.
+
+        values maps sheet name -> {cell: value}. Cells mapped to KEEP (or not
+        mentioned) keep their template content; None clears the cell value.
+        """
+        replacements = {}
+        for sheet, cell_values in values.items():
+            plan = self.plan(sheet, cell_values.keys())
+            replacements[self.sheet_parts[sheet]] = plan.render(cell_values)
+
+        if self.workbook_xml is not None:
+            replacements['xl/workbook.xml'] = self.workbook_xml
+
+        self.package.write(dest, replacements)
+
+
+def patch_workbook(path, cells, sheet=0):
+    """
+    Write {cell: value} into one sheet (by position or name) of an .xlsx in place.
+    The copy is rendered next to the original and swapped in, so a failed write
+    never leaves a half-written workbook behind.
+    """
+    template = XlsxTemplate(path)
+    if isinstance(sheet, int):
+        sheet = list(template.sheet_parts)[sheet]
+    temp_path = path + '.tmp'
+    try:
+        template.render(temp_path, {sheet: cells})
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class SheetPlan:
+    """Precomputed split of a worksheet XML around a fixed set of target cells."""
+
+    def __init__(self, xml, cells):
+        self.cells = frozenset(cells)
+        self.parts = []
+        self._compile(xml)
+
+    def _compile(self, xml):
+        targets = {}
+        for cell in self.cells:
+            letters, row = split_cell(cell)
+            targets.setdefault(row, {})[column_index(letters)] = cell
+
+        data_start = xml.find(b'<sheetData')
+        tag_end = xml.find(b'>', data_start)
+        if xml[tag_end - 1:tag_end] == b'/':
+            # Empty <sheetData/>: expand it so rows can be inserted
+            xml = xml[:tag_end - 1] + b'></sheetData>' + xml[tag_end + 1:]
+        data_end = xml.find(b'</sheetData>')
+
+        edits = []
+        rows_seen = set()
+
+        for match in _ROW_RE.finditer(xml, tag_end, data_end):
+            row = int(match.group(1))
+            if row not in targets:
+                continue
+            rows_seen.add(row)
+
+            if match.group(2) == b'/>':
+                # Self-closing row: reopen it and append all target cells
+                open_tag = xml[match.start():match.end() - 2] + b'>'
+                slots = [_Slot(targets[row][col], b'', b'') for col in sorted(targets[row])]
+                edits.append((match.start(), match.end(), [open_tag] + slots + [b'</row>']))
+                continue
+
+            row_end = xml.find(b'</row>', match.end())
+            existing = {}
+            for cell_match in _CELL_RE.finditer(xml, match.end(), row_end):
+                col = column_index(cell_match.group(1).decode('ascii'))
+                existing[col] = cell_match
+
+            pending = sorted(targets[row])
+            for col in pending:
+                cell = targets[row][col]
+                if col in existing:
+                    cell_match = existing[col]
+                    original = cell_match.group(0)
+                    style = _STYLE_RE.search(original[:original.find(b'>')])
+                    style_attr = b' s="' + style.group(1) + b'"' if style else b''
+                    formula = _FORMULA_RE.search(original)
+                    if formula:
+                        slot = _FormulaSlot(cell, original, formula.group(0))
+                    else:
+                        slot = _Slot(cell, style_attr, original)
+                    edits.append((cell_match.start(), cell_match.end(), [slot]))
+                else:
+                    # Insert before the first cell to the right, or at the row end
+                    later = [m.start() for c, m in existing.items() if c > col]
+                    position = min(later) if later else row_end
+                    edits.append((position, position, [_Slot(cell, b'', b'')]))
+
+        for row in sorted(set(targets) - rows_seen):
+            # Row missing entirely: insert a new row element in row order
+            position = data_end
+            for match in _ROW_RE.finditer(xml, tag_end, data_end):
+                if int(match.group(1)) > row:
+                    position = match.start()
+                    break
+            slots = [_Slot(targets[row][col], b'', b'') for col in sorted(targets[row])]
+            edits.append((position, position, [b'<row r="%d">' % row] + slots + [b'</row>']))
+
+        # Stable sort keeps same-position insertions in column order
+        edits.sort(key=lambda edit: (edit[0], edit[1]))
+        cursor = 0
+        for start, end, pieces in edits:
+            if start > cursor:
+                self.parts.append(xml[cursor:start])
+            self.parts.extend(pieces)
+            cursor = max(cursor, end)
+        self.parts.append(xml[cursor:])
+
+    def render(self, values):
+        """Produce the sheet XML with the given cell values spliced in."""
+        out = []
+        for part in self.parts:
+            if isinstance(part, bytes):
+                out.append(part)
+            else:
+                out.append(part.render(values.get(part.cell, KEEP)))
+        return b''.join(out)
+
+
+class _Slot:
+    __slots__ = ('cell', 'ref', 'style', 'original')
+
+    def __init__(self, cell, style, original):
+        self.cell = cell
+        self.ref = cell.encode('ascii')
+        self.style = style
+        self.original = original
+
+    def render(self, value):
+        if value is KEEP:
+            return self.original
+        head = b'<c r="' + self.ref + b'"' + self.style
+        if value is None or (isinstance(value, float) and not math.isfinite(value)):
+            return head + b'/>'
+        if isinstance(value, bool):
+            return head + b' t="b"><v>' + (b'1' if value else b'0') + b'</v></c>'
+        if isinstance(value, (int, float)):
+            return head + b'><v>' + format_number(value).encode('ascii') + b'</v></c>'
+        if isinstance(value, (date, datetime)):
+            return head + b'><v>' + format_number(excel_serial(value)).encode('ascii') + b'</v></c>'
+
+        text = str(value)
+        space = b' xml:space="preserve"' if text != text.strip() else b''
+        return (head + b' t="inlineStr"><is><t' + space + b'>' +
+                escape(text).encode('utf-8') + b'</t></is></c>')
+
+
+class _FormulaSlot:
+    """A formula cell: only Cached results can be written, and the formula stays"""
+    __slots__ = ('cell', 'head', 'formula', 'original')
+
+    def __init__(self, cell, original, formula):
+        self.cell = cell
+        open_tag = original[:original.find(b'>')].rstrip(b'/')
+        self.head = _TYPE_RE.sub(b'', open_tag)
+        self.formula = formula
+        self.original = original
+
+    def render(self, value):
+        if value is KEEP:
+            return self.original
+        if not isinstance(value, Cached):
+            raise ValueError(f"Template cell {self.cell} holds a formula and cannot be overwritten")
+        result = value.value
+        if value.error:
+            cell_type, text = b' t="e"', escape(str(result)).encode('utf-8')
+        elif result is None or (isinstance(result, float) and not math.isfinite(result)):
+            return self.head + b'>' + self.formula + b'</c>'
+        elif isinstance(result, bool):
+            cell_type, text = b' t="b"', b'1' if result else b'0'
+        elif isinstance(result, (int, float)):
+            cell_type, text = b'', format_number(result).encode('ascii')
+        elif isinstance(result, (date, datetime)):
+            cell_type, text = b'', format_number(excel_serial(result)).encode('ascii')
+        else:
+            cell_type, text = b' t="str"', escape(str(result)).encode('utf-8')
+        return self.head + cell_type + b'>' + self.formula + b'<v>' + text + b'</v></c>'
+
+
+def format_number(value):
+    """Render a number the way Excel stores it in <v> elements."""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
\ No newline at end of file
@@ -0,0 +1,218 @@
+import re
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import timedelta
+from xlsxpatch import EXCEL_EPOCH, column_index, split_cell
+
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Built-in number formats that show a date or a time
+DATE_FORMAT_IDS = frozenset(range(14, 23)) | {45, 46, 47}
+# Quoted text, escaped characters, [colors/conditions] and padding in a format code
+_FORMAT_LITERAL_RE = re.compile(r'"[^"]*"|\\.|\[[^\]]*\]|[_*].')
+
+
+def parse_range(ref):
+    """Turn 'A6:BC100' into zero-based (first_row, first_col, last_row, last_col)."""
+    start, _, end = ref.partition(':')
+    start_col, start_row = split_cell(start)
+    end_col, end_row = split_cell(end or start)
+    return start_row - 1, column_index(start_col), end_row - 1, column_index(end_col)
+
+
+def sheet_part(zf, sheet=0):
+    """Resolve a sheet (by position or name) to its part name inside the zip."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(NS_PKG_REL + 'Relationship')}
+
+    sheets = list(workbook.iter(NS_MAIN + 'sheet'))
+    if isinstance(sheet, int):
+        entry = sheets[sheet]
+    else:
+        entry = next(s for s in sheets if s.get('name') == sheet)
+
+    target = targets[entry.get(NS_REL + 'id')]
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def sheet_names(zf):
+    """Sheet names in workbook order."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    return [entry.get('name') for entry in workbook.iter(NS_MAIN + 'sheet')]
+
+
+def read_shared_strings(zf, wanted=None):
+    """
+    Read the shared string table, streaming it so large tables stay cheap.
+    With wanted (a set of indexes) only those strings are kept, as {index: text}.
+    """
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return [] if wanted is None else {}
+
+    strings = [] if wanted is None else {}
+    index = 0
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == NS_MAIN + 'si':
+                if wanted is None or index in wanted:
+                    # Plain and rich-text runs both end up in <t>; phonetic hints do not count
+                    phonetic = _phonetic_texts(elem)
+                    text = ''.join(t.text or '' for t in elem.iter(NS_MAIN + 't') if t not in phonetic)
+                    if wanted is None:
+                        strings.append(text)
+                    else:
+                        strings[index] = text
+                index += 1
+                elem.clear()
+                if wanted is not None and len(strings) == len(wanted):
+                    break
+    return strings
+
+
+def _phonetic_texts(si):
+    return {t for rph in si.iter(NS_MAIN + 'rPh') for t in rph.iter(NS_MAIN + 't')}
+
+
+def is_date_format(code):
+    """Whether a custom number format code shows a date or a time."""
+    return any(c in 'dmyhs' for c in _FORMAT_LITERAL_RE.sub('', code).lower())
+
+
+def read_date_styles(zf):
+    """The cell formats (indexes into cellXfs, the s attribute of <c>) that show dates."""
+    if 'xl/styles.xml' not in zf.namelist():
+        return frozenset()
+    styles = ET.fromstring(zf.read('xl/styles.xml'))
+    custom = {int(fmt.get('numFmtId')): fmt.get('formatCode') or '' for fmt in styles.iter(NS_MAIN + 'numFmt')}
+    cell_xfs = styles.find(NS_MAIN + 'cellXfs')
+    if cell_xfs is None:
+        return frozenset()
+
+    dates = set()
+    for index, xf in enumerate(cell_xfs.iter(NS_MAIN + 'xf')):
+        fmt_id = int(xf.get('numFmtId', 0))
+        if is_date_format(custom[fmt_id]) if fmt_id in custom else fmt_id in DATE_FORMAT_IDS:
+            dates.add(index)
+    return frozenset(dates)
+
+
+def cell_value(elem, shared_strings, date_styles=frozenset()):
+    """Convert a <c> element to the value xlwings would return."""
+    return convert_value(elem.get('t'), cell_text(elem), shared_strings, int(elem.get('s', 0)) in date_styles)
+
+
+def cell_text(elem):
+    """The raw text of a <c> element: its <v>, or the runs of an inline string."""
+    if elem.get('t') == 'inlineStr':
+        return ''.join(t.text or '' for t in elem.iter(NS_MAIN + 't'))
+    v = elem.find(NS_MAIN + 'v')
+    return None if v is None else v.text
+
+
+def convert_value(cell_type, text, shared_strings, date=False):
+    """
+    Turn a cell's type attribute and raw text into the value xlwings would return.
+    A number in a date format (date=True) comes back as a datetime.
+    """
+    if cell_type == 'inlineStr':
+        return text
+    if text is None:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(text)]
+    if cell_type in ('str', 'd'):
+        return text
+    if cell_type == 'b':
+        return text == '1'
+    if cell_type == 'e':
+        return None
+    if date:
+        return EXCEL_EPOCH + timedelta(days=float(text))
+    return float(text)
+
+
+def iter_raw_cells(zf, part, first_row=0, last_row=None):
+    """
+    Stream (row, col, type, raw text, style) for every cell in a sheet, zero-based.
+    Parsing stops as soon as last_row has been passed.
+    """
+    with zf.open(part) as f:
+        row = -1
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if elem.tag == NS_MAIN + 'row':
+                if event == 'start':
+                    row = int(elem.get('r')) - 1 if elem.get('r') else row + 1
+                    if last_row is not None and row > last_row:
+                        return
+                else:
+                    elem.clear()
+            elif event == 'end' and elem.tag == NS_MAIN + 'c':
+                if row >= first_row:
+                    col = column_index(split_cell(elem.get('r'))[0])
+                    yield row, col, elem.get('t'), cell_text(elem), int(elem.get('s', 0))
+                elem.clear()
+
+
+def iter_sheet_cells(zf, part, shared_strings, first_row=0, last_row=None, date_styles=frozenset()):
+    """
+    Stream (row, col, value) for every cell in a sheet, zero-based.
+    Parsing stops as soon as last_row has been passed. Cells whose style is
+    in date_styles (see read_date_styles) come back as datetimes.
+    """
+    for row, col, cell_type, text, style in iter_raw_cells(zf, part, first_row, last_row):
+        yield row, col, convert_value(cell_type, text, shared_strings, style in date_styles)
+
+
+def read_block(path, ref, sheet=0):
+    """
+    Read a rectangular range from an .xlsx without Excel.
+
+    Returns a list of rows (lists of values) shaped like xlwings'
+    sheet.range(ref).value, with None for empty cells.
+    """
+    first_row, first_col, last_row, last_col = parse_range(ref)
+    block = [[None] * (last_col - first_col + 1) for _ in range(last_row - first_row + 1)]
+
+    with zipfile.ZipFile(path) as zf:
+        shared_strings = read_shared_strings(zf)
+        date_styles = read_date_styles(zf)
+        part = sheet_part(zf, sheet)
+        for row, col, value in iter_sheet_cells(zf, part, shared_strings, first_row, last_row, date_styles):
+            if first_col <= col <= last_col:
+                block[row - first_row][col - first_col] = value
+
+    return block
+
+
+def read_columns(path, columns, first_row, last_row, sheet=0):
+    """
+    Stream a few columns of rows first_row..last_row (1-based) out of an .xlsx.
+
+    Returns {row: {column letter: value}} for the non-empty cells. The sheet is
+    parsed first and only the shared strings those cells use are kept, so
+    memory stays flat however large the workbook or its string table is.
+    """
+    wanted = {column_index(col): col for col in columns}
+    raw = []
+    with zipfile.ZipFile(path) as zf:
+        part = sheet_part(zf, sheet)
+        for row, col, cell_type, text, style in iter_raw_cells(zf, part, first_row - 1, last_row - 1):
+            if col in wanted and text is not None:
+                raw.append((row + 1, wanted[col], cell_type, text, style))
+
+        indexes = {int(text) for _, _, cell_type, text, _ in raw if cell_type == 's'}
+        shared_strings = read_shared_strings(zf, indexes) if indexes else {}
+        date_styles = read_date_styles(zf)
+
+    cells = {}
+    for row, col, cell_type, text, style in raw:
+        value = convert_value(cell_type, text, shared_strings, style in date_styles)
+        if value is not None:
+            cells.setdefault(row, {})[col] = value
+    return cells
\ No newline at end of file